@@ -0,0 +1,153 @@
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Runs whole epochs of the loop's default step list offline. Completions come
+# from the stub backend, embeddings from a hashing function and the store is a
+# fresh temporary directory, so nothing leaves the machine. Connectors are not
+# started. Reports epochs per second, latency percentiles for each step, prompt
+# tokens per completion and the number and latency of store operations per epoch.
+# Usage: python -m scripts.bench_epochs [epochs] [latency] [mode]
+#   latency is a stub latency distribution, e.g. constant:0 or lognormal:0.8,0.5
+#   mode is serial, fused or prefetch
+
+EPOCHS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+LATENCY = sys.argv[2] if len(sys.argv) > 2 else "constant:0"
+MODE = sys.argv[3] if len(sys.argv) > 3 else "serial"
+DIMENSIONS = 384
+
+storage = tempfile.TemporaryDirectory()
+os.environ["STORAGE_PATH"] = storage.name
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["COMPLETION_BACKEND"] = "stub"
+os.environ["STUB_COMPLETION_LATENCY"] = LATENCY
+
+import numpy as np
+from agentaction import get_actions, import_actions
+from agentmemory import wipe_all_memories
+
+from tinyagi.completion import get_stub_completion, install_completion_backend
+from tinyagi.embeddings import install_embedding_cache, set_embedding_function
+from tinyagi.main import create_steps, publish_step, reset_memory_caches
+from tinyagi.metrics import histograms, install_memory_metrics, reset_metrics
+from tinyagi.utils import set_token_counter
+
+
+def hashing_embedding(texts):
+    # each word adds a pseudo-random unit direction, so texts that share words are close
+    vectors = np.zeros((len(texts), DIMENSIONS), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in text.lower().split():
+            seed = int.from_bytes(hashlib.sha1(word.encode("utf-8")).digest()[:4], "little")
+            vectors[i] += np.random.default_rng(seed).standard_normal(DIMENSIONS)
+    return vectors.tolist()
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+
+set_embedding_function(hashing_embedding, "bench-hashing")
+try:
+    from easycompletion import count_tokens
+
+    count_tokens("offline check")
+    token_note = "tiktoken"
+except Exception:
+    # the tokenizer is downloaded on first use, estimate when it can't be
+    set_token_counter(lambda text: len(text) // 4 + 1)
+    token_note = "estimated, the tokenizer could not be loaded"
+
+install_embedding_cache()
+install_memory_metrics()
+install_completion_backend()
+
+output = io.StringIO()
+with contextlib.redirect_stdout(output):
+    wipe_all_memories()
+    reset_memory_caches()
+    import_actions("./tinyagi/actions")
+    steps, _ = create_steps(
+        "./tinyagi/context", prefetch_context=MODE == "prefetch", fused=MODE == "fused"
+    )
+steps = [publish_step(step) for step in steps]
+
+stub = get_stub_completion()
+state = {"context": None}
+
+
+def choose_action(rng):
+    context = state["context"] or {}
+    names = context.get("available_action_names") or list(get_actions())
+    return rng.choice(names)
+
+
+stub.set_argument_choices("decide_action", "action_name", choose_action)
+stub.reset(seed=0)
+reset_metrics()
+
+loop_data = {
+    "stop_event": threading.Event(),
+    "pause_event": threading.Event(),
+    "step_event": threading.Event(),
+    "started_event": threading.Event(),
+}
+step_times = {}
+epoch_times = []
+failures = 0
+with contextlib.redirect_stdout(output):
+    for epoch in range(EPOCHS):
+        epoch_start = time.perf_counter()
+        for i, step in enumerate(steps):
+            name = f"{i}:{step.__name__}"
+            step_start = time.perf_counter()
+            try:
+                if step.__code__.co_argcount == 2:
+                    state["context"] = step(state["context"], loop_data)
+                else:
+                    state["context"] = step(state["context"])
+            except Exception as e:
+                failures += 1
+                print(f"step {name} failed: {e}", file=sys.stderr)
+            step_times.setdefault(name, []).append(time.perf_counter() - step_start)
+            loop_data["step_event"].clear()
+        epoch_times.append(time.perf_counter() - epoch_start)
+
+elapsed = sum(epoch_times)
+print(f"{EPOCHS} {MODE} epochs with stub latency {LATENCY}, tokens {token_note}")
+print(f"{EPOCHS / elapsed:.2f} epochs/s, {elapsed / EPOCHS * 1e3:.1f} ms per epoch, {failures} failed steps")
+
+print("\nstep latency (ms)            p50       p90       p99       max")
+for name, times in step_times.items():
+    times = np.array(times) * 1e3
+    print(
+        f"{name:<24} {percentile(times, 50):9.1f} {percentile(times, 90):9.1f} "
+        f"{percentile(times, 99):9.1f} {times.max():9.1f}"
+    )
+
+print("\nprompt tokens                calls      mean       max   latency")
+calls = {}
+for call in stub.calls:
+    calls.setdefault(call["name"] or "text", []).append(call)
+for name, function_calls in calls.items():
+    tokens = [call["prompt_tokens"] for call in function_calls]
+    latency = sum(call["latency"] for call in function_calls) / len(function_calls)
+    print(
+        f"{name:<26} {len(function_calls):7} {np.mean(tokens):9.0f} {max(tokens):9} {latency * 1e3:7.0f}ms"
+    )
+
+print("\nstore operations per epoch     calls   mean ms")
+total = 0
+for labels, series in sorted(histograms["tinyagi_memory_seconds"]["series"].items()):
+    labels = dict(labels)
+    total += series["count"]
+    print(
+        f"{labels['category']:>16} {labels['operation']:<8} {series['count'] / EPOCHS:8.2f} "
+        f"{series['sum'] / series['count'] * 1e3:9.2f}"
+    )
+print(f"{'total':>16} {'':<8} {total / EPOCHS:8.2f}")
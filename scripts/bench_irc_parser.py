@@ -0,0 +1,92 @@
+import random
+import re
+import sys
+import time
+
+from tinyagi.connectors.irc import IrcLineParser
+
+# Feeds a randomly fragmented IRC stream through the incremental parser, checks
+# that every line comes out, and compares throughput with the old regex parser.
+# Usage: python -m scripts.bench_irc_parser [number_of_messages]
+
+number_of_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+rng = random.Random(42)
+
+lines = []
+for i in range(number_of_messages):
+    if i % 50 == 0:
+        lines.append(b"PING :tmi.twitch.tv")
+    else:
+        user = b"viewer%i" % rng.randint(0, 5000)
+        text = b" ".join(b"word%i" % rng.randint(0, 999) for _ in range(rng.randint(1, 30)))
+        lines.append(b":%s!%s@%s.tmi.twitch.tv PRIVMSG #isekai_citrine :%s" % (user, user, user, text))
+stream = b"".join(line + b"\r\n" for line in lines)
+
+chunks = []
+position = 0
+while position < len(stream):
+    size = rng.randint(1, 4096)
+    chunks.append(stream[position : position + size])
+    position += size
+
+print(f"{len(lines)} messages, {len(stream) / 1e6:.1f} MB in {len(chunks)} fragments")
+
+# the parser from before the incremental one, kept here as a baseline
+re_prog = re.compile(
+    b"^(?::(?:([^ !\r\n]+)![^ \r\n]*|[^ \r\n]*) )?([^ \r\n]+)(?: ([^:\r\n]*))?(?: :([^\r\n]*))?\r\n",
+    re.MULTILINE,
+)
+
+
+def legacy_parse(chunks):
+    partial = b""
+    res = []
+    for buffer in chunks:
+        buffer = partial + buffer
+        partial = b""
+        matches = list(re_prog.finditer(buffer))
+        for match in matches:
+            res.append(
+                {
+                    "name": (match.group(1) or b"").decode(errors="replace"),
+                    "command": (match.group(2) or b"").decode(errors="replace"),
+                    "params": [
+                        p.decode(errors="replace")
+                        for p in (match.group(3) or b"").split(b" ")
+                    ],
+                    "trailing": (match.group(4) or b"").decode(errors="replace"),
+                }
+            )
+        end = matches[-1].end() if matches else 0
+        partial = buffer[end:]
+    return res
+
+
+def incremental_parse(chunks):
+    parser = IrcLineParser()
+    res = []
+    for chunk in chunks:
+        for irc_message in parser.feed(chunk):
+            # decode only what the Twitch connector reads
+            if irc_message.command == "PRIVMSG":
+                res.append((irc_message.name, irc_message.trailing))
+            else:
+                res.append(None)
+    return res, parser
+
+
+start_time = time.perf_counter()
+legacy = legacy_parse(chunks)
+legacy_time = time.perf_counter() - start_time
+
+start_time = time.perf_counter()
+parsed, parser = incremental_parse(chunks)
+incremental_time = time.perf_counter() - start_time
+
+lost = len(lines) - len(parsed)
+assert lost == 0, f"{lost} lines lost"
+assert len(parser.buffer) == parser.start, "unparsed bytes left in the buffer"
+
+print(f"regex parser:       {len(legacy) / legacy_time:,.0f} messages/sec")
+print(f"incremental parser: {len(parsed) / incremental_time:,.0f} messages/sec")
+print("no lines lost")
@@ -0,0 +1,75 @@
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+import tinyagi.embeddings as embeddings
+import tinyagi.knowledge_index as knowledge_index
+from tinyagi.embeddings import set_embedding_function
+
+# Compares relevant-knowledge searches against the store with searches of the
+# in-process knowledge index, with random 384 dimension embeddings. Both paths
+# get the query embedding precomputed, so only the search itself is timed.
+# Usage: python -m scripts.bench_knowledge_index [sizes] [searches]
+#   sizes is a comma separated list, e.g. 1000,10000
+
+SIZES = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "1000,10000,100000").split(",")]
+SEARCHES = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+DIMENSIONS = 384
+N_RESULTS = 8
+INSERT_BATCH_SIZE = 5000
+
+rng = np.random.default_rng(42)
+queries = rng.normal(size=(SEARCHES, DIMENSIONS)).astype(np.float32)
+query_vectors = {str(i): queries[i].tolist() for i in range(SEARCHES)}
+embeddings.EMBEDDING_CACHE_PATH = ""
+set_embedding_function(lambda texts: [query_vectors[text] for text in texts], "bench")
+
+
+def time_searches(search):
+    start_time = time.perf_counter()
+    for i in range(SEARCHES):
+        search(i)
+    return (time.perf_counter() - start_time) / SEARCHES
+
+
+print(f"{SEARCHES} searches for the top {N_RESULTS} of each size")
+for size in SIZES:
+    vectors = rng.normal(size=(size, DIMENSIONS)).astype(np.float32)
+    ids = [str(i).zfill(16) for i in range(size)]
+    documents = [f"knowledge {i}" for i in range(size)]
+    metadatas = [{"novel": "True" if i % 4 else "False"} for i in range(size)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        collection = chromadb.PersistentClient(path=directory).get_or_create_collection(
+            "knowledge", embedding_function=None
+        )
+        for start in range(0, size, INSERT_BATCH_SIZE):
+            end = start + INSERT_BATCH_SIZE
+            collection.add(
+                ids=ids[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=vectors[start:end],
+            )
+        store_time = time_searches(
+            lambda i: collection.query(
+                query_embeddings=[queries[i]],
+                n_results=N_RESULTS,
+                where={"novel": "True"},
+            )
+        )
+
+    knowledge_index.reset_knowledge_index()
+    knowledge_index.knowledge_index["loaded"] = True
+    knowledge_index.add_to_knowledge_index(ids, documents, metadatas, vectors)
+    index_time = time_searches(
+        lambda i: knowledge_index.search_knowledge_index(str(i), n_results=N_RESULTS)
+    )
+
+    print(
+        f"{size:>7} items  store: {store_time * 1e3:8.2f} ms  "
+        f"index: {index_time * 1e3:8.3f} ms  speedup: {store_time / index_time:6.1f}x"
+    )
@@ -0,0 +1,94 @@
+import sys
+import threading
+import time
+
+from agentloop import start as start_loop, stop as stop_loop
+
+import tinyagi.pipeline as pipeline
+
+# Compares the serial and context prefetch loop modes with stubbed steps of fixed
+# latency. Prefetch only hides context building, the completions still run in turn.
+# Completions take LLM_LATENCY seconds, a full context build takes CONTEXT_LATENCY
+# seconds and a single builder takes BUILDER_LATENCY seconds.
+# Usage: python -m scripts.bench_pipeline [epochs] [llm_latency]
+
+EPOCHS = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+LLM_LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+CONTEXT_LATENCY = 0.3
+BUILDER_LATENCY = 0.1
+
+epoch_finished = threading.Event()
+state = {"epoch": 0}
+
+
+def fake_initialize(context):
+    context = context or {}
+    state["epoch"] += 1
+    context["epoch"] = state["epoch"]
+    if state["epoch"] > EPOCHS:
+        epoch_finished.set()
+    return context
+
+
+def fake_completion_step(key):
+    def step(context):
+        time.sleep(LLM_LATENCY)
+        context[key] = key
+        return context
+
+    step.__name__ = key
+    return step
+
+
+def fake_builder(key, latency):
+    def builder(context):
+        time.sleep(latency)
+        context[key] = key + str(context.get("epoch"))
+        return context
+
+    return builder
+
+
+fake_context_step = fake_builder("events", CONTEXT_LATENCY)
+
+
+def run(steps, step_interval):
+    state["epoch"] = 0
+    epoch_finished.clear()
+    start_time = time.perf_counter()
+    loop_data = start_loop(steps, step_interval=step_interval)
+    epoch_finished.wait()
+    elapsed = time.perf_counter() - start_time
+    stop_loop(loop_data)
+    return elapsed
+
+
+# both modes move on to the next step as soon as one returns, so only the
+# overlap of context building with the completions is compared
+serial_steps = [
+    pipeline.advance_immediately(step)
+    for step in [
+        fake_initialize,
+        fake_completion_step("orient"),
+        fake_context_step,
+        fake_completion_step("decide"),
+        fake_context_step,
+        fake_completion_step("act"),
+    ]
+]
+
+pipeline.initialize = fake_initialize
+pipeline.orient = fake_completion_step("orient")
+pipeline.decide = fake_completion_step("decide")
+pipeline.act = fake_completion_step("act")
+pipeline.built_task_context = fake_builder("tasks", BUILDER_LATENCY)
+pipeline.build_recent_knowledge = fake_builder("recent_knowledge", BUILDER_LATENCY)
+pipeline.build_events_context = fake_builder("events", BUILDER_LATENCY)
+prefetch_steps = pipeline.create_prefetch_steps(fake_context_step)
+
+print(f"{EPOCHS} epochs, {LLM_LATENCY}s per completion")
+serial_time = run(serial_steps, step_interval=0)
+print(f"serial:    {serial_time / EPOCHS:.2f}s per epoch")
+prefetch_time = run(prefetch_steps, step_interval=0)
+print(f"prefetch:  {prefetch_time / EPOCHS:.2f}s per epoch")
+print(f"speedup:   {serial_time / prefetch_time:.2f}x")
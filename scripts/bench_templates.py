@@ -0,0 +1,77 @@
+import importlib
+import sys
+import time
+
+from easycompletion import compose_prompt
+
+from tinyagi.templates import templates
+
+# Renders every registered prompt template with compose_prompt and with the
+# compiled template, from a context shaped like the loop's (every slot filled,
+# plus the keys a template doesn't use), and times the function schema factories.
+# Usage: python -m scripts.bench_templates [iterations]
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+# importing these registers all of the project's templates
+for module in [
+    "tinyagi.actions.fact",
+    "tinyagi.actions.joke",
+    "tinyagi.actions.poetry",
+    "tinyagi.actions.random_thought",
+    "tinyagi.actions.task",
+    "tinyagi.connectors.chat",
+    "tinyagi.connectors.twitch",
+    "tinyagi.steps.decide_and_act",
+    "tinyagi.steps.orient",
+]:
+    importlib.import_module(module)
+
+context = {"epoch": 42, "verbose": False}
+for i in range(30):
+    context[f"unused_{i}"] = f"unused value {i}"
+for template in templates.values():
+    for key in template.keys:
+        context.setdefault(key, "\n".join(f"{key} line {i} with some text" for i in range(40)))
+
+
+def time_calls(call):
+    start_time = time.perf_counter()
+    for _ in range(ITERATIONS):
+        call()
+    return (time.perf_counter() - start_time) / ITERATIONS
+
+
+print(f"{ITERATIONS} renders of each of {len(templates)} templates")
+total_composed = 0
+total_rendered = 0
+for name, template in templates.items():
+    assert template.render(context) == compose_prompt(template.text, context), name
+    composed = time_calls(lambda: compose_prompt(template.text, context, debug=False))
+    rendered = time_calls(lambda: template.render(context))
+    total_composed += composed
+    total_rendered += rendered
+    print(
+        f"{name:>16}  compose_prompt: {composed * 1e6:7.1f} us  "
+        f"compiled: {rendered * 1e6:7.1f} us  speedup: {composed / rendered:5.1f}x"
+    )
+print(
+    f"{'all':>16}  compose_prompt: {total_composed * 1e6:7.1f} us  "
+    f"compiled: {total_rendered * 1e6:7.1f} us  speedup: {total_composed / total_rendered:5.1f}x"
+)
+
+print(f"\n{ITERATIONS} calls of each function schema factory")
+for module, name in [
+    ("tinyagi.steps.decide", "compose_decision_function"),
+    ("tinyagi.steps.orient", "compose_orient_function"),
+    ("tinyagi.connectors.twitch", "compose_loop_function"),
+]:
+    factory = getattr(importlib.import_module(module), name)
+    # the undecorated factory, as it was before the schemas were cached
+    build = factory.__wrapped__
+    built = time_calls(build)
+    cached = time_calls(factory)
+    print(
+        f"{name:>26}  built: {built * 1e6:7.2f} us  "
+        f"cached: {cached * 1e6:7.3f} us  speedup: {built / cached:7.1f}x"
+    )
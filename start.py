@@ -5,6 +5,12 @@ from dotenv import load_dotenv
 
 load_dotenv()  # take environment variables from .env.
 
+# record the import of every module from here on, reported after the first epoch
+if "--profile-startup" in os.sys.argv:
+    from tinyagi.profiling import start_import_profile
+
+    start_import_profile()
+
 from tinyagi.main import start
 
 
@@ -22,7 +28,9 @@ def check_for_api_key():
             os.environ["OPENAI_API_KEY"] = api_key
 
 
-check_for_api_key()
+# the stub backend answers locally and doesn't need a key
+if os.environ.get("COMPLETION_BACKEND", "openai") == "openai":
+    check_for_api_key()
 
 
 def udp_listen():
@@ -57,4 +65,7 @@ start(
     seed_data="--seed" in os.sys.argv,
     paused="--stepped" in os.sys.argv,
     verbose="--verbose" in os.sys.argv,
+    prefetch_context="--prefetch-context" in os.sys.argv,
+    fused="--fused" in os.sys.argv,
+    profile_startup="--profile-startup" in os.sys.argv,
 )
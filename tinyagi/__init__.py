@@ -1,2 +1,64 @@
-from .main import *
-from .utils import *
\ No newline at end of file
+import importlib
+
+# main and utils are imported on first use, so importing one tinyagi module
+# doesn't import the whole agent. These are the names `from .main import *`
+# and `from .utils import *` exported, and the module each comes from.
+main_names = [
+    "act",
+    "build_action_index",
+    "create_context_builders",
+    "create_prefetch_steps",
+    "create_steps",
+    "decide",
+    "decide_and_act",
+    "import_actions",
+    "initialize",
+    "install_completion_backend",
+    "install_embedding_cache",
+    "install_memory_metrics",
+    "instrument_step",
+    "load_dotenv",
+    "orient",
+    "print_header",
+    "print_logo",
+    "publish_context_snapshot",
+    "publish_step",
+    "report_startup",
+    "set_loop_dict",
+    "start",
+    "start_connectors",
+    "start_loop",
+    "time_first_epoch",
+    "wipe_all_memories",
+]
+utils_names = [
+    "DEFAULT_TYPE_COLORS",
+    "OrderedDict",
+    "TOKEN_CACHE_PATH",
+    "TOKEN_CACHE_SIZE",
+    "agentlog",
+    "clear_token_cache",
+    "count_tokens",
+    "encode_and_count_tokens",
+    "get_token_cache_db",
+    "get_token_cache_stats",
+    "log",
+    "set_token_counter",
+    "token_cache",
+    "token_cache_db",
+    "token_cache_lock",
+    "token_cache_stats",
+    "token_counter",
+]
+lazy_names = {name: "main" for name in main_names}
+lazy_names.update({name: "utils" for name in utils_names})
+
+__all__ = sorted(lazy_names)
+
+
+def __getattr__(name):
+    module_name = lazy_names.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f"{__name__}.{module_name}")
+    return getattr(module, name)
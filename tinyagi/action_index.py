@@ -0,0 +1,156 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from agentaction import get_actions, get_last_action
+
+from tinyagi.embeddings import embed
+from tinyagi.knowledge_index import normalize
+
+# how many actions a search returns before recommendations are applied, as agentaction does
+ACTION_SEARCH_RESULTS = 5
+# formatted results kept for recent summaries
+ACTION_CACHE_SIZE = 256
+
+# the registered actions, embedded once. signature is what the index was built
+# from, so it is rebuilt when actions are added, removed or replaced
+action_index = {
+    "signature": None,
+    "names": [],
+    "memories": [],
+    "vectors": None,
+    "last_action": None,
+    "last_action_loaded": False,
+    "results": OrderedDict(),  # (summary hash, last action) -> formatted actions
+}
+action_index_lock = threading.Lock()
+
+
+def get_actions_signature(actions):
+    return tuple((name, id(action)) for name, action in actions.items())
+
+
+def build_action_index():
+    """
+    Embeds every registered action and formats the entry each one gets in the
+    prompt. Called after the actions are imported, and again whenever the
+    registered actions change.
+    """
+    actions = get_actions()
+    names = list(actions.keys())
+    memories = []
+    for name in names:
+        function = actions[name]["function"]
+        # the same document and metadata agentaction stores for each action
+        memories.append(
+            {
+                "id": name,
+                "document": f"{name} - {function['description']}",
+                "metadata": {"name": name, "function": json.dumps(function)},
+            }
+        )
+    vectors = None
+    if len(memories) > 0:
+        vectors = normalize(embed([memory["document"] for memory in memories]))
+    with action_index_lock:
+        action_index["signature"] = get_actions_signature(actions)
+        action_index["names"] = names
+        action_index["memories"] = memories
+        action_index["vectors"] = vectors
+        action_index["results"].clear()
+
+
+def set_last_action(action_name):
+    """
+    Records the action that was just used, so recommendations don't need to read
+    the action history. Unknown actions are ignored, they have no recommendations.
+    """
+    with action_index_lock:
+        action_index["last_action"] = action_name
+        action_index["last_action_loaded"] = True
+
+
+def get_indexed_last_action():
+    """
+    Returns: str or None - the last action used, read from the history the first time
+    """
+    with action_index_lock:
+        if action_index["last_action_loaded"]:
+            return action_index["last_action"]
+    last_action = get_last_action()
+    with action_index_lock:
+        if not action_index["last_action_loaded"]:
+            action_index["last_action"] = last_action
+            action_index["last_action_loaded"] = True
+        return action_index["last_action"]
+
+
+def rank_actions(vectors, search_text, n_results):
+    """
+    Returns: list - the indices of the actions most similar to the search text, most similar first
+    """
+    query = normalize(embed([search_text])[0])
+    similarities = vectors @ query
+    n_results = min(n_results, len(similarities))
+    top = np.argpartition(-similarities, n_results - 1)[:n_results]
+    return list(top[np.argsort(-similarities[top])])
+
+
+def get_indexed_actions(search_text):
+    """
+    Finds the actions available for a summary, the same way agentaction's
+    get_formatted_actions does, from the in-process index. The actions
+    suggested after the last action are added and the ones never allowed
+    after it are removed. Results are cached by summary and last action, so
+    the second context pass of an epoch is a lookup.
+
+    Parameters:
+    - search_text (str): The text to find relevant actions for, usually the summary.
+
+    Returns: dict - available_actions (in memory format, recommended first) and short_actions
+    """
+    actions = get_actions()
+    if action_index["signature"] != get_actions_signature(actions):
+        build_action_index()
+
+    last_action = get_indexed_last_action()
+    if last_action not in actions:
+        last_action = None
+    key = (hashlib.sha1(search_text.encode("utf-8")).hexdigest(), last_action)
+    with action_index_lock:
+        result = action_index["results"].get(key)
+        if result is not None:
+            action_index["results"].move_to_end(key)
+            return result
+        names = action_index["names"]
+        memories = action_index["memories"]
+        vectors = action_index["vectors"]
+
+    available = []
+    if len(memories) > 0:
+        ranked = rank_actions(vectors, search_text, ACTION_SEARCH_RESULTS)
+        available = [dict(memories[i]) for i in ranked]
+
+    if last_action is not None:
+        available_names = [memory["id"] for memory in available]
+        for name in actions[last_action]["suggestion_after_actions"]:
+            if name in names and name not in available_names:
+                memory = dict(memories[names.index(name)])
+                memory["recommended"] = True
+                available.append(memory)
+        never = set(actions[last_action]["never_after_actions"])
+        available = [memory for memory in available if memory["id"] not in never]
+
+    available.sort(key=lambda memory: memory.get("recommended", None) is True, reverse=True)
+    result = {
+        "available_actions": available,
+        "short_actions": "Available actions (name): "
+        + ", ".join(memory["metadata"]["name"] for memory in available),
+    }
+    with action_index_lock:
+        action_index["results"][key] = result
+        while len(action_index["results"]) > ACTION_CACHE_SIZE:
+            action_index["results"].popitem(last=False)
+    return result
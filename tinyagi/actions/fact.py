@@ -1,8 +1,8 @@
 import json
-import time
-from agentcomms.adminpanel import send_message
 from agentmemory import create_event
-from easycompletion import compose_prompt, count_tokens
+
+from tinyagi.speech import estimate_speech_duration, speak
+from tinyagi.templates import register_template
 
 
 prompt = """Notes:
@@ -17,6 +17,7 @@ Your facts and banter should be silly and edgy. Make jokes that are dark and str
 Your banter should be different from the recent banter, or continuing it.
 The fact should be a new fact, NOT a fact that has already been stated in the event stream.
 Don't acknowledge the request. Just banter."""
+template = register_template("fact", prompt)
 
 
 def state_fact(arguments):
@@ -26,13 +27,8 @@ def state_fact(arguments):
             "message": fact,
         }
     )
-    send_message(message, "chat", source="fact")
     create_event(fact, metadata={"type": "fact", "fact": fact})
-    
-    duration = count_tokens(fact) / 3.0
-    duration = int(duration)
-
-    time.sleep(duration)
+    speak(message, source="fact", duration=estimate_speech_duration(fact))
     return {"success": True, "output": fact, "error": None}
 
 def get_actions():
@@ -61,5 +57,5 @@ def get_actions():
     ]
 
 def builder(context):
-    return compose_prompt(prompt, context)
+    return template.render(context)
     
\ No newline at end of file
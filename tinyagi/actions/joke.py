@@ -1,8 +1,8 @@
 import json
-import time
-from agentcomms.adminpanel import send_message
 from agentmemory import create_event
-from easycompletion import compose_prompt, count_tokens
+
+from tinyagi.speech import estimate_speech_duration, speak
+from tinyagi.templates import register_template
 
 
 prompt = """Notes:
@@ -14,6 +14,7 @@ prompt = """Notes:
 {{events}}
 
 Say a brand new super original joke."""
+template = register_template("joke", prompt)
 
 
 def write_joke(arguments):
@@ -23,12 +24,8 @@ def write_joke(arguments):
             "message": joke,
         }
     )
-    send_message(message, "chat", source="joke")
     create_event("I told a joke:\n" + joke)
-    duration = count_tokens(joke) / 3.0
-    duration = int(duration)
-
-    time.sleep(duration)
+    speak(message, source="joke", duration=estimate_speech_duration(joke))
     return {"success": True, "output": joke, "error": None}
 
 
@@ -58,4 +55,4 @@ def get_actions():
     ]
 
 def builder(context):
-    return compose_prompt(prompt, context)
\ No newline at end of file
+    return template.render(context)
\ No newline at end of file
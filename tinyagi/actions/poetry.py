@@ -1,8 +1,8 @@
 import json
-import time
-from agentcomms.adminpanel import send_message
 from agentmemory import create_event
-from easycompletion import compose_prompt, count_tokens
+
+from tinyagi.speech import estimate_speech_duration, speak
+from tinyagi.templates import register_template
 
 
 prompt = """Notes:
@@ -15,6 +15,7 @@ prompt = """Notes:
 {{events}}
 
 Write an strange, abstract or silly poem based on the most recent events that incorporates your recent event history, goals, knowledge and personality."""
+template = register_template("poetry", prompt)
 
 
 def write_poem(arguments):
@@ -24,13 +25,8 @@ def write_poem(arguments):
             "message": poem,
         }
     )
-    
-    send_message(message, "chat", source="poem")
     create_event("I wrote a poem:\n" + poem)
-    duration = count_tokens(poem) / 3.0
-    duration = int(duration)
-
-    time.sleep(duration)
+    speak(message, source="poem", duration=estimate_speech_duration(poem))
     return {"success": True, "output": poem, "error": None}
 
 
@@ -60,4 +56,4 @@ def get_actions():
     ]
 
 def builder(context):
-    return compose_prompt(prompt, context)
\ No newline at end of file
+    return template.render(context)
\ No newline at end of file
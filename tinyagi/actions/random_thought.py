@@ -1,8 +1,8 @@
 import json
-import time
-from agentcomms.adminpanel import send_message
 from agentmemory import create_event
-from easycompletion import compose_prompt, count_tokens
+
+from tinyagi.speech import estimate_speech_duration, speak
+from tinyagi.templates import register_template
 
 
 prompt = """\
@@ -16,6 +16,7 @@ prompt = """\
 
 Come up with a random, highly creative idea or thought for me.
 """
+template = register_template("random_thought", prompt)
 
 
 def have_thought(arguments):
@@ -25,12 +26,8 @@ def have_thought(arguments):
             "message": thought,
         }
     )
-    send_message(message, "chat", source="thought")
     create_event("I had this thought: " + thought)
-    duration = count_tokens(thought) / 3.0
-    duration = int(duration)
-
-    time.sleep(duration)
+    speak(message, source="thought", duration=estimate_speech_duration(thought))
     return {"success": True, "output": thought, "error": None}
 
 
@@ -60,4 +57,4 @@ def get_actions():
     ]
 
 def builder(context):
-    return compose_prompt(prompt, context)
\ No newline at end of file
+    return template.render(context)
\ No newline at end of file
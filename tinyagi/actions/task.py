@@ -8,7 +8,8 @@ from agentagenda import (
     cancel_step,
 )
 from agentmemory import create_event
-from easycompletion import compose_prompt
+
+from tinyagi.templates import register_template
 
 
 def create_task_handler(arguments):
@@ -93,6 +94,7 @@ Current Date: {{current_date}}
 
 Based on the reasoning, create a new task
 """
+create_task_template = register_template("create_task", create_task_prompt)
 
 cancel_task_prompt = """\
 {{summary}}
@@ -102,6 +104,7 @@ cancel_task_prompt = """\
 {{events}}
 
 Based on the reasoning, should I cancel a task, and if so, which one? If you don't want to cancel the task, respond with 'none', otherwise respond with the name or goal of the task you want to cancel."""
+cancel_task_template = register_template("cancel_task", cancel_task_prompt)
 
 complete_task_prompt = """\
 {{summary}}
@@ -111,6 +114,7 @@ complete_task_prompt = """\
 {{events}}
 
 Based on the reasoning, should I complete a task, and if so, which one? If I shouldn't cancel the task, respond with 'none', otherwise respond with the name or goal of the task I should cancel."""
+complete_task_template = register_template("complete_task", complete_task_prompt)
 
 
 complete_step_prompt = """\
@@ -121,6 +125,7 @@ complete_step_prompt = """\
 {{events}}
 
 Based on the reasoning, should I complete a step on the task, and if so, which one? None, respond with 'none' for task and step."""
+complete_step_template = register_template("complete_step", complete_step_prompt)
 
 add_step_prompt = """\
 {{summary}}
@@ -130,6 +135,7 @@ add_step_prompt = """\
 {{events}}
 
 Based on the reasoning, should I add a step to the task, and if so, which task and what step? None, respond with 'none' for task and step."""
+add_step_template = register_template("add_step", add_step_prompt)
 
 cancel_step_prompt = """\
 {{summary}}
@@ -139,30 +145,31 @@ cancel_step_prompt = """\
 {{events}}
 
 Based on the reasoning, should I cancel a step in the task, and if so, which task and what step? None, respond with 'none' for task and step."""
+cancel_step_template = register_template("cancel_step", cancel_step_prompt)
 
 
 def create_task_builder(context):
-    return compose_prompt(create_task_prompt, context)
+    return create_task_template.render(context)
 
 
 def cancel_task_builder(context):
-    return compose_prompt(cancel_task_prompt, context)
+    return cancel_task_template.render(context)
 
 
 def complete_task_builder(context):
-    return compose_prompt(complete_task_prompt, context)
+    return complete_task_template.render(context)
 
 
 def complete_step_builder(context):
-    return compose_prompt(complete_step_prompt, context)
+    return complete_step_template.render(context)
 
 
 def add_step_builder(context):
-    return compose_prompt(add_step_prompt, context)
+    return add_step_template.render(context)
 
 
 def cancel_step_builder(context):
-    return compose_prompt(cancel_step_prompt, context)
+    return cancel_step_template.render(context)
 
 
 def get_actions():
@@ -0,0 +1,490 @@
+import hashlib
+import importlib
+import inspect
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+import easycompletion
+
+from tinyagi.metrics import observe
+from tinyagi.utils import count_tokens
+
+# which backend answers completions: "openai" calls the model through easycompletion,
+# "stub" answers locally with schema-valid arguments, for benchmarks and offline runs
+COMPLETION_BACKEND = os.getenv("COMPLETION_BACKEND", "openai")
+# latency of stub completions, e.g. "constant:0.5", "uniform:0.2,1.5",
+# "normal:0.8,0.2" or "lognormal:0.8,0.5" (median and sigma), in seconds
+STUB_COMPLETION_LATENCY = os.getenv("STUB_COMPLETION_LATENCY", "constant:0")
+STUB_COMPLETION_SEED = int(os.getenv("STUB_COMPLETION_SEED", 0))
+# caches completions by a hash of the normalized prompt, functions and temperature.
+# "off", "record" (always call and store), "replay" (answer only from the cache, a
+# miss is an error) or "read-through" (answer from the cache, call and store on a miss)
+COMPLETION_CACHE = os.getenv("COMPLETION_CACHE", "off")
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH", "./memory/completions.sqlite")
+
+completion_backends = {
+    "openai": {
+        "function_completion": easycompletion.function_completion,
+        "text_completion": easycompletion.text_completion,
+    },
+}
+completion_backend = {"name": "openai", "backend": completion_backends["openai"]}
+
+# library modules that call easycompletion directly, and the names they import it under
+library_completion_calls = {
+    "agentagenda.main": {
+        "openai_function_call": "function_completion",
+        "openai_text_call": "text_completion",
+    },
+}
+
+
+completion_cache = {"mode": COMPLETION_CACHE, "path": COMPLETION_CACHE_PATH, "db": None}
+completion_cache_stats = {"hits": 0, "misses": 0, "records": 0}
+completion_cache_lock = threading.Lock()
+completion_cache_modes = ["off", "record", "replay", "read-through"]
+
+# calls are keyed by easycompletion's arguments, whichever backend answers them
+completion_signatures = {
+    "function": inspect.signature(easycompletion.function_completion),
+    "text": inspect.signature(easycompletion.text_completion),
+}
+
+# the current time and date the prompts are rendered with, set by build_time_context.
+# They change between otherwise identical prompts, so they are masked in cache keys.
+# Other times and dates in a prompt, like a time in a message, are part of the key
+prompt_time_values = {"values": ()}
+
+
+class CompletionCacheMiss(Exception):
+    """
+    Raised in replay mode when a completion was never recorded
+    """
+
+
+def function_completion(*args, **kwargs):
+    """
+    Calls the current backend with a prompt and function schemas, through the completion cache.
+    Takes the same arguments and returns the same response as easycompletion's function_completion.
+    """
+    return metered_completion("function", args, kwargs)
+
+
+def text_completion(*args, **kwargs):
+    """
+    Calls the current backend with a prompt, through the completion cache.
+    Takes the same arguments and returns the same response as easycompletion's text_completion.
+    """
+    return metered_completion("text", args, kwargs)
+
+
+def metered_completion(kind, args, kwargs):
+    """
+    Answers a completion through the cache and observes its wall time and token usage
+
+    Returns: dict - The completion response.
+    """
+    start_time = time.perf_counter()
+    response, source = cached_completion(kind, args, kwargs)
+    labels = {"kind": kind, "source": source}
+    if isinstance(response, dict):
+        labels["function"] = response.get("function_name") or ""
+        usage = response.get("usage") or {}
+        if usage.get("prompt_tokens") is not None:
+            observe("tinyagi_completion_prompt_tokens", usage["prompt_tokens"], labels)
+        if usage.get("completion_tokens") is not None:
+            observe("tinyagi_completion_tokens", usage["completion_tokens"], labels)
+    observe("tinyagi_completion_seconds", time.perf_counter() - start_time, labels)
+    return response
+
+
+def set_prompt_time_values(*values):
+    """
+    Sets the current time and date values the prompts are rendered with, so
+    they don't change the cache key
+
+    Parameters:
+    - values (str): The values, e.g. context["current_time"] and context["current_date"].
+    """
+    prompt_time_values["values"] = tuple(value for value in values if value)
+
+
+def normalize_prompt(text):
+    """
+    Normalizes a prompt for the cache key. Line endings, trailing whitespace
+    and the current time and date values don't change the key.
+    """
+    if text is None:
+        return None
+    lines = [line.rstrip() for line in text.replace("\r\n", "\n").split("\n")]
+    text = "\n".join(lines).strip()
+    for value in prompt_time_values["values"]:
+        # only whole values, so 10:30 doesn't mask part of 110:305
+        text = re.sub(r"(?<![\w:-])" + re.escape(value) + r"(?![\w:-])", "<time>", text)
+    return text
+
+
+def completion_cache_key(kind, args, kwargs):
+    """
+    Hashes what decides a completion's answer: the normalized prompt, the
+    function schemas, the forced function call, the temperature and the model.
+
+    Returns: str - the key, or None if the arguments don't match easycompletion's
+    """
+    try:
+        bound = completion_signatures[kind].bind(*args, **kwargs)
+    except TypeError:
+        return None
+    bound.apply_defaults()
+    arguments = bound.arguments
+    messages = arguments.get("messages")
+    if messages is not None:
+        messages = [
+            {"role": message.get("role"), "content": normalize_prompt(message.get("content"))}
+            for message in messages
+        ]
+    key = {
+        "kind": kind,
+        "text": normalize_prompt(arguments.get("text")),
+        "messages": messages,
+        "system_message": normalize_prompt(arguments.get("system_message")),
+        "functions": arguments.get("functions"),
+        "function_call": arguments.get("function_call"),
+        "temperature": arguments.get("temperature"),
+        "model": arguments.get("model"),
+    }
+    text = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_completion_cache_db():
+    """
+    Opens the completion cache file. Must be called with completion_cache_lock held.
+
+    Returns: sqlite3.Connection
+    """
+    if completion_cache["db"] is None:
+        directory = os.path.dirname(completion_cache["path"])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(completion_cache["path"], check_same_thread=False)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS completions "
+            "(key TEXT PRIMARY KEY, kind TEXT, response TEXT, created_at REAL)"
+        )
+        completion_cache["db"] = db
+    return completion_cache["db"]
+
+
+def cached_completion(kind, args, kwargs):
+    """
+    Answers a completion from the current backend, recording or replaying it
+    according to the completion cache mode.
+
+    Parameters:
+    - kind (str): "function" or "text".
+    - args (tuple), kwargs (dict): The arguments of the completion call.
+
+    Returns: tuple - The completion response, and "cache" or the name of the backend that answered it.
+    """
+    call = completion_backend["backend"][kind + "_completion"]
+    source = completion_backend["name"]
+    mode = completion_cache["mode"]
+    if mode == "off":
+        return call(*args, **kwargs), source
+    key = completion_cache_key(kind, args, kwargs)
+    if key is None:
+        return call(*args, **kwargs), source
+
+    if mode in ["replay", "read-through"]:
+        with completion_cache_lock:
+            row = get_completion_cache_db().execute(
+                "SELECT response FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                completion_cache_stats["hits"] += 1
+                return json.loads(row[0]), "cache"
+            completion_cache_stats["misses"] += 1
+        if mode == "replay":
+            raise CompletionCacheMiss(f"No recorded {kind} completion for key {key}")
+
+    response = call(*args, **kwargs)
+    # errors are not cached, the next call should try again
+    if isinstance(response, dict) and response.get("error") is None:
+        with completion_cache_lock:
+            db = get_completion_cache_db()
+            db.execute(
+                "INSERT OR REPLACE INTO completions (key, kind, response, created_at) VALUES (?, ?, ?, ?)",
+                (key, kind, json.dumps(response), time.time()),
+            )
+            db.commit()
+            completion_cache_stats["records"] += 1
+    return response, source
+
+
+def set_completion_cache(mode, path=None):
+    """
+    Sets the completion cache mode, and optionally the file it is kept in.
+
+    Parameters:
+    - mode (str): "off", "record", "replay" or "read-through".
+    - path (str, optional): The SQLite file of the cache. Defaults to the current one.
+    """
+    if mode not in completion_cache_modes:
+        raise ValueError(f"Unknown completion cache mode: {mode}")
+    with completion_cache_lock:
+        if path is not None and path != completion_cache["path"]:
+            if completion_cache["db"] is not None:
+                completion_cache["db"].close()
+                completion_cache["db"] = None
+            completion_cache["path"] = path
+        completion_cache["mode"] = mode
+
+
+def get_completion_cache_stats():
+    """
+    Returns: dict - the mode of the completion cache, and its hit, miss and record counters
+    """
+    with completion_cache_lock:
+        stats = dict(completion_cache_stats)
+    stats["mode"] = completion_cache["mode"]
+    return stats
+
+
+def clear_completion_cache_stats():
+    """
+    Resets the counters of the completion cache. Recorded completions are kept.
+    """
+    with completion_cache_lock:
+        for key in completion_cache_stats:
+            completion_cache_stats[key] = 0
+
+
+def register_completion_backend(name, function_completion, text_completion):
+    """
+    Adds a completion backend that can be selected by name.
+
+    Parameters:
+    - name (str): The name of the backend.
+    - function_completion (callable): Answers a prompt with a function call.
+    - text_completion (callable): Answers a prompt with text.
+    """
+    completion_backends[name] = {
+        "function_completion": function_completion,
+        "text_completion": text_completion,
+    }
+
+
+def set_completion_backend(name):
+    """
+    Selects the backend every completion goes through. The stub backend is
+    created from the STUB_COMPLETION_* settings the first time it is selected.
+
+    Parameters:
+    - name (str): "openai", "stub" or the name of a registered backend.
+    """
+    if name == "stub" and name not in completion_backends:
+        stub = StubCompletion(STUB_COMPLETION_LATENCY, STUB_COMPLETION_SEED)
+        register_completion_backend("stub", stub.function_completion, stub.text_completion)
+        completion_backends["stub"]["stub"] = stub
+    if name not in completion_backends:
+        raise ValueError(f"Unknown completion backend: {name}")
+    completion_backend["name"] = name
+    completion_backend["backend"] = completion_backends[name]
+
+
+def get_completion_backend():
+    """
+    Returns: dict - the name of the current backend and its completion functions
+    """
+    return completion_backend
+
+
+def get_stub_completion():
+    """
+    Returns: StubCompletion or None - the stub backend, once it has been selected
+    """
+    return completion_backends.get("stub", {}).get("stub")
+
+
+def install_completion_backend():
+    """
+    Selects the COMPLETION_BACKEND and COMPLETION_CACHE mode, and routes the libraries
+    that call easycompletion directly, like agentagenda's planning, through them too.
+    """
+    set_completion_backend(COMPLETION_BACKEND)
+    set_completion_cache(completion_cache["mode"])
+    routes = {
+        "function_completion": function_completion,
+        "text_completion": text_completion,
+    }
+    for module_name, names in library_completion_calls.items():
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        for name, route in names.items():
+            if hasattr(module, name):
+                setattr(module, name, routes[route])
+
+
+def parse_latency(spec):
+    """
+    Parses a latency distribution
+
+    Args:
+        spec: "constant:seconds", "uniform:low,high", "normal:mean,stddev" or
+            "lognormal:median,sigma". A bare number is a constant latency
+
+    Returns:
+        sample: a function that takes a random.Random and returns a latency in seconds
+    """
+    kind, _, parameters = spec.partition(":")
+    if parameters == "":
+        kind, parameters = "constant", kind
+    values = [float(value) for value in parameters.split(",")]
+    if kind == "constant":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubCompletion:
+    """
+    A deterministic local backend. It sleeps for a latency drawn from the
+    configured distribution, then answers with text or with arguments that
+    fit the schema of the function it was given. Every call is recorded so a
+    benchmark can report prompt sizes.
+    """
+
+    def __init__(self, latency="constant:0", seed=0):
+        self.sample_latency = parse_latency(latency)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        # function name -> argument name -> a list of values or a function of the rng
+        self.argument_choices = {}
+        self.calls = []
+
+    def set_argument_choices(self, function_name, argument, choices):
+        """
+        Restricts what the stub answers for one argument, e.g. the valid action names
+        for the decision function. choices is a list or a function that takes the rng
+        """
+        self.argument_choices.setdefault(function_name, {})[argument] = choices
+
+    def reset(self, seed=0):
+        with self.lock:
+            self.rng = random.Random(seed)
+            self.calls = []
+
+    def wait(self, kind, name, text):
+        with self.lock:
+            latency = self.sample_latency(self.rng)
+        prompt_tokens = count_tokens(text or "")
+        time.sleep(latency)
+        with self.lock:
+            self.calls.append(
+                {
+                    "type": kind,
+                    "name": name,
+                    "prompt_tokens": prompt_tokens,
+                    "latency": latency,
+                }
+            )
+        return prompt_tokens
+
+    def text_completion(self, text=None, messages=None, **kwargs):
+        if text is None and messages:
+            text = "\n".join(message["content"] for message in messages)
+        prompt_tokens = self.wait("text", None, text)
+        with self.lock:
+            reply = f"stub reply {self.rng.randrange(1000000)}"
+        return {
+            "text": reply,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 3},
+            "finish_reason": "stop",
+            "error": None,
+        }
+
+    def function_completion(self, text=None, messages=None, functions=None, function_call=None, **kwargs):
+        if functions is None:
+            return {"error": "functions is required"}
+        if isinstance(functions, dict):
+            functions = [functions]
+        if text is None and messages:
+            text = "\n".join(message["content"] for message in messages)
+        with self.lock:
+            if isinstance(function_call, dict):
+                function_call = function_call["name"]
+            if isinstance(function_call, str) and function_call != "auto":
+                function = next(f for f in functions if f["name"] == function_call)
+            else:
+                function = self.rng.choice(functions)
+        prompt_tokens = self.wait("function", function["name"], text)
+        with self.lock:
+            arguments = generate_value(
+                function["parameters"],
+                self.rng,
+                self.argument_choices.get(function["name"], {}),
+            )
+        return {
+            "text": None,
+            "function_name": function["name"],
+            "arguments": arguments,
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 0},
+            "finish_reason": "function_call",
+            "error": None,
+        }
+
+
+def generate_value(schema, rng, choices=None, name="value"):
+    """
+    Generates a value that fits a JSON schema
+
+    Args:
+        schema: the JSON schema, as used in function parameters
+        rng: the random.Random to draw from
+        choices: argument name -> list of values, or a function of the rng, for object properties
+        name: the name of the value, used in generated strings
+
+    Returns:
+        value: a value of the schema's type
+    """
+    if "enum" in schema:
+        return rng.choice(list(schema["enum"]))
+    kind = schema.get("type", "string")
+    if kind == "object":
+        choices = choices or {}
+        arguments = {}
+        for key, property_schema in schema.get("properties", {}).items():
+            choice = choices.get(key)
+            if callable(choice):
+                arguments[key] = choice(rng)
+            elif choice is not None:
+                arguments[key] = rng.choice(list(choice))
+            else:
+                arguments[key] = generate_value(property_schema, rng, name=key)
+        return arguments
+    if kind == "array":
+        return [
+            generate_value(schema.get("items", {}), rng, name=name)
+            for _ in range(rng.randint(0, 2))
+        ]
+    if kind == "integer":
+        return rng.randint(0, 100)
+    if kind == "number":
+        return rng.uniform(0, 100)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return f"stub {name} {rng.randrange(1000000)}"
@@ -3,25 +3,45 @@ import json
 import os
 import threading
 
-from agentagenda import list_tasks_as_formatted_string
 from agentcomms.adminpanel import (
     async_send_message,
-    list_files_formatted,
     register_message_handler,
+    start_server,
+    unregister_message_handler,
 )
 from agentmemory import get_events
 from agentloop import pause, unpause
 from agentmemory import create_event
-from easycompletion import compose_function, compose_prompt, function_completion
+from easycompletion import compose_function
+from fastapi.responses import PlainTextResponse
 from uvicorn import Config, Server
 
-from tinyagi.context.events import build_events_context
-from tinyagi.context.knowledge import build_relevant_knowledge
-from tinyagi.steps.initialize import initialize
+from tinyagi.completion import function_completion
+from tinyagi.metrics import render_metrics
+from tinyagi.packing import compose_packed_prompt
+from tinyagi.templates import freeze, register_template
+from tinyagi.snapshot import get_connector_context
 from tinyagi.utils import log
 
+
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def create_app():
+    """
+    Creates the admin panel app, with the loop's metrics on /metrics in the Prometheus text format
+    """
+    app = start_server()
+    app.add_api_route("/metrics", metrics, methods=["GET"])
+    return app
+
+
+# the message handler registered by the current run of the connector
+chat_handler = {"handler": None}
+
 config = Config(
-    "agentcomms:start_server",
+    create_app,
     host="0.0.0.0",
     port=int(os.getenv("PORT", 8000)),
     factory=True,
@@ -71,8 +91,9 @@ Administrator: {{message}}
 
 Respond as me. Do not explain, hedge or acknolwedge. Just write the response as if you were me.
 """
+administrator_template = register_template("administrator", administrator_prompt)
 
-administrator_function = compose_function(
+administrator_function = freeze(compose_function(
     name="respond_to_adminstrator",
     description="Respond to the administrator.",
     properties={
@@ -82,7 +103,7 @@ administrator_function = compose_function(
         }
     },
     required_properties=["message"],
-)
+))
 
 
 def build_chat_context(context={}):
@@ -143,15 +164,12 @@ async def response_handler(data, loop_dict):
         send_to_feed=False,
     )
 
-    context = initialize()
-    context = build_events_context(context)
+    context = get_connector_context()
     context = build_chat_context(context)
-    context = build_relevant_knowledge(context)
-    context["user_files"] = list_files_formatted()
-
-    context["tasks"] = list_tasks_as_formatted_string()
     context["message"] = message
-    text = compose_prompt(administrator_prompt, context)
+    text = compose_packed_prompt(
+        administrator_template, context, functions=administrator_function
+    )
 
     # response = function_completion(text=text, functions=functions)
     response = function_completion(text=text, functions=administrator_function)
@@ -200,7 +218,14 @@ def start_connector(loop_dict):
         asyncio.run(server.serve())
 
     # start the server in a new thread
-    threading.Thread(target=start_server, daemon=True).start()
+    thread = threading.Thread(target=start_server, name="chat-server", daemon=True)
+    thread.start()
+
+    # Register the message handler, replacing the one from before a restart
+    if chat_handler["handler"] is not None:
+        unregister_message_handler(chat_handler["handler"])
+    chat_handler["handler"] = lambda data: response_handler(data, loop_dict)
+    register_message_handler(chat_handler["handler"])
 
-    # Register the message handler
-    register_message_handler(lambda data: response_handler(data, loop_dict))
+    # the supervisor restarts the server if this thread stops
+    return thread
@@ -0,0 +1,205 @@
+import asyncio
+import random
+
+TWITCH_IRC_HOST = "irc.chat.twitch.tv"
+TWITCH_IRC_PORT = 6667
+MAX_TIME_TO_WAIT_FOR_LOGIN = 3
+MIN_RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+IRC_READ_SIZE = 4096
+
+
+class IrcMessage:
+    """
+    A single IRC line. Field boundaries are found when the message is created,
+    but the fields are only decoded when they are read.
+    """
+
+    __slots__ = ("line", "prefix_end", "command_end", "params_end", "trailing_start")
+
+    def __init__(self, line):
+        self.line = line
+        end = len(line)
+        position = 0
+        self.prefix_end = 0
+        if line.startswith(b":"):
+            position = line.find(b" ")
+            if position == -1:
+                position = end
+            self.prefix_end = position
+            position += 1
+        self.command_end = line.find(b" ", position)
+        if self.command_end == -1:
+            self.command_end = end
+        self.trailing_start = line.find(b" :", self.command_end)
+        if self.trailing_start == -1:
+            self.params_end = end
+        else:
+            self.params_end = self.trailing_start
+            self.trailing_start += 2
+
+    @property
+    def name(self):
+        bang = self.line.find(b"!", 0, self.prefix_end)
+        if bang == -1:
+            return ""
+        return self.line[1:bang].decode(errors="replace")
+
+    @property
+    def command(self):
+        start = self.prefix_end + 1 if self.prefix_end else 0
+        return self.line[start : self.command_end].decode(errors="replace")
+
+    @property
+    def params(self):
+        params = self.line[self.command_end + 1 : self.params_end]
+        return [p.decode(errors="replace") for p in params.split(b" ")]
+
+    @property
+    def trailing(self):
+        if self.trailing_start == -1:
+            return ""
+        return self.line[self.trailing_start :].decode(errors="replace")
+
+    def __repr__(self):
+        return "IrcMessage(%r)" % self.line
+
+
+class IrcLineParser:
+    """
+    Incremental IRC parser. Bytes are appended to one buffer as they arrive and
+    complete lines are split off on \\r\\n, without scanning a byte twice.
+    A line cut between two reads is kept until the rest of it arrives.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.start = 0  # first byte that hasn't been returned as a line
+        self.scan = 0  # first byte that hasn't been searched for \r\n
+
+    def feed(self, data):
+        """
+        Adds received bytes to the buffer
+
+        Returns:
+            list: an IrcMessage for each line completed by the data
+        """
+        buffer = self.buffer
+        buffer += data
+        messages = []
+        while True:
+            end = buffer.find(b"\r\n", self.scan)
+            if end == -1:
+                # a \r at the very end might be completed by the next read
+                self.scan = max(len(buffer) - 1, self.start)
+                break
+            if end > self.start:
+                messages.append(IrcMessage(bytes(memoryview(buffer)[self.start : end])))
+            self.start = end + 2
+            self.scan = self.start
+
+        # drop consumed bytes once they are the bulk of the buffer
+        if self.start > 4096 and self.start * 2 > len(buffer):
+            del buffer[: self.start]
+            self.scan -= self.start
+            self.start = 0
+        return messages
+
+
+async def read_irc_messages(reader, parser, timeout=None):
+    """
+    Waits for the next chunk of data and parses it
+
+    Returns:
+        list: the IrcMessages completed by the chunk
+    """
+    data = await asyncio.wait_for(reader.read(IRC_READ_SIZE), timeout)
+    if not data:
+        raise ConnectionResetError("Connection closed")
+    return parser.feed(data)
+
+
+async def irc_login(reader, writer, parser, channel):
+    """
+    Logs in anonymously and joins the channel, answering PINGs while waiting.
+    Raises asyncio.TimeoutError if the server doesn't welcome us in time.
+
+    Returns:
+        list: any IrcMessages that arrived after the welcome message
+    """
+    user = "justinfan%i" % random.randint(10000, 99999)
+    writer.write(("PASS asdf\r\nNICK %s\r\n" % user).encode())
+    await writer.drain()
+
+    while True:
+        irc_messages = await read_irc_messages(
+            reader, parser, MAX_TIME_TO_WAIT_FOR_LOGIN
+        )
+        for i, irc_message in enumerate(irc_messages):
+            command = irc_message.command
+            if command == "PING":
+                writer.write(b"PONG :" + irc_message.trailing.encode() + b"\r\n")
+            elif command == "001":
+                print("Successfully logged in. Joining channel %s." % channel)
+                writer.write(("JOIN #%s\r\n" % channel).encode())
+                await writer.drain()
+                return irc_messages[i + 1 :]
+
+
+async def irc_privmsgs(channel, host=TWITCH_IRC_HOST, port=TWITCH_IRC_PORT):
+    """
+    Connects to an IRC server and yields chat messages from the channel as they arrive.
+    PINGs are answered inline, and dropped connections are retried with exponential backoff.
+
+    Args:
+        channel: the channel to join, without the leading #
+        host: the IRC server host. Defaults to Twitch
+        port: the IRC server port. Defaults to Twitch
+
+    Yields:
+        dict: the username and message of each PRIVMSG
+    """
+    delay = MIN_RECONNECT_DELAY
+    while True:
+        writer = None
+        try:
+            print("Connecting to Twitch...")
+            reader, writer = await asyncio.open_connection(host, port)
+            parser = IrcLineParser()
+            irc_messages = await irc_login(reader, writer, parser, channel)
+            delay = MIN_RECONNECT_DELAY
+
+            while True:
+                for irc_message in irc_messages:
+                    command = irc_message.command
+                    if command == "PRIVMSG":
+                        yield {
+                            "username": irc_message.name,
+                            "message": irc_message.trailing,
+                        }
+                    elif command == "PING":
+                        writer.write(
+                            b"PONG :" + irc_message.trailing.encode() + b"\r\n"
+                        )
+                        await writer.drain()
+                    elif command == "JOIN":
+                        print("Successfully joined channel %s" % irc_message.params[0])
+                    elif command == "NOTICE":
+                        print("Server notice:", irc_message.params, irc_message.trailing)
+                    elif command in ["002", "003", "004", "375", "372", "376", "353", "366"]:
+                        continue
+                    else:
+                        print("Unhandled irc message:", irc_message)
+                irc_messages = await read_irc_messages(reader, parser)
+        except ConnectionResetError:
+            print("Connection closed by Twitch. Reconnecting in %.1f seconds..." % delay)
+        except asyncio.TimeoutError:
+            print("No response from Twitch. Reconnecting in %.1f seconds..." % delay)
+        except OSError as e:
+            print("Unexpected connection error. Reconnecting in %.1f seconds..." % delay, e)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_DELAY)
@@ -1,54 +1,55 @@
 import asyncio
-import concurrent.futures
 import json
 import os
 import random
-import re
-import socket
+import threading
 import time
+from collections import deque
 
 from agentagenda import (
     get_current_task,
     get_task_as_formatted_string,
-    list_tasks_as_formatted_string,
 )
-from agentcomms.adminpanel import async_send_message, list_files_formatted
+from agentcomms.adminpanel import async_send_message
 from agentmemory import get_events
-from agentmemory import create_memory, get_memories, update_memory, create_event
+from agentmemory import get_memories, create_event
 from agentshell import get_cwd, get_history_formatted
-from easycompletion import (
-    compose_function,
-    compose_prompt,
-    count_tokens,
-    function_completion,
-    text_completion,
-)
+from easycompletion import compose_function
 from tinyagi.utils import log
 
+from tinyagi.completion import function_completion, text_completion
+
+from tinyagi.connectors.irc import irc_privmsgs
 from tinyagi.context.events import build_events_context
-from tinyagi.context.knowledge import build_recent_knowledge, build_relevant_knowledge
-from tinyagi.steps.initialize import initialize
+from tinyagi.memory import create_memories, update_memories
+from tinyagi.packing import compose_packed_prompt
+from tinyagi.snapshot import get_connector_context
+from tinyagi.speech import estimate_speech_duration, speak
+from tinyagi.templates import freeze, frozen_function, register_template
 
-queue = asyncio.Queue()  # Create a queue to pass messages between coroutines
+# Incoming chat is collected into batches, each stored with one insert and answered with one response
+TWITCH_BATCH_WINDOW = float(os.getenv("TWITCH_BATCH_WINDOW", 3.0))  # seconds to wait for more messages
+TWITCH_BATCH_SIZE = int(os.getenv("TWITCH_BATCH_SIZE", 25))  # respond early once this many arrive
+TWITCH_QUEUE_SIZE = int(os.getenv("TWITCH_QUEUE_SIZE", 200))  # oldest messages are dropped past this
 
-MAX_TIME_TO_WAIT_FOR_LOGIN = 3
+# The prompt shows chat that is new since the last response, and the last messages before it
+TWITCH_HISTORY_SIZE = int(os.getenv("TWITCH_HISTORY_SIZE", 20))  # at most this many earlier messages
+TWITCH_HISTORY_MINUTES = float(os.getenv("TWITCH_HISTORY_MINUTES", 30))  # from at most this long ago
 
-# Compile the regular expression outside of the function as it is constant
-re_prog = re.compile(
-    b"^(?::(?:([^ !\r\n]+)![^ \r\n]*|[^ \r\n]*) )?([^ \r\n]+)(?: ([^:\r\n]*))?(?: :([^\r\n]*))?\r\n",
-    re.MULTILINE,
-)
 TWITCH_CHANNEL = "isekai_citrine"
-MAX_WORKERS = 100  # Maximum number of threads you can process at a time
-
-message_queue = []
-thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
-active_tasks = []
-
-twitch_active_tasks = []
 
 time_last_spoken = time.time() - 45
 
+# Every twitch message stored this run, in the order they were stored, so the
+# context is built without reading the whole collection. Handled messages past
+# the history size fall off the end. Loaded from the store on first use.
+twitch_history = {
+    "loaded": False,
+    "unhandled": [],
+    "handled": deque(maxlen=TWITCH_HISTORY_SIZE),
+}
+twitch_history_lock = threading.Lock()
+
 
 twitch_prompt = """\
 # Background On Me
@@ -90,8 +91,9 @@ All messages from chat feed:
 
 Write a response to the new messages from my perspective, addressed from me to my friends using "I" first person.\
 """
+twitch_template = register_template("twitch", twitch_prompt)
 
-twitch_function = compose_function(
+twitch_function = freeze(compose_function(
     name="respond_to_chat",
     description="Respond to the most recent messages in chat. Either choose one message, or respond generally to the messages.",
     properties={
@@ -129,7 +131,7 @@ twitch_function = compose_function(
         },
     },
     required_properties=["banter", "emotion", "gesture", "urls"],
-)
+))
 
 prompt1 = """You are an AI storytelling agent writing spoken dialogue. Your job is to come up with interesting dialogue for me to say to my audience.     
 Directions:
@@ -203,6 +205,11 @@ prompt6 = """{{events}}
 You: Please ponder what is next for the current task. Be concise, just one sentence please. Just tell me what you're doing. Don't ask any questions, don't make any big overarching statements.
 Me:"""
 
+loop_templates = [
+    register_template("loop" + str(i + 1), prompt)
+    for i, prompt in enumerate([prompt1, prompt2, prompt3, prompt4, prompt5, prompt6])
+]
+
 
 def compose_loop_prompt(context):
     """
@@ -221,20 +228,22 @@ def compose_loop_prompt(context):
     context["current_task"] = current_task
 
     # selection prompt1, prompt2 or ptomp3 randomly
-    prompt = random.choice([prompt1, prompt2, prompt3, prompt4, prompt5, prompt6])
+    prompt = random.choice(loop_templates)
 
-    return compose_prompt(
+    return compose_packed_prompt(
         prompt,
         context,
     )
 
 
+@frozen_function
 def compose_loop_function():
     """
     This function defines the structure and requirements of the 'orient' function to be called in the 'orient' stage of the OODA loop.
 
     Returns:
         dict: A dictionary containing the details of the 'orient' function, such as its properties, description, and required properties.
+        It is built on the first call and the same frozen dictionary is returned after that.
     """
     return compose_function(
         "comment",
@@ -279,15 +288,14 @@ def compose_loop_function():
 
 
 async def respond_to_twitch():
-    context = initialize()
+    context = get_connector_context()
     context = build_twitch_context(context)
-    context = build_events_context(context)
-    context = build_relevant_knowledge(context)
-    context["user_files"] = list_files_formatted()
-    context["tasks"] = list_tasks_as_formatted_string()
-    composed_prompt = compose_prompt(twitch_prompt, context)
+    composed_prompt = compose_packed_prompt(
+        twitch_template, context, functions=twitch_function
+    )
 
-    response = function_completion(
+    response = await asyncio.to_thread(
+        function_completion,
         text=composed_prompt,
         functions=twitch_function,
     )
@@ -304,232 +312,207 @@ async def respond_to_twitch():
         for url in urls:
             os.system(f"wget -P ./files {url}")
 
-        create_memory(
-            "twitch_message",
-            banter,
-            metadata={"user": "Me", "handled": "True"},
-        )
-
-        create_event(
-            banter,
-            metadata={
-                "type": "message",
-                "creator": "Me",
-                "urls": json.dumps(urls),
-            },
-        )
+        # the store is written off the event loop, so chat keeps coming in meanwhile
+        await asyncio.to_thread(remember_twitch_response, banter, json.dumps(urls))
         message = {
             "message": banter,
             "emotion": emotion,
             "gesture": gesture,
         }
-        await async_send_message(message, source="use_chat")
+        speak(message, source="use_chat", duration=estimate_speech_duration(banter))
+
+
+def remember_twitch_response(banter, urls=None):
+    """
+    Stores my response to chat as a handled twitch message and as an event
+    """
+    remember_twitch_messages([banter], ["Me"], True)
+    metadata = {
+        "type": "message",
+        "creator": "Me",
+    }
+    if urls is not None:
+        metadata["urls"] = urls
+    create_event(banter, metadata=metadata)
+
+
+def twitch_history_entry(id, document, metadata):
+    return {
+        "id": id,
+        "user": metadata["user"],
+        "document": document,
+        "created_at": float(metadata.get("created_at", time.time())),
+    }
+
+
+def load_twitch_history():
+    """
+    Reads the latest handled and unhandled messages from the store into the
+    history, the first time it is used
+    """
+    with twitch_history_lock:
+        if twitch_history["loaded"]:
+            return
+        unhandled = get_memories(
+            "twitch_message", filter_metadata={"handled": "False"}, n_results=TWITCH_QUEUE_SIZE
+        )
+        handled = get_memories(
+            "twitch_message", filter_metadata={"handled": "True"}, n_results=TWITCH_HISTORY_SIZE
+        )
+        # the store returns the newest first
+        for memory in unhandled[::-1]:
+            twitch_history["unhandled"].append(
+                twitch_history_entry(memory["id"], memory["document"], memory["metadata"])
+            )
+        for memory in handled[::-1]:
+            twitch_history["handled"].append(
+                twitch_history_entry(memory["id"], memory["document"], memory["metadata"])
+            )
+        twitch_history["loaded"] = True
+
+
+def remember_twitch_messages(documents, users, handled):
+    """
+    Stores twitch messages with a single insert and adds them to the history
+
+    Args:
+        documents: the text of each message
+        users: who sent each message
+        handled: whether the messages have already been responded to
+
+    Returns:
+        ids: the ids of the stored messages
+    """
+    load_twitch_history()
+    metadatas = [{"user": user, "handled": str(handled)} for user in users]
+    ids = create_memories("twitch_message", documents, metadatas)
+    with twitch_history_lock:
+        entries = twitch_history["handled"] if handled else twitch_history["unhandled"]
+        for id, document, metadata in zip(ids, documents, metadatas):
+            entries.append(twitch_history_entry(id, document, metadata))
+    return ids
 
 
 def build_twitch_context(context={}):
-    memories = get_memories("twitch_message", filter_metadata={"handled": "False"})
-    old_memories = get_memories("twitch_message", filter_metadata={"handled": "True"})
-    for memory in memories:
-        # update memory
-        update_memory("twitch_message", id=memory["id"], metadata={"handled": "True"})
+    load_twitch_history()
+    cutoff = time.time() - TWITCH_HISTORY_MINUTES * 60
+    with twitch_history_lock:
+        memories = twitch_history["unhandled"]
+        twitch_history["unhandled"] = []
+        old_memories = [
+            memory for memory in twitch_history["handled"] if memory["created_at"] >= cutoff
+        ]
+        twitch_history["handled"].extend(memories)
 
-    # reverse events
-    memories = memories[::-1]
-    old_memories = old_memories[::-1]
+    # one update marks every new message as handled
+    update_memories(
+        "twitch_message",
+        [memory["id"] for memory in memories],
+        [{"handled": "True"} for _ in memories],
+    )
 
-    # annotated events
+    # annotated events, oldest first
     context["twitch"] = "\n".join(
-        [
-            (memory["metadata"]["user"] + ": " + memory["document"])
-            for memory in memories
-        ]
+        [(memory["user"] + ": " + memory["document"]) for memory in memories]
     )
 
     context["old_twitch"] = "\n".join(
-        [
-            (memory["metadata"]["user"] + ": " + memory["document"])
-            for memory in old_memories
-        ]
+        [(memory["user"] + ": " + memory["document"]) for memory in old_memories]
     )
     return context
 
 
-def twitch_connect(twitch_state, channel):
-    if twitch_state["sock"]:
-        twitch_state["sock"].close()
-    twitch_state["sock"] = None
-    twitch_state["partial"] = b""
-    twitch_state["login_ok"] = False
-    twitch_state["channel"] = channel
-
-    # Create socket
-    print("Connecting to Twitch...")
-    twitch_state["sock"] = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-    # Attempt to connect socket
-    twitch_state["sock"].connect(("irc.chat.twitch.tv", 6667))
-
-    # Log in anonymously
-    user = "justinfan%i" % random.randint(10000, 99999)
-    print("Connected to Twitch. Logging in anonymously...")
-    twitch_state["sock"].send(("PASS asdf\r\nNICK %s\r\n" % user).encode())
+def create_twitch_run():
+    """
+    Creates the state of one run of the connector. The queue belongs to the
+    event loop of the run, so every run gets its own.
 
-    twitch_state["sock"].settimeout(1.0 / 60.0)
+    Returns:
+        run: the run's message queue and the number of messages it dropped
+    """
+    return {"queue": asyncio.Queue(maxsize=TWITCH_QUEUE_SIZE), "dropped_messages": 0}
 
-    twitch_state["login_timestamp"] = time.time()
 
-    return twitch_state
+def enqueue_twitch_message(run, message):
+    """
+    Adds a chat message to the run's ingestion queue. When the queue is full the
+    oldest message is dropped so a raid can't grow the backlog without bound.
+    """
+    queue = run["queue"]
+    if queue.full():
+        queue.get_nowait()
+        run["dropped_messages"] += 1
+    queue.put_nowait(message)
 
 
-# Modify this function to take the 'twitch_state' dictionary as an argument
-def reconnect(twitch_state, delay):
-    time.sleep(delay)
-    return twitch_connect(twitch_state, twitch_state["channel"])
+def merge_twitch_messages(messages):
+    """
+    Merges consecutive messages from the same user into one message.
+    """
+    merged = []
+    for message in messages:
+        if len(merged) > 0 and merged[-1]["username"] == message["username"]:
+            merged[-1] = {
+                "username": message["username"],
+                "message": merged[-1]["message"] + " " + message["message"],
+            }
+        else:
+            merged.append(message)
+    return merged
 
 
-# Returns a list of irc messages received
-def receive_and_parse_data(twitch_state):
-    buffer = b""
-    while True:
-        received = b""
+async def collect_twitch_batch(run):
+    """
+    Waits for a message, then keeps collecting until the batch window closes
+    or the batch is full.
+    """
+    loop = asyncio.get_running_loop()
+    queue = run["queue"]
+    batch = [await queue.get()]
+    deadline = loop.time() + TWITCH_BATCH_WINDOW
+    while len(batch) < TWITCH_BATCH_SIZE:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
         try:
-            received = twitch_state["sock"].recv(4096)
-        except socket.timeout:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
             break
-        # except OSError as e:
-        #     if e.winerror == 10035:
-        #         # This "error" is expected -- we receive it if timeout is set to zero, and there is no data to read on the socket.
-        #         break
-        except Exception as e:
-            print("Unexpected connection error. Reconnecting in a second...", e)
-            reconnect(twitch_state, 1)
-            return []
-        if not received:
-            print("Connection closed by Twitch. Reconnecting in 5 seconds...")
-            reconnect(twitch_state, 5)
-            return []
-        buffer += received
-
-    if buffer:
-        # Prepend unparsed data from previous iterations
-        if twitch_state["partial"]:
-            buffer = twitch_state["partial"] + buffer
-            twitch_state["partial"] = []
-
-        # Parse irc messages
-        res = []
-        matches = list(re_prog.finditer(buffer))
-        for match in matches:
-            res.append(
-                {
-                    "name": (match.group(1) or b"").decode(errors="replace"),
-                    "command": (match.group(2) or b"").decode(errors="replace"),
-                    "params": list(
-                        map(
-                            lambda p: p.decode(errors="replace"),
-                            (match.group(3) or b"").split(b" "),
-                        )
-                    ),
-                    "trailing": (match.group(4) or b"").decode(errors="replace"),
-                }
-            )
+    return batch
 
-        # Save any data we couldn't parse for the next iteration
-        if not matches:
-            twitch_state["partial"] += buffer
-        else:
-            end = matches[-1].end()
-            if end < len(buffer):
-                twitch_state["partial"] = buffer[end:]
-
-            if matches[0].start() != 0:
-                # If we get here, we might have missed a message. pepeW
-                print("Error...")
-
-        return res
-
-    return []
-
-async def twitch_receive_messages(twitch_state):
-    loop = asyncio.get_event_loop()
-    privmsgs = await loop.run_in_executor(None, _twitch_receive_messages_sync, twitch_state)
-    return privmsgs
-
-def _twitch_receive_messages_sync(twitch_state):
-    privmsgs = []
-    for irc_message in receive_and_parse_data(twitch_state):
-        cmd = irc_message["command"]
-        if cmd == "PRIVMSG":
-            privmsgs.append(
-                {
-                    "username": irc_message["name"],
-                    "message": irc_message["trailing"],
-                }
-            )
-        elif cmd == "PING":
-            twitch_state["sock"].send(b"PONG :tmi.twitch.tv\r\n")
-        elif cmd == "001":
-            print(
-                "Successfully logged in. Joining channel %s." % twitch_state["channel"]
-            )
-            twitch_state["sock"].send(
-                ("JOIN #%s\r\n" % twitch_state["channel"]).encode()
-            )
-            twitch_state["login_ok"] = True
-        elif cmd == "JOIN":
-            print("Successfully joined channel %s" % irc_message["params"][0])
-        elif cmd == "NOTICE":
-            print("Server notice:", irc_message["params"], irc_message["trailing"])
-        elif cmd == "002":
-            continue
-        elif cmd == "003":
-            continue
-        elif cmd == "004":
-            continue
-        elif cmd == "375":
-            continue
-        elif cmd == "372":
-            continue
-        elif cmd == "376":
-            continue
-        elif cmd == "353":
-            continue
-        elif cmd == "366":
-            continue
-        else:
-            print("Unhandled irc message:", irc_message)
 
-    if not twitch_state["login_ok"]:
-        # We are still waiting for the initial login message. If we've waited longer than we should, try to reconnect.
-        if time.time() - twitch_state["login_timestamp"] > MAX_TIME_TO_WAIT_FOR_LOGIN:
-            print("No response from Twitch. Reconnecting...")
-            reconnect(twitch_state, 0)
-            return []
-
-    return privmsgs
+async def twitch_handle_messages(run):
+    global time_last_spoken
+    async for message in irc_privmsgs(TWITCH_CHANNEL):
+        log(
+            message["username"] + ": " + message["message"],
+            source="twitch",
+            color="purple",
+            type="info",
+            send_to_feed=False,
+        )
+        time_last_spoken = time.time()
+        enqueue_twitch_message(run, message)
 
 
-async def twitch_handle_messages(twitch_state):
-    global twitch_active_tasks
-    global time_last_spoken
+async def twitch_handle_batches(run):
     while True:
-        new_messages = await twitch_receive_messages(twitch_state)
-        if new_messages:
-            for message in new_messages:
-                log(
-                    message["username"] + ": " + message["message"],
-                    source="twitch",
-                    color="purple",
-                    type="info",
-                    send_to_feed=False,
-                )
-                time_last_spoken = time.time()
-                create_memory(
-                    "twitch_message",
-                    message["message"],
-                    metadata={"user": message["username"], "handled": "False"},
-                )
-                await respond_to_twitch()  # Respond to Twitch if there's a new message
+        batch = merge_twitch_messages(await collect_twitch_batch(run))
+        if run["dropped_messages"] > 0:
+            log(
+                f"Dropped {run['dropped_messages']} Twitch messages, chat is faster than I can respond",
+                source="twitch",
+                type="warning",
+                send_to_feed=False,
+            )
+            run["dropped_messages"] = 0
+        await asyncio.to_thread(
+            remember_twitch_messages,
+            [message["message"] for message in batch],
+            [message["username"] for message in batch],
+            False,
+        )
+        await respond_to_twitch()  # Respond once to the whole batch
 
 
 async def twitch_handle_loop():
@@ -573,9 +556,15 @@ async def twitch_handle_loop():
             continue
         last_event_epoch = epoch
 
-        response = text_completion(text=prompt, temperature=1.0, debug=True)
-        response2 = function_completion(
-            text=prompt, temperature=0.3, functions=compose_loop_function(), debug=True
+        response = await asyncio.to_thread(
+            text_completion, text=prompt, temperature=1.0, debug=True
+        )
+        response2 = await asyncio.to_thread(
+            function_completion,
+            text=prompt,
+            temperature=0.3,
+            functions=compose_loop_function(),
+            debug=True,
         )
         arguments = response2.get("arguments", None)
         banter = response["text"]
@@ -600,48 +589,28 @@ async def twitch_handle_loop():
                 "audio_description": audio_description,
             }
 
-            await async_send_message(message, type="emotion", source="use_chat")
-            await async_send_message(message, type="description", source="use_chat")
+            # queued with the banter so they reach the stream at the same time
+            speak(message, type="emotion", source="use_chat")
+            speak(message, type="description", source="use_chat")
 
-        create_memory(
-            "twitch_message",
-            banter,
-            metadata={"user": "Me", "handled": "True"},
-        )
-
-        create_event(
-            banter,
-            metadata={
-                "type": "message",
-                "creator": "Me",
-                # "urls": json.dumps(urls),
-            },
-        )
+        await asyncio.to_thread(remember_twitch_response, banter)
         message = {
             "message": banter,
         }
 
-        await async_send_message(message, source="use_chat")
-        duration = count_tokens(banter) / 3.0
-        duration = int(duration)
-        await asyncio.sleep(duration)
+        speak(message, source="use_chat", duration=estimate_speech_duration(banter))
 
 
 def start_connector(loop_dict):
     print("Starting Twitch connector...")
-    twitch_state = {
-        "sock": None,
-        "partial": b"",
-        "login_ok": False,
-        "channel": "",
-        "login_timestamp": 0,
-    }
-    twitch_state = twitch_connect(twitch_state, TWITCH_CHANNEL)
 
-    async def run_both_loops(twitch_state):
+    async def run_both_loops():
+        # created on the run's event loop, so a restart doesn't reuse the last run's queue
+        run = create_twitch_run()
         await asyncio.gather(
             asyncio.create_task(twitch_handle_loop()),
-            asyncio.create_task(twitch_handle_messages(twitch_state)),
+            asyncio.create_task(twitch_handle_messages(run)),
+            asyncio.create_task(twitch_handle_batches(run)),
         )
 
-    asyncio.run(run_both_loops(twitch_state))
+    asyncio.run(run_both_loops())
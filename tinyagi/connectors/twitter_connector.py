@@ -1,5 +1,6 @@
-from agentcomms.twitter import start_twitter_connector
-
 def start_connector(loop_dict):
+    # imported here so the twitter client only loads when the connector is enabled
+    from agentcomms.twitter import start_twitter_connector
+
     start_twitter_connector(loop_dict)
     return
\ No newline at end of file
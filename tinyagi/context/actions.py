@@ -1,6 +1,17 @@
-from agentaction import get_formatted_actions
+from tinyagi.action_index import get_indexed_actions
+from tinyagi.context.builder import context_builder
+from tinyagi.packing import set_section
 
 
+@context_builder(
+    reads=["summary"],
+    writes=[
+        "available_actions",
+        "available_actions_section",
+        "available_short_actions",
+        "available_action_names",
+    ],
+)
 def build_actions_context(context):
     """
     Adds the available actions to the context
@@ -8,9 +19,23 @@ def build_actions_context(context):
     search_text = context.get("summary", None)
     if search_text is None:
         return context
-    result = get_formatted_actions(search_text)
-    context["available_actions"] = result["formatted_actions"]
+    result = get_indexed_actions(search_text)
+    # the same lines agentaction's get_formatted_actions joins, so the packer can drop actions one at a time
+    set_section(
+        context,
+        "available_actions",
+        [
+            ("(recommended) " if action.get("recommended", None) is True else "")
+            + action["document"]
+            for action in result["available_actions"]
+        ],
+        header="Available actions for me to choose from:",
+        trailer="\n",
+    )
     context["available_short_actions"] = result["short_actions"]
+    context["available_action_names"] = [
+        action["metadata"]["name"] for action in result["available_actions"]
+    ]
     return context
 
 
@@ -1,7 +1,121 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 import importlib
 import os
 import sys
+import time
+
+from tinyagi.metrics import observe
+from tinyagi.utils import log
+
+builder_timings = {}  # wall time in seconds of each builder in the last build
+
+
+def context_builder(reads=None, writes=None):
+    """
+    Declares which context keys a context builder reads and writes, so that
+    builders which don't depend on each other can run concurrently.
+    Builders without a declaration run in order, one at a time.
+
+    Args:
+        reads: list of context keys the builder reads
+        writes: list of context keys the builder writes
+
+    Returns:
+        decorator: a decorator that annotates the builder function
+    """
+
+    def decorator(function):
+        function.reads = list(reads or [])
+        function.writes = list(writes or [])
+        return function
+
+    return decorator
+
+
+def get_builder_timings():
+    """
+    Returns the wall time of each context builder in the most recent build
+
+    Returns:
+        timings: a dictionary of builder name to seconds
+    """
+    return dict(builder_timings)
+
+
+def get_builder_dependencies(context_builders):
+    """
+    Works out which builders have to finish before each builder can start.
+    A builder depends on any earlier builder that writes a key it reads, and
+    an undeclared builder is ordered against every builder around it.
+
+    Returns:
+        dependencies: a list with the set of builder indices each builder waits on
+    """
+    dependencies = []
+    for i, builder in enumerate(context_builders):
+        declared = hasattr(builder, "writes")
+        waits_on = set()
+        for j in range(len(context_builders)):
+            if j == i:
+                continue
+            other = context_builders[j]
+            if not declared or not hasattr(other, "writes"):
+                if j < i:
+                    waits_on.add(j)
+            elif set(builder.reads) & set(other.writes):
+                waits_on.add(j)
+        dependencies.append(waits_on)
+    return dependencies
+
+
+def check_builder_dependencies(context_builders, dependencies):
+    """
+    Checks that every builder can be scheduled, so a build never waits forever
+    on builders that each read what the other writes
+
+    Raises:
+        ValueError: if some builders depend on each other
+    """
+    finished = set()
+    remaining = set(range(len(context_builders)))
+    while remaining:
+        ready = {i for i in remaining if dependencies[i] <= finished}
+        if len(ready) == 0:
+            names = ", ".join(sorted(context_builders[i].__name__ for i in remaining))
+            raise ValueError(f"Context builders depend on each other: {names}")
+        finished |= ready
+        remaining -= ready
+
+
+def run_context_builder(context_builder, context):
+    """
+    Runs a single builder on its own copy of the context and times it
+
+    Returns:
+        (result, elapsed): the context returned by the builder and its wall time
+    """
+    start_time = time.perf_counter()
+    result = context_builder(context)
+    return result, time.perf_counter() - start_time
+
+
+def get_package_name(directory):
+    """
+    Finds the dotted package name a directory can be imported as, so that its
+    modules are shared with the rest of tinyagi instead of imported twice
+
+    Returns:
+        package: the package name, or None if the directory isn't an importable package
+    """
+    if not os.path.exists(os.path.join(directory, "__init__.py")):
+        return None
+    for path in sys.path:
+        path = os.path.abspath(path or ".")
+        if directory.startswith(path + os.sep):
+            return os.path.relpath(directory, path).replace(os.sep, ".")
+    return None
+
 
 def create_context_builders(context_dir, verbose=False):
     """
@@ -11,13 +125,17 @@ def create_context_builders(context_dir, verbose=False):
     context: the context dictionary
     """
     context_dir = os.path.abspath(context_dir)
+    package = get_package_name(context_dir)
     sys.path.insert(0, context_dir)
 
     context_builders = []
 
     for filename in os.listdir(context_dir):
         if filename.endswith(".py"):
-            module = importlib.import_module(f"{filename[:-3]}")
+            if package is not None:
+                module = importlib.import_module(f"{package}.{filename[:-3]}")
+            else:
+                module = importlib.import_module(f"{filename[:-3]}")
 
             if hasattr(module, "get_context_builders"):
                 new_context_builders = module.get_context_builders()
@@ -25,9 +143,61 @@ def create_context_builders(context_dir, verbose=False):
                     context_builders.append(context_builder)
     sys.path.remove(context_dir)
 
+    dependencies = get_builder_dependencies(context_builders)
+    check_builder_dependencies(context_builders, dependencies)
+
     def build_context(context={}):
-        for context_builder in context_builders:
-            context = context_builder(context)
+        if context is None:
+            context = {}
+        pending = list(range(len(context_builders)))
+        running = {}
+        finished = set()
+        timings = {}
+
+        # the workers are shut down with the build, even if a builder raises
+        with ThreadPoolExecutor(max_workers=max(len(context_builders), 1)) as executor:
+            while pending or running:
+                for i in list(pending):
+                    if dependencies[i] <= finished:
+                        pending.remove(i)
+                        future = executor.submit(
+                            run_context_builder, context_builders[i], dict(context)
+                        )
+                        running[future] = i
+
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    result, elapsed = future.result()
+                    builder = context_builders[i]
+                    if hasattr(builder, "writes"):
+                        for key in builder.writes:
+                            if key in result:
+                                context[key] = result[key]
+                    else:
+                        context.update(result)
+                    timings[builder.__name__] = elapsed
+                    observe("tinyagi_context_builder_seconds", elapsed, {"builder": builder.__name__})
+                    finished.add(i)
+
+        builder_timings.clear()
+        builder_timings.update(timings)
+        if verbose:
+            log(
+                "\n".join(
+                    [
+                        f"{name}: {elapsed:.3f}s"
+                        for name, elapsed in sorted(
+                            timings.items(), key=lambda item: item[1], reverse=True
+                        )
+                    ]
+                ),
+                header="Context builder timings",
+                type="info",
+                source="builder",
+                title="tinyagi",
+                send_to_feed=False,
+            )
         return context
 
     return build_context
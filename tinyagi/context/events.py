@@ -1,15 +1,17 @@
-import json
+import threading
+
 from agentmemory import get_events
+from tinyagi.context.builder import context_builder
 from tinyagi.constants import (
     MAX_PROMPT_LIST_ITEMS,
     MAX_PROMPT_LIST_TOKENS,
     MAX_PROMPT_TOKENS,
 )
 
-from easycompletion import (
-    count_tokens,
-    trim_prompt,
-)
+from easycompletion import trim_prompt
+
+from tinyagi.packing import set_section
+from tinyagi.utils import count_tokens
 
 
 def event_to_string(event):
@@ -37,6 +39,94 @@ def event_to_string(event):
     return new_event
 
 
+# Persistent window of recent events, shared by every caller of build_events_context
+# Each entry caches the formatted event string and its token count so that
+# a steady-state epoch only formats and counts the events that are new
+event_window = {
+    "entries": [],
+    "last_epoch": None,
+    "last_epoch_ids": set(),
+}
+event_window_lock = threading.Lock()
+
+
+def reset_event_window():
+    """
+    Clears the cached event window so the next build refetches from memory.
+
+    Parameters: None
+
+    Returns: None
+    """
+    with event_window_lock:
+        event_window["entries"] = []
+        event_window["last_epoch"] = None
+        event_window["last_epoch_ids"] = set()
+
+
+def create_window_entry(event):
+    """
+    Trims an event document if needed and caches its formatted string and token count.
+
+    Parameters:
+    - event (dict): The event document to be cached.
+
+    Returns: dict - The window entry for the event.
+    """
+    document = event["document"]
+    if count_tokens(document) > MAX_PROMPT_LIST_TOKENS:
+        event["document"] = trim_prompt(document, MAX_PROMPT_LIST_TOKENS - 5) + " ..."
+    text = event_to_string(event)
+    return {
+        "id": event["id"],
+        "epoch": int(event["metadata"]["epoch"]),
+        "text": text,
+        "tokens": count_tokens(text),
+    }
+
+
+def update_event_window():
+    """
+    Appends any events newer than the last seen epoch to the event window.
+    Must be called with event_window_lock held.
+
+    Parameters: None
+
+    Returns: None
+    """
+    last_epoch = event_window["last_epoch"]
+    if last_epoch is None:
+        events = get_events(n_results=MAX_PROMPT_LIST_ITEMS)
+    else:
+        events = get_events(
+            n_results=MAX_PROMPT_LIST_ITEMS,
+            filter_metadata={"epoch": {"$gte": last_epoch}},
+        )
+        events = [
+            event
+            for event in events
+            if event["id"] not in event_window["last_epoch_ids"]
+        ]
+
+    if len(events) == 0:
+        return
+
+    # sort the events by event["metadata"]["epoch"]
+    events = sorted(events, key=lambda k: int(k["metadata"].get("epoch") or 0))
+    entries = event_window["entries"] + [create_window_entry(e) for e in events]
+    event_window["entries"] = entries[-MAX_PROMPT_LIST_ITEMS:]
+
+    # remember every id seen in the newest epoch so it is not appended twice
+    newest_epoch = entries[-1]["epoch"]
+    if newest_epoch != last_epoch:
+        event_window["last_epoch_ids"] = set()
+    event_window["last_epoch_ids"].update(
+        [entry["id"] for entry in entries if entry["epoch"] == newest_epoch]
+    )
+    event_window["last_epoch"] = newest_epoch
+
+
+@context_builder(writes=["events", "events_section"])
 def build_events_context(context={}):
     """
     Retrieve and format recent events
@@ -50,32 +140,30 @@ Recent Events are formatted as follows:
 Epoch # | Creator: <Event>
 ============================================"""
 
-    events = get_events(n_results=MAX_PROMPT_LIST_ITEMS)
-
-    # sort the events by event["metadata"]["epoch"]
-    events = sorted(events, key=lambda k: int(k["metadata"].get("epoch", 0)))
-
-    # annotated events
-    annotated_events = "\n".join([event_to_string(event) for event in events])
-
-    # trim any individual events, just in case
-    for i in range(len(events)):
-        document = events[i]["document"]
-        if count_tokens(document) > MAX_PROMPT_LIST_TOKENS:
-            events[i]["document"] = (
-                trim_prompt(document, MAX_PROMPT_LIST_TOKENS - 5) + " ..."
-            )
-
-    while count_tokens(annotated_events) > MAX_PROMPT_TOKENS:
-        # remove the first event
-        events = events[1:]
-        event_strings = [event_to_string(event) for event in events]
-        annotated_events = "\n".join(event_strings)
-    if annotated_events is not None and annotated_events != "":
-        context["events"] = events_header + "\n" + annotated_events + "\n"
-    else:
-        context["events"] = ""
-    return context
+    with event_window_lock:
+        update_event_window()
+        entries = event_window["entries"]
+
+    # keep the newest events that fit, counting one token for each newline
+    total_tokens = 0
+    start = len(entries)
+    while start > 0:
+        tokens = entries[start - 1]["tokens"] + 1
+        if total_tokens + tokens > MAX_PROMPT_TOKENS:
+            break
+        total_tokens += tokens
+        start -= 1
+
+    entries = entries[start:]
+    return set_section(
+        context,
+        "events",
+        [entry["text"] for entry in entries],
+        header=events_header,
+        trailer="\n",
+        keep="last",
+        tokens=[entry["tokens"] for entry in entries],
+    )
 
 
 def get_context_builders():
@@ -1,12 +1,23 @@
-from easycompletion import (
-    count_tokens,
-    trim_prompt,
+import threading
+
+import numpy as np
+from easycompletion import trim_prompt
+
+from tinyagi.context.builder import context_builder
+from tinyagi.embeddings import embed
+from tinyagi.knowledge_index import (
+    KNOWLEDGE_INDEX,
+    add_to_knowledge_index,
+    remove_from_knowledge_index,
+    search_knowledge_index,
 )
+from tinyagi.memory import add_id_offset, create_memories, next_memory_ids, search_memories
+from tinyagi.packing import set_section
+from tinyagi.utils import count_tokens
 
 from agentmemory import (
-    create_unique_memory,
-    delete_similar_memories,
-    get_memories,
+    delete_memory,
+    get_client,
     search_memory,
     get_epoch
 )
@@ -14,8 +25,21 @@ from agentmemory import (
 MAX_PROMPT_LIST_TOKENS = 1536  # 2048 - 512
 MAX_PROMPT_TOKENS = 3072  # 4096 - 1024
 DEFAULT_SIMILARY_THRESHOLD = 0.92  # used for detecting if things are the similar
+MAX_RECENT_KNOWLEDGE = 20
+KNOWLEDGE_EPOCHS_KEPT = 8  # only the last epoch is read, keep a few in case the loop restarts
 
+# epoch -> ids of the knowledge created in it, for the last few epochs. Epochs
+# this process wrote knowledge in through add_knowledge_batch are read by id.
+# Any other epoch, e.g. one whose knowledge was written by another process or
+# was evicted here, is scanned for in the store once, then cached. Knowledge
+# another process adds to an epoch this process also wrote isn't seen.
+knowledge_epochs = {}
+knowledge_epochs_lock = threading.Lock()
 
+
+@context_builder(
+    reads=["summary"], writes=["relevant_knowledge", "relevant_knowledge_section"]
+)
 def build_relevant_knowledge(context):
     search_text = context.get("summary", None)
     if search_text is None:
@@ -32,12 +56,15 @@ def build_relevant_knowledge(context):
     Returns: str - A string containing the formatted results of the search.
     """
     header_text = "I know these relevant things:"
-    knowledge = search_memory(
-        "knowledge",
-        search_text=search_text,
-        n_results=8,
-        filter_metadata={"unique": "True"},
-    )
+    if KNOWLEDGE_INDEX:
+        knowledge = search_knowledge_index(search_text, n_results=8)
+    else:
+        knowledge = search_memory(
+            "knowledge",
+            search_text=search_text,
+            n_results=8,
+            filter_metadata={"novel": "True"},
+        )
     # trim any individual knowledge, just in case
     for i in range(len(knowledge)):
         document = knowledge[i]["document"]
@@ -56,13 +83,16 @@ def build_relevant_knowledge(context):
         knowledge = knowledge[:-1]
         formatted_knowledge = "\n".join([k["document"] for k in knowledge])
 
-    if formatted_knowledge == "":
-        context["relevant_knowledge"] = ""
-    else:
-        context["relevant_knowledge"] = header_text + "\n" + formatted_knowledge + "\n"
-    return context
+    return set_section(
+        context,
+        "relevant_knowledge",
+        [k["document"] for k in knowledge],
+        header=header_text,
+        trailer="\n",
+    )
 
 
+@context_builder(writes=["recent_knowledge", "recent_knowledge_section"])
 def build_recent_knowledge(context):
     """
     Retrieves and formats recent knowledge.
@@ -71,9 +101,7 @@ def build_recent_knowledge(context):
 
     Returns: str - A string containing the formatted recent knowledge.
     """
-    recent_knowledge = get_memories(
-        "knowledge", filter_metadata={"epoch": get_epoch() - 1}
-    )
+    recent_knowledge = get_epoch_knowledge(get_epoch() - 1)
 
     # trim any individual knowledge, just in case
     for i in range(len(recent_knowledge)):
@@ -83,18 +111,91 @@ def build_recent_knowledge(context):
                 trim_prompt(document, MAX_PROMPT_LIST_TOKENS - 5) + " ..."
             )
 
-    formatted_knowledge = "\n".join([k["document"] for k in recent_knowledge])
+    # drop knowledge from the front until the rest fits, counting one token for each newline
+    start = len(recent_knowledge)
+    total_tokens = -1
+    while start > 0:
+        tokens = count_tokens(recent_knowledge[start - 1]["document"]) + 1
+        if total_tokens + tokens > MAX_PROMPT_TOKENS:
+            break
+        total_tokens += tokens
+        start -= 1
+    recent_knowledge = recent_knowledge[start:]
+
+    return set_section(
+        context,
+        "recent_knowledge",
+        [k["document"] for k in recent_knowledge],
+        keep="last",
+    )
+
+
+def index_knowledge_epochs(ids, metadatas):
+    """
+    Records which epoch each new knowledge item belongs to.
+
+    Parameters:
+    - ids (list): The ids of the new knowledge.
+    - metadatas (list): The metadata of each item, with its epoch.
+    """
+    with knowledge_epochs_lock:
+        for id, metadata in zip(ids, metadatas):
+            epoch = metadata.get("epoch")
+            if epoch is None:
+                continue
+            knowledge_epochs.setdefault(epoch, []).append(id)
+        evict_knowledge_epochs()
+
+
+def evict_knowledge_epochs():
+    """
+    Forgets the oldest epochs once more than KNOWLEDGE_EPOCHS_KEPT are indexed.
+    Must be called with knowledge_epochs_lock held.
+    """
+    while len(knowledge_epochs) > KNOWLEDGE_EPOCHS_KEPT:
+        del knowledge_epochs[min(knowledge_epochs)]
 
-    while count_tokens(formatted_knowledge) > MAX_PROMPT_TOKENS:
-        if len(recent_knowledge) == 1:
-            raise Exception(
-                "Single knowledge length is greater than token limit, should not happen"
-            )
-        # remove the first event
-        recent_knowledge = recent_knowledge[1:]
-        formatted_knowledge = "\n".join([k["document"] for k in recent_knowledge])
-    context["recent_knowledge"] = formatted_knowledge
-    return context
+
+def get_epoch_knowledge(epoch, n_results=MAX_RECENT_KNOWLEDGE):
+    """
+    Gets the knowledge created in an epoch, newest first. Indexed epochs are read
+    by id, so the cost depends on the epoch and not on the size of the collection.
+    Epochs that aren't indexed are scanned for once.
+
+    Parameters:
+    - epoch (int): The epoch to get knowledge for.
+    - n_results (int, optional): The maximum number of items to return.
+        Defaults to MAX_RECENT_KNOWLEDGE.
+
+    Returns: list - The knowledge, each with id, document and metadata.
+    """
+    memories = get_client().get_or_create_collection("knowledge")
+    with knowledge_epochs_lock:
+        ids = knowledge_epochs.get(epoch)
+        if ids is not None:
+            ids = list(ids)
+
+    if ids is None:
+        # not written through add_knowledge_batch here, or evicted, so scan for it once
+        knowledge = memories.get(where={"epoch": epoch}, include=["documents", "metadatas"])
+        ids = list(knowledge["ids"])
+        with knowledge_epochs_lock:
+            knowledge_epochs.setdefault(epoch, ids)
+            evict_knowledge_epochs()
+    else:
+        if len(ids) == 0:
+            return []
+        ids = sorted(ids, reverse=True)[:n_results]
+        knowledge = memories.get(ids=ids, include=["documents", "metadatas"])
+
+    results = [
+        {"id": id, "document": document, "metadata": metadata}
+        for id, document, metadata in zip(
+            knowledge["ids"], knowledge["documents"], knowledge["metadatas"]
+        )
+    ]
+    results.sort(key=lambda x: x["id"], reverse=True)
+    return results[:n_results]
 
 
 def add_knowledge(content, metadata={}, similarity=DEFAULT_SIMILARY_THRESHOLD):
@@ -110,7 +211,71 @@ def add_knowledge(content, metadata={}, similarity=DEFAULT_SIMILARY_THRESHOLD):
 
     Returns: None
     """
-    create_unique_memory("knowledge", content, metadata=metadata, similarity=similarity)
+    add_knowledge_batch([content], metadatas=[dict(metadata)], similarity=similarity)
+
+
+def add_knowledge_batch(contents, metadatas=None, similarity=DEFAULT_SIMILARY_THRESHOLD):
+    """
+    Adds several knowledge items at once, marking each like add_knowledge does.
+    Items are embedded in one batch and compared with each other by cosine similarity,
+    then the ones that are new to the batch are checked against the store with one
+    query, and everything is written with one insert.
+
+    Parameters:
+    - contents (list): The content of each knowledge item.
+    - metadatas (list, optional): Additional metadata for each item.
+        Defaults to empty dictionaries.
+    - similarity (float, optional): The threshold for determining similarity.
+        Defaults to DEFAULT_SIMILARY_THRESHOLD.
+
+    Returns: list - The ids of the created knowledge.
+    """
+    if len(contents) == 0:
+        return []
+    if metadatas is None:
+        metadatas = [{} for _ in contents]
+
+    embeddings = embed(contents)
+    ids = next_memory_ids("knowledge", len(contents))
+
+    # items that repeat an earlier item in the same batch relate to it
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    similarities = vectors @ vectors.T
+    batch_novel = []
+    for i in range(len(contents)):
+        matches = [j for j in batch_novel if similarities[i, j] >= similarity]
+        if len(matches) > 0:
+            related = max(matches, key=lambda j: similarities[i, j])
+            metadatas[i]["novel"] = "False"
+            metadatas[i]["related_to"] = ids[related]
+            metadatas[i]["related_document"] = contents[related]
+        else:
+            batch_novel.append(i)
+
+    # the rest relate to similar knowledge already in the store, if there is any
+    max_distance = 1.0 - similarity
+    results = search_memories(
+        "knowledge",
+        [embeddings[i] for i in batch_novel],
+        n_results=1,
+        filter_metadata={"novel": "True"},
+    )
+    for i, result in zip(batch_novel, results):
+        if len(result) > 0 and result[0]["distance"] <= max_distance:
+            metadatas[i]["novel"] = "False"
+            metadatas[i]["related_to"] = result[0]["id"]
+            metadatas[i]["related_document"] = result[0]["document"]
+        else:
+            metadatas[i]["novel"] = "True"
+
+    create_memories(
+        "knowledge", contents, metadatas=metadatas, embeddings=embeddings, ids=ids
+    )
+    add_to_knowledge_index(ids, contents, metadatas, embeddings)
+    index_knowledge_epochs(ids, metadatas)
+    return ids
 
 
 def remove_knowledge(content, similarity_threshold=DEFAULT_SIMILARY_THRESHOLD):
@@ -124,7 +289,20 @@ def remove_knowledge(content, similarity_threshold=DEFAULT_SIMILARY_THRESHOLD):
     Returns: bool - True if the knowledge item is found and removed, False otherwise.
     """
 
-    return delete_similar_memories("knowledge", content, similarity_threshold)
+    memories = search_memory("knowledge", content)
+    ids = []
+    for memory in memories:
+        # results are sorted by similarity, so stop at the first one that isn't similar enough
+        if 1.0 - memory["distance"] <= similarity_threshold:
+            break
+        ids.append(memory["id"])
+
+    # so the ids of new knowledge don't repeat the ids that are left
+    add_id_offset("knowledge", len(ids))
+    for id in ids:
+        delete_memory("knowledge", id)
+    remove_from_knowledge_index(ids)
+    return len(ids) > 0
 
 
 def get_context_builders():
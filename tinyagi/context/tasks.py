@@ -1,5 +1,19 @@
 from agentagenda import get_current_task, get_task_as_formatted_string, list_tasks, list_tasks_as_formatted_string
 
+from tinyagi.context.builder import context_builder
+from tinyagi.packing import set_section
+
+
+@context_builder(
+    writes=[
+        "tasks",
+        "formatted_tasks",
+        "formatted_tasks_section",
+        "current_task",
+        "current_task_formatted",
+        "current_task_formatted_section",
+    ]
+)
 def built_task_context(context):
     # get current task
     # get current task formatted
@@ -9,16 +23,24 @@ def built_task_context(context):
     context["tasks"] = ""
     if len(tasks) > 0:
         context["tasks"] = tasks
-    context["formatted_tasks"] = list_tasks_as_formatted_string()
-    if len(context["formatted_tasks"]) > 0:
-        context["formatted_tasks"] = "Tasks:\n" + context["formatted_tasks"]
+    formatted_tasks = list_tasks_as_formatted_string()
+    set_section(
+        context,
+        "formatted_tasks",
+        formatted_tasks.split("\n") if len(formatted_tasks) > 0 else [],
+        header="Tasks:",
+    )
     context["current_task"] = get_current_task()
-    if context["current_task"] is None:
-        context["current_task_formatted"] = ""
-    else:
-        context["current_task_formatted"] = get_task_as_formatted_string(context["current_task"])
-        if len(context["current_task_formatted"]) > 0:
-            context["current_task_formatted"] = "Current Task:\n" + context["current_task_formatted"]
+    current_task_formatted = ""
+    if context["current_task"] is not None:
+        current_task_formatted = get_task_as_formatted_string(context["current_task"])
+    # the current task is kept or dropped as a whole
+    set_section(
+        context,
+        "current_task_formatted",
+        [current_task_formatted] if len(current_task_formatted) > 0 else [],
+        header="Current Task:",
+    )
 
     return context
 
@@ -0,0 +1,315 @@
+import hashlib
+import importlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+# directory for the on-disk tier. Set it to an empty value to keep the cache in memory only
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./memory/embeddings")
+
+embedding_cache = OrderedDict()
+embedding_cache_stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+embedding_cache_lock = threading.Lock()
+embedding_file = None
+
+# the function that computes embeddings on a miss, and a name for it that keys the cache
+embedding_function = {"function": None, "name": "default"}
+
+
+class EmbeddingFile:
+    """
+    On-disk embedding tier. Vectors are rows of a memory-mapped .npy file and
+    a sqlite table maps each text hash to its row. The file doubles in size
+    when it fills up, so appends stay cheap.
+    """
+
+    def __init__(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, name + ".npy")
+        self.db = sqlite3.connect(
+            os.path.join(directory, name + ".sqlite"), check_same_thread=False
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, row INTEGER)"
+        )
+        # the next free row. Counting the keys would reuse rows if any were ever replaced
+        self.rows = self.db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings").fetchone()[0]
+        self.lock = threading.Lock()
+        self.vectors = None
+        if os.path.exists(self.vectors_path):
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+    def get(self, keys):
+        """
+        Returns: dict - the stored vector for each of the keys that is on disk
+        """
+        if self.vectors is None or len(keys) == 0:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        rows = self.db.execute(
+            f"SELECT hash, row FROM embeddings WHERE hash IN ({placeholders})", keys
+        ).fetchall()
+        return {key: np.array(self.vectors[row]) for key, row in rows}
+
+    def put(self, keys, vectors):
+        """
+        Appends vectors to the file and indexes them by key. Keys that are
+        already stored, e.g. by another thread that embedded the same text, are skipped.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock:
+            placeholders = ",".join("?" * len(keys))
+            stored = {
+                key
+                for (key,) in self.db.execute(
+                    f"SELECT hash FROM embeddings WHERE hash IN ({placeholders})", keys
+                )
+            }
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in stored and key not in new:
+                    new[key] = vector
+            if len(new) == 0:
+                return
+            self.reserve(self.rows + len(new), vectors.shape[1])
+            start = self.rows
+            self.vectors[start : start + len(new)] = np.stack(list(new.values()))
+            self.vectors.flush()
+            self.db.executemany(
+                "INSERT INTO embeddings (hash, row) VALUES (?, ?)",
+                [(key, start + i) for i, key in enumerate(new)],
+            )
+            self.db.commit()
+            self.rows += len(new)
+
+    def reserve(self, rows, dimensions):
+        if self.vectors is not None and self.vectors.shape[0] >= rows:
+            return
+        capacity = max(1024, rows)
+        if self.vectors is not None:
+            capacity = max(capacity, self.vectors.shape[0] * 2)
+        temporary_path = self.vectors_path + ".tmp"
+        vectors = np.lib.format.open_memmap(
+            temporary_path, mode="w+", dtype=np.float32, shape=(capacity, dimensions)
+        )
+        if self.vectors is not None:
+            vectors[: self.rows] = self.vectors[: self.rows]
+            del self.vectors
+        vectors.flush()
+        del vectors
+        os.replace(temporary_path, self.vectors_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+    def close(self):
+        self.db.close()
+        self.vectors = None
+
+
+def set_embedding_function(function, name):
+    """
+    Sets the function used to compute embeddings on a cache miss.
+
+    Parameters:
+    - function (callable): Takes a list of texts and returns a list of vectors.
+    - name (str): A name for the model. Cached vectors are only reused for the same name.
+    """
+    global embedding_file
+    with embedding_cache_lock:
+        embedding_function["function"] = function
+        embedding_function["name"] = name
+        embedding_cache.clear()
+        if embedding_file is not None:
+            embedding_file.close()
+            embedding_file = None
+
+
+def get_embedding_function():
+    """
+    Returns: callable - the embedding function, the store's default model unless one was set
+    """
+    if embedding_function["function"] is None:
+        # imported on first use, loading the default model is slow
+        embedding_functions = importlib.import_module(
+            "chromadb.utils.embedding_functions"
+        )
+        embedding_function["function"] = embedding_functions.DefaultEmbeddingFunction()
+    return embedding_function["function"]
+
+
+def get_embedding_file():
+    """
+    Opens the on-disk embedding tier, if EMBEDDING_CACHE_PATH is set.
+    Must be called with embedding_cache_lock held.
+
+    Returns: EmbeddingFile or None
+    """
+    global embedding_file
+    if embedding_file is None and EMBEDDING_CACHE_PATH:
+        embedding_file = EmbeddingFile(EMBEDDING_CACHE_PATH, embedding_function["name"])
+    return embedding_file
+
+
+def embed(texts):
+    """
+    Embeds a list of texts, memoized by a hash of each text's content.
+    Lookups go through a size-bounded in-memory LRU, then the on-disk tier,
+    and the texts missing from both are embedded in a single call.
+
+    Parameters:
+    - texts (list): The texts to embed.
+
+    Returns: list - An embedding (a list of floats) for each text.
+    """
+    keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+    vectors = {}
+
+    with embedding_cache_lock:
+        for key in keys:
+            vector = embedding_cache.get(key)
+            if vector is not None:
+                embedding_cache.move_to_end(key)
+                embedding_cache_stats["hits"] += 1
+                vectors[key] = vector
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        disk = get_embedding_file()
+        if disk is not None:
+            stored = disk.get(missing)
+            embedding_cache_stats["disk_hits"] += len(stored)
+            vectors.update(stored)
+
+    missing_texts = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors:
+            missing_texts[key] = text
+    if len(missing_texts) > 0:
+        computed = get_embedding_function()(list(missing_texts.values()))
+        computed = np.asarray(computed, dtype=np.float32)
+        with embedding_cache_lock:
+            embedding_cache_stats["misses"] += len(missing_texts)
+            disk = get_embedding_file()
+            if disk is not None:
+                disk.put(list(missing_texts.keys()), computed)
+        vectors.update(zip(missing_texts.keys(), computed))
+
+    with embedding_cache_lock:
+        for key in keys:
+            embedding_cache[key] = vectors[key]
+            embedding_cache.move_to_end(key)
+        while len(embedding_cache) > EMBEDDING_CACHE_SIZE:
+            embedding_cache.popitem(last=False)
+    return [vectors[key].tolist() for key in keys]
+
+
+def get_embedding_cache_stats():
+    """
+    Returns the hit and miss counters of the embedding cache.
+
+    Returns: dict - hits, disk_hits, misses, hit_ratio and the current in-memory size.
+    """
+    with embedding_cache_lock:
+        stats = dict(embedding_cache_stats)
+        stats["size"] = len(embedding_cache)
+    lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_ratio"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+    return stats
+
+
+def clear_embedding_cache():
+    """
+    Empties the in-memory embedding cache and resets its counters.
+    The on-disk tier is left untouched.
+    """
+    with embedding_cache_lock:
+        embedding_cache.clear()
+        for key in embedding_cache_stats:
+            embedding_cache_stats[key] = 0
+
+
+class CachedEmbeddingCollection:
+    """
+    Wraps a memory collection so documents and query texts are embedded
+    through the cache before they reach the store.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        if embeddings is None and documents is not None:
+            embeddings = embed(documents)
+        return self.collection.add(
+            ids, documents=documents, metadatas=metadatas, embeddings=embeddings
+        )
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        if embeddings is None and documents is not None:
+            embeddings = embed(documents)
+        return self.collection.upsert(
+            ids, documents=documents, metadatas=metadatas, embeddings=embeddings
+        )
+
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        if embeddings is None and documents is not None:
+            embeddings = embed(documents)
+        return self.collection.update(
+            ids, documents=documents, metadatas=metadatas, embeddings=embeddings
+        )
+
+    def query(
+        self,
+        query_embeddings=None,
+        query_texts=None,
+        n_results=10,
+        where=None,
+        where_document=None,
+        include=["metadatas", "documents", "distances"],
+    ):
+        if query_embeddings is None and query_texts is not None:
+            query_embeddings = embed(query_texts)
+            query_texts = None
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            query_texts=query_texts,
+            n_results=n_results,
+            where=where,
+            where_document=where_document,
+            include=include,
+        )
+
+
+class CachedEmbeddingMemory:
+    """
+    Wraps a memory client so every collection it opens embeds through the cache.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def get_or_create_collection(self, category, metadata=None):
+        return CachedEmbeddingCollection(
+            self.client.get_or_create_collection(category, metadata)
+        )
+
+    def get_collection(self, category):
+        return CachedEmbeddingCollection(self.client.get_collection(category))
+
+
+def install_embedding_cache():
+    """
+    Routes every memory write and search through the embedding cache, including
+    the ones made by agentmemory and agentaction directly.
+    """
+    client_module = importlib.import_module("agentmemory.client")
+    client = client_module.get_client()
+    if not isinstance(client, CachedEmbeddingMemory):
+        client_module.client = CachedEmbeddingMemory(client)
@@ -0,0 +1,173 @@
+import os
+import threading
+
+import numpy as np
+from agentmemory import get_client
+
+from tinyagi.embeddings import embed
+
+# keep an in-process copy of the novel knowledge and search it instead of the store
+KNOWLEDGE_INDEX = os.getenv("KNOWLEDGE_INDEX", "false").lower() == "true"
+
+# rows are unit vectors, so a dot product with a unit query is the cosine similarity
+knowledge_index = {
+    "loaded": False,
+    "vectors": None,
+    "size": 0,
+    "ids": [],
+    "documents": [],
+    "metadatas": [],
+    "rows": {},  # id -> row
+}
+knowledge_index_lock = threading.Lock()
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def append_rows(ids, documents, metadatas, embeddings):
+    """
+    Appends rows to the index, growing the matrix by doubling.
+    Must be called with knowledge_index_lock held.
+    """
+    # a write can land in the store before a concurrent load reads it
+    new = [i for i, id in enumerate(ids) if id not in knowledge_index["rows"]]
+    if len(new) == 0:
+        return
+    ids = [ids[i] for i in new]
+    documents = [documents[i] for i in new]
+    metadatas = [metadatas[i] for i in new]
+    rows = normalize([embeddings[i] for i in new])
+    size = knowledge_index["size"]
+    vectors = knowledge_index["vectors"]
+    if vectors is None:
+        vectors = np.empty((max(1024, len(ids)), rows.shape[1]), dtype=np.float32)
+    elif size + len(ids) > vectors.shape[0]:
+        grown = np.empty(
+            (max(vectors.shape[0] * 2, size + len(ids)), vectors.shape[1]),
+            dtype=np.float32,
+        )
+        grown[:size] = vectors[:size]
+        vectors = grown
+    vectors[size : size + len(ids)] = rows
+    knowledge_index["vectors"] = vectors
+    knowledge_index["size"] = size + len(ids)
+    for i, id in enumerate(ids):
+        knowledge_index["rows"][id] = size + i
+    knowledge_index["ids"].extend(ids)
+    knowledge_index["documents"].extend(documents)
+    knowledge_index["metadatas"].extend(metadatas)
+
+
+def load_knowledge_index():
+    """
+    Fills the index from the novel knowledge in the store, the first time it's used.
+    Must be called with knowledge_index_lock held.
+    """
+    if knowledge_index["loaded"]:
+        return
+    memories = get_client().get_or_create_collection("knowledge")
+    knowledge = memories.get(
+        where={"novel": "True"}, include=["documents", "metadatas", "embeddings"]
+    )
+    append_rows(
+        list(knowledge["ids"]),
+        list(knowledge["documents"]),
+        list(knowledge["metadatas"]),
+        knowledge["embeddings"],
+    )
+    knowledge_index["loaded"] = True
+
+
+def add_to_knowledge_index(ids, documents, metadatas, embeddings):
+    """
+    Adds newly written knowledge to the index. Only novel knowledge is kept.
+
+    Parameters:
+    - ids (list): The ids of the knowledge.
+    - documents (list): The content of each item.
+    - metadatas (list): The metadata of each item.
+    - embeddings (list): The embedding of each item.
+    """
+    novel = [i for i, metadata in enumerate(metadatas) if metadata.get("novel") == "True"]
+    with knowledge_index_lock:
+        # unloaded indexes pick the new rows up from the store when they load
+        if not knowledge_index["loaded"]:
+            return
+        append_rows(
+            [ids[i] for i in novel],
+            [documents[i] for i in novel],
+            [metadatas[i] for i in novel],
+            [embeddings[i] for i in novel],
+        )
+
+
+def remove_from_knowledge_index(ids):
+    """
+    Removes knowledge from the index by id.
+
+    Parameters:
+    - ids (list): The ids of the removed knowledge.
+    """
+    ids = set(ids)
+    with knowledge_index_lock:
+        if not knowledge_index["loaded"]:
+            return
+        size = knowledge_index["size"]
+        keep = [i for i in range(size) if knowledge_index["ids"][i] not in ids]
+        if len(keep) == size:
+            return
+        knowledge_index["vectors"][: len(keep)] = knowledge_index["vectors"][keep]
+        knowledge_index["size"] = len(keep)
+        for key in ["ids", "documents", "metadatas"]:
+            knowledge_index[key] = [knowledge_index[key][i] for i in keep]
+        knowledge_index["rows"] = {id: i for i, id in enumerate(knowledge_index["ids"])}
+
+
+def search_knowledge_index(search_text, n_results=5):
+    """
+    Finds the knowledge most similar to the search text with one matrix-vector product.
+
+    Parameters:
+    - search_text (str): The text to search for.
+    - n_results (int, optional): The number of results to return. Defaults to 5.
+
+    Returns: list - The results, most similar first, with id, document, metadata
+        and distance (the cosine distance to the search text).
+    """
+    query = normalize(embed([search_text])[0])
+    with knowledge_index_lock:
+        load_knowledge_index()
+        size = knowledge_index["size"]
+        if size == 0:
+            return []
+        similarities = knowledge_index["vectors"][:size] @ query
+        n_results = min(n_results, size)
+        top = np.argpartition(-similarities, n_results - 1)[:n_results]
+        top = top[np.argsort(-similarities[top])]
+        return [
+            {
+                "id": knowledge_index["ids"][i],
+                "document": knowledge_index["documents"][i],
+                "metadata": knowledge_index["metadatas"][i],
+                "distance": float(1.0 - similarities[i]),
+            }
+            for i in top
+        ]
+
+
+def reset_knowledge_index():
+    """
+    Empties the index. It is refilled from the store on the next search.
+    """
+    with knowledge_index_lock:
+        knowledge_index["loaded"] = False
+        knowledge_index["vectors"] = None
+        knowledge_index["size"] = 0
+        knowledge_index["ids"] = []
+        knowledge_index["documents"] = []
+        knowledge_index["metadatas"] = []
+        knowledge_index["rows"] = {}
@@ -0,0 +1,156 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Log records are appended to a bounded buffer and a background worker sends
+# them to the admin panel feed, one message per record as before, and appends
+# them to the optional JSONL file, so logging never waits on a socket or the disk.
+# deque.append and popleft are atomic, so neither side takes a lock. When
+# the buffer is full the oldest records are dropped.
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", 10000))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 0.25))  # seconds between flushes
+LOG_FILE = os.getenv("LOG_FILE")  # optional JSONL file of every record
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")  # debug also prints each feed message
+
+log_buffer = deque(maxlen=LOG_BUFFER_SIZE)
+log_settings = {"level": LOG_LEVEL, "file": LOG_FILE or None}
+# the counters are only updated by one thread each, or are approximate
+log_stats = {"queued": 0, "dropped": 0, "flushes": 0, "sent": 0, "written": 0}
+log_worker = {"thread": None}
+log_worker_lock = threading.Lock()
+# held while the buffer is drained and written, so records keep their order
+log_flush_lock = threading.Lock()
+
+
+def set_log_level(level):
+    """
+    Sets the log level, debug or info. Debug prints each feed message as it is logged.
+    """
+    log_settings["level"] = level
+
+
+def get_log_level():
+    return log_settings["level"]
+
+
+def set_log_file(path):
+    """
+    Sets the JSONL file every log record is appended to, or None to stop writing one
+    """
+    with log_flush_lock:
+        log_settings["file"] = path or None
+
+
+def queue_log(output, type="info", title="tinyagi", source="tinyagi", feed=True):
+    """
+    Queues a log record for the feed and the log file. Returns straight away.
+
+    Args:
+        output: the message, header and color the feed shows
+        type: the log type, e.g. info or error
+        title: the title of the console line
+        source: where the log came from
+        feed: whether the record is sent to the admin panel feed
+    """
+    if not feed and log_settings["file"] is None:
+        return
+    record = dict(output)
+    record.update({"time": time.time(), "type": type, "title": title, "source": source, "feed": feed})
+    if len(log_buffer) == log_buffer.maxlen:
+        log_stats["dropped"] += 1
+    log_buffer.append(record)
+    log_stats["queued"] += 1
+    if log_worker["thread"] is None:
+        start_log_worker()
+
+
+def drain_log_buffer():
+    """
+    Returns: list - the queued records, oldest first, removed from the buffer
+    """
+    records = []
+    while True:
+        try:
+            records.append(log_buffer.popleft())
+        except IndexError:
+            return records
+
+
+def send_feed_messages(records):
+    """
+    Sends records to the admin panel feed, each as the message it would have
+    been sent as when it was logged, so the panel's payload doesn't change.
+    The admin panel can only have a socket open once the chat connector has
+    imported and started it, so until then there is nothing to send to and
+    agentcomms, which is slow to import, isn't imported here.
+    """
+    adminpanel = sys.modules.get("agentcomms.adminpanel")
+    if adminpanel is None or len(records) == 0:
+        return
+    for record in records:
+        adminpanel.send_message(
+            {"message": record["message"], "header": record["header"], "color": record["color"]},
+            "feed",
+            "log",
+        )
+        log_stats["sent"] += 1
+    log_stats["flushes"] += 1
+
+
+def write_log_file(records):
+    path = log_settings["file"]
+    if path is None or len(records) == 0:
+        return
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record, default=str) + "\n")
+    log_stats["written"] += len(records)
+
+
+def flush_logs():
+    """
+    Sends and writes every queued record now. The worker calls it each
+    interval, and it runs once more when the process exits.
+    """
+    with log_flush_lock:
+        records = drain_log_buffer()
+        if len(records) == 0:
+            return
+        try:
+            send_feed_messages([record for record in records if record["feed"]])
+        except Exception as e:
+            print(f"Failed to send log feed: {e}", file=sys.stderr)
+        try:
+            write_log_file(records)
+        except Exception as e:
+            print(f"Failed to write log file: {e}", file=sys.stderr)
+
+
+def log_worker_loop():
+    while True:
+        time.sleep(LOG_FLUSH_INTERVAL)
+        flush_logs()
+
+
+def start_log_worker():
+    with log_worker_lock:
+        if log_worker["thread"] is None:
+            thread = threading.Thread(target=log_worker_loop, name="log-sink", daemon=True)
+            log_worker["thread"] = thread
+            thread.start()
+            atexit.register(flush_logs)
+
+
+def get_log_stats():
+    """
+    Returns: dict - records queued, dropped because the buffer was full, flushes
+    that sent to the feed and records sent, records written to the file and the
+    current buffer size
+    """
+    stats = dict(log_stats)
+    stats["buffered"] = len(log_buffer)
+    return stats
@@ -3,20 +3,38 @@ from dotenv import load_dotenv
 from agentlogger import print_header
 from tinyagi.constants import set_loop_dict
 from tinyagi.utils import log
-import importlib
 import os
-import sys
+import time
 from agentaction import import_actions
 from agentmemory import wipe_all_memories
 from agentloop import (
     start as start_loop,
 )
+from tinyagi.action_index import build_action_index
+from tinyagi.completion import install_completion_backend
 from tinyagi.context.builder import create_context_builders
+from tinyagi.context.events import reset_event_window
+from tinyagi.embeddings import install_embedding_cache
+from tinyagi.knowledge_index import reset_knowledge_index
+from tinyagi.memory import install_id_offsets, reset_id_offsets
+from tinyagi.metrics import install_memory_metrics, instrument_step
+from tinyagi.pipeline import create_prefetch_steps
+from tinyagi.retention import start_compactor
+from tinyagi.snapshot import publish_context_snapshot
+from tinyagi.supervisor import (
+    get_connector_status,
+    get_startup_milestones,
+    once_after,
+    report_startup,
+    start_connectors,
+    time_first_epoch,
+)
 
 from tinyagi.steps.initialize import initialize
 
 from tinyagi.steps import act
 from tinyagi.steps import decide
+from tinyagi.steps import decide_and_act
 from tinyagi.steps import orient
 
 # Suppress warning
@@ -35,23 +53,81 @@ def print_logo():
     log("Starting...", type="system", color="BRIGHT_BLACK")
 
 
-def start_connectors(connectors_dir, loop_dict):
+def publish_step(step):
     """
-    Build a context step function from the context builders in the given directory
+    Wraps a loop step so the context it returns is published for the connectors
 
     Returns:
-    context: the context dictionary
+    published_step: the wrapped step function
+    """
+
+    if step.__code__.co_argcount == 2:
+
+        def published_step(context, loop_data):
+            context = step(context, loop_data)
+            publish_context_snapshot(context)
+            return context
+
+    else:
+
+        def published_step(context):
+            context = step(context)
+            publish_context_snapshot(context)
+            return context
+
+    published_step.__name__ = step.__name__
+    return published_step
+
+
+def print_startup_report():
+    """
+    Prints the startup profile once the first epoch has finished. The import
+    profile has to be started before tinyagi.main is imported, start.py does
+    it for --profile-startup.
     """
-    connectors_dir = os.path.abspath(connectors_dir)
-    sys.path.insert(0, connectors_dir)
+    from tinyagi.profiling import print_startup_profile
 
-    for filename in os.listdir(connectors_dir):
-        if filename.endswith(".py"):
-            module = importlib.import_module(f"{filename[:-3]}")
+    print_startup_profile(get_startup_milestones(), get_connector_status())
 
-            if hasattr(module, "start_connector"):
-                module.start_connector(loop_dict)
-    sys.path.remove(connectors_dir)
+
+def reset_memory_caches():
+    """
+    Forgets what was read from the memory store, after the store is wiped:
+    the id offsets, the window of recent events and the knowledge index
+    """
+    reset_id_offsets()
+    reset_event_window()
+    reset_knowledge_index()
+
+
+def create_steps(context_dir="./tinyagi/context", verbose=False, prefetch_context=False, fused=False):
+    """
+    Builds the default step list of the loop
+
+    Returns:
+    steps: the step functions, in order
+    step_interval: the time in seconds the loop should wait between epochs
+    """
+    context_step = create_context_builders(context_dir, verbose)
+    if prefetch_context:
+        # context is built while the completions wait, and each step moves on as soon as it finishes
+        return create_prefetch_steps(context_step, fused=fused), 0
+    if fused:
+        # one completion picks the action and fills in its arguments
+        return [
+            initialize,
+            orient,
+            context_step,
+            decide_and_act,
+        ], 2
+    return [
+        initialize,
+        orient,
+        context_step,
+        decide,
+        context_step,
+        act,
+    ], 2
 
 
 def start(
@@ -63,34 +139,44 @@ def start(
     reset=False,
     paused=False,
     verbose=False,
+    prefetch_context=False,
+    fused=False,
+    profile_startup=False,
 ):
+    start_time = time.perf_counter()
     print_logo()
 
+    step_interval = 2
     if steps is None:
-        context_step = create_context_builders(context_dir, verbose)
-        steps = [
-            initialize,
-            orient,
-            context_step,
-            decide,
-            context_step,
-            act,
-        ]
+        steps, step_interval = create_steps(context_dir, verbose, prefetch_context, fused)
+    steps = [publish_step(instrument_step(step)) for step in steps]
+    steps = time_first_epoch(steps, start_time)
+    if profile_startup:
+        steps[-1] = once_after(steps[-1], print_startup_report)
+    install_embedding_cache()
+    install_memory_metrics()
+    install_completion_backend()
     if reset:
         wipe_all_memories()
+        reset_memory_caches()
+    install_id_offsets()
 
     if actions_dir is not None:
         log("WARNING: Imported actions from " + actions_dir, type="warning")
         import_actions(actions_dir)
+        build_action_index()
     else:
         print("No actions directory provided, skipping import")
 
     # if seed_data is not None:
     #     import_file_to_memory(seed_data)
     log("Starting loop...", type="system")
-    loop_dict = start_loop(steps, paused=paused, step_interval=2)
+    loop_dict = start_loop(steps, paused=paused, step_interval=step_interval)
     set_loop_dict(loop_dict)
+    start_compactor(loop_dict["stop_event"])
 
-    start_connectors(connectors_dir, loop_dict)
+    if connectors_dir is not None:
+        start_connectors(connectors_dir, loop_dict)
+    report_startup("started", start_time)
 
     return loop_dict
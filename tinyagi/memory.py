@@ -0,0 +1,239 @@
+import datetime
+import importlib
+import threading
+
+from agentmemory import get_client
+
+# Memory ids are zero-padded insertion counts, the store numbers a new memory
+# by the size of its collection. Once memories are deleted the size no longer
+# counts every insert, so the number deleted from each collection is kept in
+# the store and added on. It is wiped with the rest of the store.
+ID_OFFSETS_CATEGORY = "memory_id_offsets"
+
+id_offsets = {}  # category -> memories deleted, read from the store on first use
+id_offsets_lock = threading.Lock()
+
+
+def get_id_offset(category):
+    """
+    Returns: int - how many memories have been deleted from a collection, so
+    new ids start after every id handed out before
+    """
+    offset = id_offsets.get(category)
+    if offset is not None:
+        return offset
+    with id_offsets_lock:
+        if category not in id_offsets:
+            result = get_client().get_or_create_collection(ID_OFFSETS_CATEGORY).get(
+                ids=[category], include=["metadatas"]
+            )
+            metadatas = result["metadatas"] if isinstance(result, dict) else []
+            id_offsets[category] = int(metadatas[0]["deleted"]) if metadatas else 0
+        return id_offsets[category]
+
+
+def add_id_offset(category, count):
+    """
+    Records that memories are about to be deleted from a collection. Call it
+    before deleting them, so an id is never handed out twice.
+
+    Parameters:
+    - category (str): The collection the memories are deleted from.
+    - count (int): The number of memories.
+    """
+    if count == 0:
+        return
+    get_id_offset(category)
+    with id_offsets_lock:
+        offset = id_offsets[category] + count
+        # the offsets have no text to embed, so they get a placeholder embedding
+        get_client().get_or_create_collection(ID_OFFSETS_CATEGORY).upsert(
+            ids=[category],
+            documents=[str(offset)],
+            metadatas=[{"deleted": offset}],
+            embeddings=[[0.0]],
+        )
+        id_offsets[category] = offset
+
+
+def reset_id_offsets():
+    """
+    Forgets the offsets read from the store, after the store is wiped
+    """
+    with id_offsets_lock:
+        id_offsets.clear()
+
+
+class OffsetCollection:
+    """
+    Wraps a memory collection so memories created without an id are numbered
+    after every id handed out before, including the deleted ones
+    """
+
+    def __init__(self, collection, category):
+        self.collection = collection
+        self.category = category
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        if any(id is None for id in ids):
+            # read the size first, the offset grows before memories are deleted
+            origin = self.collection.count()
+            origin += get_id_offset(self.category)
+            ids = [str(i).zfill(16) for i in range(origin, origin + len(ids))]
+        return self.collection.upsert(
+            ids, documents=documents, metadatas=metadatas, embeddings=embeddings
+        )
+
+
+class OffsetMemory:
+    """
+    Wraps a memory client so every collection it opens numbers new memories after the deleted ones
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def get_or_create_collection(self, category, metadata=None):
+        return OffsetCollection(self.client.get_or_create_collection(category, metadata), category)
+
+    def get_collection(self, category):
+        return OffsetCollection(self.client.get_collection(category), category)
+
+
+def install_id_offsets():
+    """
+    Numbers the memories agentmemory creates after the deleted ones too. Install
+    it whenever memories may have been deleted, even if retention is now off.
+    """
+    client_module = importlib.import_module("agentmemory.client")
+    client = client_module.get_client()
+    if not isinstance(client, OffsetMemory):
+        client_module.client = OffsetMemory(client)
+
+
+def next_memory_ids(category, count):
+    """
+    Returns the ids the next memories inserted into a collection will get.
+
+    Parameters:
+    - category (str): The collection the memories will be inserted into.
+    - count (int): The number of ids to return.
+
+    Returns: list - The ids, in insertion order.
+    """
+    # ids follow the same zero-padded count scheme the store uses for create_memory
+    origin = get_client().get_or_create_collection(category).count()
+    origin += get_id_offset(category)
+    return [str(i).zfill(16) for i in range(origin, origin + count)]
+
+
+def create_memories(category, documents, metadatas=None, embeddings=None, ids=None):
+    """
+    Creates several memories in a collection with a single insert.
+
+    Parameters:
+    - category (str): The collection to insert into.
+    - documents (list): The document text of each memory.
+    - metadatas (list, optional): The metadata of each memory. Defaults to empty metadata.
+    - embeddings (list, optional): Precomputed embeddings. Computed by the store if None.
+    - ids (list, optional): The ids of the memories. Defaults to the next ids in the collection.
+
+    Returns: list - The ids of the created memories.
+    """
+    if len(documents) == 0:
+        return []
+    if metadatas is None:
+        metadatas = [{} for _ in documents]
+
+    memories = get_client().get_or_create_collection(category)
+    if ids is None:
+        ids = next_memory_ids(category, len(documents))
+
+    now = datetime.datetime.now().timestamp()
+    for metadata in metadatas:
+        metadata["created_at"] = now
+        metadata["updated_at"] = now
+        # the store only accepts scalar metadata, so convert like create_memory does
+        for key, value in metadata.items():
+            if isinstance(value, (bool, dict, list)):
+                metadata[key] = str(value)
+
+    memories.upsert(
+        ids=ids,
+        documents=documents,
+        metadatas=metadatas,
+        embeddings=embeddings,
+    )
+    return ids
+
+
+def update_memories(category, ids, metadatas):
+    """
+    Updates the metadata of several memories in a collection with a single update.
+    Keys that aren't given keep their values.
+
+    Parameters:
+    - category (str): The collection the memories are in.
+    - ids (list): The ids of the memories.
+    - metadatas (list): The metadata to set on each memory.
+    """
+    if len(ids) == 0:
+        return
+    now = datetime.datetime.now().timestamp()
+    metadatas = [dict(metadata) for metadata in metadatas]
+    for metadata in metadatas:
+        metadata["updated_at"] = now
+        # the store only accepts scalar metadata, so convert like update_memory does
+        for key, value in metadata.items():
+            if isinstance(value, (bool, dict, list)):
+                metadata[key] = str(value)
+
+    get_client().get_or_create_collection(category).update(
+        ids=[str(id) for id in ids], metadatas=metadatas
+    )
+
+
+def search_memories(category, embeddings, n_results=1, filter_metadata=None):
+    """
+    Searches a collection for several embeddings with a single query.
+
+    Parameters:
+    - category (str): The collection to search.
+    - embeddings (list): The embeddings to search for.
+    - n_results (int, optional): The number of results for each embedding. Defaults to 1.
+    - filter_metadata (dict, optional): A metadata filter for the results.
+
+    Returns: list - For each embedding, a list of results with id, document, metadata and distance.
+    """
+    memories = get_client().get_or_create_collection(category)
+    count = memories.count()
+    if count == 0 or len(embeddings) == 0:
+        return [[] for _ in embeddings]
+
+    query = memories.query(
+        query_embeddings=embeddings,
+        n_results=min(n_results, count),
+        where=filter_metadata,
+        include=["metadatas", "documents", "distances"],
+    )
+
+    results = []
+    for i in range(len(embeddings)):
+        results.append(
+            [
+                {
+                    "id": id,
+                    "document": query["documents"][i][j],
+                    "metadata": query["metadatas"][i][j],
+                    "distance": query["distances"][i][j],
+                }
+                for j, id in enumerate(query["ids"][i])
+            ]
+        )
+    return results
@@ -0,0 +1,217 @@
+import bisect
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+# upper bounds of the histogram buckets, in seconds and in tokens
+SECONDS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+TOKEN_BUCKETS = [64, 256, 512, 1024, 2048, 4096, 8192, 16384]
+
+# name -> help text, bucket bounds and a series for each set of labels
+histograms = {}
+metrics_lock = threading.Lock()
+
+
+def define_histogram(name, help, buckets=SECONDS_BUCKETS):
+    """
+    Declares a histogram, so it is listed on /metrics before anything is observed
+
+    Args:
+        name: the metric name
+        help: a one line description
+        buckets: the upper bounds of the buckets, in increasing order
+    """
+    with metrics_lock:
+        if name not in histograms:
+            histograms[name] = {"help": help, "buckets": list(buckets), "series": {}}
+
+
+define_histogram("tinyagi_step_seconds", "Wall time of each loop step")
+define_histogram("tinyagi_context_builder_seconds", "Wall time of each context builder")
+define_histogram("tinyagi_action_seconds", "Wall time of each action handler")
+define_histogram("tinyagi_completion_seconds", "Wall time of each completion call")
+define_histogram("tinyagi_completion_prompt_tokens", "Prompt tokens of each completion", TOKEN_BUCKETS)
+define_histogram("tinyagi_completion_tokens", "Completion tokens of each completion", TOKEN_BUCKETS)
+define_histogram("tinyagi_memory_seconds", "Wall time of each memory store call")
+
+
+def observe(name, value, labels=None):
+    """
+    Adds an observation to a histogram
+
+    Args:
+        name: the name of a defined histogram
+        value: the observed value
+        labels: a dictionary of label names to values
+    """
+    key = tuple(sorted((labels or {}).items()))
+    with metrics_lock:
+        histogram = histograms[name]
+        series = histogram["series"].get(key)
+        if series is None:
+            series = histogram["series"][key] = {
+                "buckets": [0] * len(histogram["buckets"]),
+                "sum": 0.0,
+                "count": 0,
+            }
+        index = bisect.bisect_left(histogram["buckets"], value)
+        if index < len(series["buckets"]):
+            series["buckets"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+
+@contextmanager
+def timed(name, labels=None):
+    """
+    Observes the wall time of a block in a histogram, even if the block raises
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start_time, labels)
+
+
+def get_histogram(name, labels=None):
+    """
+    Returns: dict - a copy of one series of a histogram, with its non-cumulative
+    bucket counts, sum and count, or None if nothing was observed
+    """
+    key = tuple(sorted((labels or {}).items()))
+    with metrics_lock:
+        series = histograms[name]["series"].get(key)
+        if series is None:
+            return None
+        return {"buckets": list(series["buckets"]), "sum": series["sum"], "count": series["count"]}
+
+
+def reset_metrics():
+    """
+    Forgets every observation. The histograms stay defined.
+    """
+    with metrics_lock:
+        for histogram in histograms.values():
+            histogram["series"] = {}
+
+
+def format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_bound(bound):
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+def render_metrics():
+    """
+    Formats every histogram in the Prometheus text exposition format
+
+    Returns:
+        text: the metrics page
+    """
+    lines = []
+    with metrics_lock:
+        for name, histogram in histograms.items():
+            lines.append(f"# HELP {name} {histogram['help']}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, series in sorted(histogram["series"].items()):
+                cumulative = 0
+                for bound, count in zip(histogram["buckets"], series["buckets"]):
+                    cumulative += count
+                    bucket_labels = format_labels(labels + (("le", format_bound(bound)),))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                bucket_labels = format_labels(labels + (("le", "+Inf"),))
+                lines.append(f"{name}_bucket{bucket_labels} {series['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {series['sum']}")
+                lines.append(f"{name}_count{format_labels(labels)} {series['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def instrument_step(step):
+    """
+    Wraps a loop step so its wall time is observed in tinyagi_step_seconds
+
+    Returns:
+    instrumented_step: the wrapped step function
+    """
+    labels = {"step": step.__name__}
+
+    # the loop passes loop_data only to steps that take two arguments
+    if step.__code__.co_argcount == 2:
+
+        def instrumented_step(context, loop_data):
+            with timed("tinyagi_step_seconds", labels):
+                return step(context, loop_data)
+
+    else:
+
+        def instrumented_step(context):
+            with timed("tinyagi_step_seconds", labels):
+                return step(context)
+
+    instrumented_step.__name__ = step.__name__
+    return instrumented_step
+
+
+class MeteredCollection:
+    """
+    Wraps a memory collection so every call is timed in tinyagi_memory_seconds
+    """
+
+    operations = ["add", "upsert", "update", "query", "get", "delete", "count", "peek"]
+
+    def __init__(self, collection, category):
+        self.collection = collection
+        self.category = category
+
+    def __getattr__(self, name):
+        attribute = getattr(self.collection, name)
+        if name not in self.operations:
+            return attribute
+        labels = {"category": self.category, "operation": name}
+
+        def metered(*args, **kwargs):
+            with timed("tinyagi_memory_seconds", labels):
+                return attribute(*args, **kwargs)
+
+        return metered
+
+
+class MeteredMemory:
+    """
+    Wraps a memory client so every collection it opens is metered
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def get_or_create_collection(self, category, metadata=None):
+        return MeteredCollection(
+            self.client.get_or_create_collection(category, metadata), category
+        )
+
+    def get_collection(self, category):
+        return MeteredCollection(self.client.get_collection(category), category)
+
+
+def install_memory_metrics():
+    """
+    Meters every memory store call, including the ones made by agentmemory,
+    agentaction and agentagenda directly. Install it after the embedding
+    cache so the time spent embedding is included.
+    """
+    client_module = importlib.import_module("agentmemory.client")
+    client = client_module.get_client()
+    if not isinstance(client, MeteredMemory):
+        client_module.client = MeteredMemory(client)
@@ -0,0 +1,177 @@
+import json
+import os
+
+from tinyagi.templates import FrozenDict, format_value, get_template, missing
+from tinyagi.utils import count_tokens
+
+# total tokens for a composed prompt and its function schemas. easycompletion
+# refuses anything over 16384 - 3072 tokens, this leaves room for the reply
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 12288))
+
+# when sections compete for the budget, higher priorities are filled first
+SECTION_PRIORITIES = {
+    "current_task_formatted": 100,
+    "available_actions": 90,
+    "events": 80,
+    "relevant_knowledge": 60,
+    "recent_knowledge": 50,
+    "formatted_tasks": 40,
+    "user_files": 30,
+}
+
+def create_section(items, header=None, trailer="", keep="first", tokens=None):
+    """
+    Describes a prompt section as a list of items the packer can drop
+
+    Args:
+        items: the text of each item, in the order they appear
+        header: a line shown above the items, if any are shown
+        trailer: text added after the items, if any are shown
+        keep: "first" keeps the leading items when the section is cut, "last" the trailing ones
+        tokens: the token count of each item, if already known. Otherwise they
+            are counted the first time the section is packed
+
+    Returns:
+        section: a dictionary with the items and their token counts
+    """
+    return {
+        "items": list(items),
+        "tokens": None if tokens is None else list(tokens),
+        "header": header,
+        "trailer": trailer,
+        "keep": keep,
+    }
+
+
+def count_section_tokens(section):
+    """
+    Counts the tokens of each item of a section, once
+
+    Returns:
+        tokens: the token count of each item
+    """
+    if section["tokens"] is None:
+        section["tokens"] = [count_tokens(item) for item in section["items"]]
+    return section["tokens"]
+
+
+def render_section(section, indices=None):
+    """
+    Formats the items of a section
+
+    Args:
+        section: the section to format
+        indices: the indices of the items to include. Defaults to all of them
+
+    Returns:
+        text: the formatted section, or an empty string if there are no items
+    """
+    if indices is None:
+        indices = range(len(section["items"]))
+    items = [section["items"][i] for i in sorted(indices)]
+    if len(items) == 0:
+        return ""
+    text = "\n".join(items) + section["trailer"]
+    if section["header"]:
+        text = section["header"] + "\n" + text
+    return text
+
+
+def set_section(context, key, items, **kwargs):
+    """
+    Adds a section to the context. The full text is stored under the key, and
+    the items under key + "_section" so a prompt can be packed to a budget.
+
+    Args:
+        context: the context dictionary to update
+        key: the context key the prompt templates use
+        items: the text of each item
+        kwargs: passed to create_section
+
+    Returns:
+        context: the updated context dictionary
+    """
+    section = create_section(items, **kwargs)
+    context[key] = render_section(section)
+    context[key + "_section"] = section
+    return context
+
+
+def pack_context(template, context, budget=None, functions=None):
+    """
+    Fits the sections a prompt template uses into one token budget. The rest
+    of the prompt and the function schemas are counted first, then sections
+    are filled greedily in priority order, item by item, until the budget runs out.
+
+    Args:
+        template: the prompt template the context will be composed into, compiled or as text
+        context: the context dictionary
+        budget: the token budget for the prompt. Defaults to PROMPT_TOKEN_BUDGET
+        functions: the function schemas sent with the prompt, if any
+
+    Returns:
+        context: a copy of the context with the sections cut to fit
+    """
+    if budget is None:
+        budget = PROMPT_TOKEN_BUDGET
+
+    template = get_template(template)
+    keys = [key for key in template.keys if context.get(key + "_section") is not None]
+    packed = dict(context)
+    if len(keys) == 0:
+        return packed
+
+    # the literal text is counted once per template, the other slots per value
+    remaining = budget - template.static_tokens
+    for slot in template.slots:
+        if slot not in keys:
+            text = format_value(slot, context.get(slot, missing))
+            remaining -= count_tokens("{{" + slot + "}}" if text is None else text)
+    if isinstance(functions, FrozenDict):
+        remaining -= count_tokens(functions.to_json())
+    elif functions is not None:
+        remaining -= count_tokens(json.dumps(functions))
+
+    keys.sort(key=lambda key: SECTION_PRIORITIES.get(key, 0), reverse=True)
+    for key in keys:
+        section = context[key + "_section"]
+        order = range(len(section["items"]))
+        if section["keep"] == "last":
+            order = reversed(order)
+
+        tokens = count_section_tokens(section)
+        used = 0
+        if section["header"]:
+            used += count_tokens(section["header"]) + 1
+        if section["trailer"]:
+            used += count_tokens(section["trailer"])
+        chosen = []
+        for i in order:
+            # one token for the newline between items
+            cost = tokens[i] + (1 if chosen else 0)
+            if used + cost > remaining:
+                break
+            used += cost
+            chosen.append(i)
+
+        if len(chosen) > 0:
+            remaining -= used
+        packed[key] = render_section(section, chosen)
+    return packed
+
+
+def compose_packed_prompt(template, context, budget=None, functions=None):
+    """
+    Composes a prompt with its sections packed into the token budget
+
+    Args:
+        template: the prompt template, compiled or as text
+        context: the context dictionary
+        budget: the token budget for the prompt. Defaults to PROMPT_TOKEN_BUDGET
+        functions: the function schemas sent with the prompt, if any
+
+    Returns:
+        text: the composed prompt
+    """
+    template = get_template(template)
+    return template.render(pack_context(template, context, budget, functions))
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from agentloop import step as advance_loop
+
+from tinyagi.context.events import build_events_context
+from tinyagi.context.knowledge import build_recent_knowledge
+from tinyagi.context.tasks import built_task_context
+from tinyagi.steps import act, decide, decide_and_act, orient
+from tinyagi.steps.initialize import initialize
+
+# actions that change tasks, so task context prefetched while they run is stale
+TASK_ACTIONS = [
+    "start_task",
+    "cancel_task",
+    "complete_task",
+    "complete_step",
+    "add_step",
+    "cancel_step",
+]
+
+
+def merge_prefetched_context(context, before, after):
+    """
+    Copies the keys a prefetch changed into the context
+
+    Args:
+        context: the context to update
+        before: the copy of the context the prefetch started from
+        after: the context the prefetch returned
+
+    Returns:
+        context: the updated context
+    """
+    for key, value in after.items():
+        if key not in before or before[key] is not value:
+            context[key] = value
+    return context
+
+
+def prefetch_orient_context(context):
+    """
+    Builds the parts of the next orient prompt that don't depend on the current action
+    """
+    context = built_task_context(context)
+    context = build_recent_knowledge(context)
+    return context
+
+
+def advance_immediately(step):
+    """
+    Wraps a step so the loop moves on to the next step as soon as it returns,
+    instead of waiting out the loop's step timeout. Paused loops still wait.
+    """
+
+    def advancing_step(context, loop_data):
+        context = step(context)
+        if not loop_data["pause_event"].is_set():
+            advance_loop(loop_data)
+        return context
+
+    advancing_step.__name__ = step.__name__
+    return advancing_step
+
+
+def create_prefetch_steps(context_step, fused=False):
+    """
+    Creates the loop steps for context prefetch mode. The context for the act
+    prompt is built while decide waits on its completion, and the next
+    orient's task and knowledge context is built while act runs. The
+    completions themselves still run one after another: the next orient
+    reads the events act writes, so it starts once act has finished. The events are fetched
+    again after decide and after act, so each prompt sees the events the step
+    before it wrote. Only the new events are fetched, so this takes one query.
+
+    Args:
+        context_step: the step function that runs all context builders
+        fused: if True, decide and act run as one completion, with the next
+            orient's context built while it runs
+
+    Returns:
+        steps: a list of step functions for the loop
+    """
+    executor = ThreadPoolExecutor(max_workers=2)
+
+    def decide_and_prefetch(context):
+        before = dict(context)
+        future = executor.submit(context_step, dict(context))
+        context = decide(context)
+        context = merge_prefetched_context(context, before, future.result())
+        # the prefetched events were read before decide wrote its reasoning
+        return build_events_context(context)
+
+    def prefetch_during(step):
+        def act_and_prefetch(context):
+            before = dict(context)
+            future = executor.submit(prefetch_orient_context, dict(context))
+            context = step(context)
+            context = merge_prefetched_context(context, before, future.result())
+            if context.get("action_name") in TASK_ACTIONS:
+                context = built_task_context(context)
+            return build_events_context(context)
+
+        act_and_prefetch.__name__ = step.__name__
+        return act_and_prefetch
+
+    decide_and_prefetch.__name__ = "decide"
+
+    if fused:
+        steps = [initialize, orient, context_step, prefetch_during(decide_and_act)]
+    else:
+        steps = [
+            initialize,
+            orient,
+            context_step,
+            decide_and_prefetch,
+            prefetch_during(act),
+        ]
+    return [advance_immediately(step) for step in steps]
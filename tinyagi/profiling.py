@@ -0,0 +1,208 @@
+import sys
+import threading
+import time
+
+# Records how long each module takes to import while the agent starts, as a
+# tree of the imports each import triggered, like python -X importtime but
+# covering imports on every thread and the ones made on first use after start
+
+# the imports recorded on each thread, outermost first
+import_profile = {"enabled": False, "started_at": None, "roots": []}
+import_profile_lock = threading.Lock()
+# each thread's stack of imports in progress, and whether it is looking for a module
+import_state = threading.local()
+
+
+def get_import_stack():
+    stack = getattr(import_state, "stack", None)
+    if stack is None:
+        stack = import_state.stack = []
+    return stack
+
+
+class TimedLoader:
+    """
+    Wraps a module's loader while it is imported, so the time from creating
+    the module to the end of running it is recorded. The module gets its own
+    loader back once it is imported.
+    """
+
+    def __init__(self, loader, name):
+        self.loader = loader
+        self.name = name
+        self.node = None
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def start(self):
+        if self.node is None:
+            self.node = {
+                "name": self.name,
+                "thread": threading.current_thread().name,
+                "start": time.perf_counter(),
+                "seconds": 0.0,
+                "children": [],
+            }
+            stack = get_import_stack()
+            if len(stack) > 0:
+                stack[-1]["children"].append(self.node)
+            else:
+                with import_profile_lock:
+                    import_profile["roots"].append(self.node)
+            stack.append(self.node)
+
+    def finish(self):
+        stack = get_import_stack()
+        if self.node is not None and len(stack) > 0 and stack[-1] is self.node:
+            stack.pop()
+            self.node["seconds"] = time.perf_counter() - self.node["start"]
+
+    def create_module(self, spec):
+        self.start()
+        create_module = getattr(self.loader, "create_module", None)
+        try:
+            return None if create_module is None else create_module(spec)
+        except BaseException:
+            self.finish()
+            raise
+
+    def exec_module(self, module):
+        self.start()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.finish()
+            if getattr(module, "__loader__", None) is self:
+                module.__loader__ = self.loader
+            if getattr(module, "__spec__", None) is not None and module.__spec__.loader is self:
+                module.__spec__.loader = self.loader
+
+
+class ImportProfiler:
+    """
+    A meta path finder that finds modules with the finders after it and wraps
+    their loaders in a TimedLoader
+    """
+
+    def find_spec(self, fullname, path=None, target=None):
+        if not import_profile["enabled"] or getattr(import_state, "finding", False):
+            return None
+        import_state.finding = True
+        try:
+            for finder in sys.meta_path:
+                find_spec = getattr(finder, "find_spec", None)
+                if finder is self or find_spec is None:
+                    continue
+                spec = find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            import_state.finding = False
+        if spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = TimedLoader(spec.loader, fullname)
+        return spec
+
+
+import_profiler = ImportProfiler()
+
+
+def start_import_profile():
+    """
+    Starts recording imports. Call it before importing tinyagi.main, so the
+    imports made at startup are recorded.
+    """
+    with import_profile_lock:
+        import_profile["enabled"] = True
+        import_profile["started_at"] = time.perf_counter()
+        import_profile["roots"] = []
+    if import_profiler not in sys.meta_path:
+        sys.meta_path.insert(0, import_profiler)
+
+
+def stop_import_profile():
+    """
+    Stops recording imports
+
+    Returns:
+        roots: the outermost imports recorded, each with its nested imports
+    """
+    with import_profile_lock:
+        import_profile["enabled"] = False
+        roots = list(import_profile["roots"])
+    if import_profiler in sys.meta_path:
+        sys.meta_path.remove(import_profiler)
+    return roots
+
+
+def format_import_tree(nodes, min_seconds=0.005, depth=0, max_depth=8):
+    """
+    Formats recorded imports as an indented tree, slowest first. Imports
+    faster than min_seconds are summed into one line per level.
+
+    Args:
+        nodes: the recorded imports
+        min_seconds: the shortest import that gets its own line
+        depth: the indentation of the first level
+        max_depth: the deepest level shown
+
+    Returns:
+        lines: the lines of the tree
+    """
+    if depth > max_depth:
+        return []
+    lines = []
+    hidden_count = 0
+    hidden_seconds = 0.0
+    for node in sorted(nodes, key=lambda node: node["seconds"], reverse=True):
+        if node["seconds"] < min_seconds:
+            hidden_count += 1
+            hidden_seconds += node["seconds"]
+            continue
+        own_seconds = node["seconds"] - sum(child["seconds"] for child in node["children"])
+        thread = "" if node["thread"] == "MainThread" else f"  [{node['thread']}]"
+        lines.append(
+            f"{node['seconds'] * 1e3:9.1f} ms {own_seconds * 1e3:8.1f} ms  "
+            + "  " * depth
+            + node["name"]
+            + thread
+        )
+        lines.extend(format_import_tree(node["children"], min_seconds, depth + 1, max_depth))
+    if hidden_count > 0:
+        lines.append(
+            f"{hidden_seconds * 1e3:9.1f} ms {'':>8}     "
+            + "  " * depth
+            + f"({hidden_count} faster imports)"
+        )
+    return lines
+
+
+def print_startup_profile(milestones=None, connectors=None, min_seconds=0.005):
+    """
+    Stops recording imports and prints the import tree, the startup
+    milestones and how long each connector took to import
+
+    Args:
+        milestones: startup milestone -> seconds from start
+        connectors: connector name -> status, as get_connector_status returns
+        min_seconds: the shortest import that gets its own line
+    """
+    roots = stop_import_profile()
+    total = sum(node["seconds"] for node in roots)
+    print(f"\nStartup profile: {len(roots)} top level imports took {total:.2f}s")
+    print(f"{'cumulative':>12} {'self':>11}  module")
+    for line in format_import_tree(roots, min_seconds):
+        print(line)
+    if connectors:
+        print("\nconnector          import       status")
+        for name, status in connectors.items():
+            import_seconds = status.get("import_seconds")
+            import_text = "-" if import_seconds is None else f"{import_seconds * 1e3:.1f} ms"
+            print(f"{name:<18} {import_text:>10}   {status['status']}")
+    if milestones:
+        print("\nmilestone                  seconds from start")
+        for milestone, seconds in milestones.items():
+            print(f"{milestone:<26} {seconds:8.2f}")
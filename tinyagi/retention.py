@@ -0,0 +1,276 @@
+import json
+import os
+import threading
+import time
+
+from agentmemory import get_client, get_epoch
+
+from tinyagi.knowledge_index import remove_from_knowledge_index
+from tinyagi.memory import add_id_offset
+from tinyagi.metrics import define_histogram, observe
+from tinyagi.utils import log
+
+# off, default, a JSON object of policies or the path of a JSON file of them
+MEMORY_RETENTION = os.getenv("MEMORY_RETENTION", "off")
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", 600))  # seconds between compactions
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", 500))  # ids read or deleted per call
+
+# category -> rules. max_count keeps the newest memories, max_age_seconds and
+# max_age_epochs delete older ones. types gives memories with that metadata
+# type rules of their own, instead of the category's.
+DEFAULT_RETENTION_POLICIES = {
+    "events": {
+        "max_age_epochs": 1000,
+        "types": {
+            "summary": {"max_age_epochs": 10000},
+            "message": {"max_age_epochs": 200, "max_count": 2000},
+        },
+    },
+    "twitch_message": {"max_count": 5000, "max_age_seconds": 7 * 24 * 60 * 60},
+    "knowledge": {"max_count": 20000},
+    # get_epoch reads every epoch memory, only the latest is used
+    "epoch": {"max_count": 10},
+}
+
+define_histogram("tinyagi_compaction_seconds", "Wall time of each retention compaction")
+define_histogram(
+    "tinyagi_retention_query_seconds", "Metadata filtered query time before and after compaction"
+)
+
+retention = {"thread": None, "last_report": None}
+retention_lock = threading.Lock()
+
+
+def load_retention_policies(setting=None):
+    """
+    Reads the retention policies from a setting
+
+    Args:
+        setting: off, default, a JSON object or the path of a JSON file, defaults to MEMORY_RETENTION
+
+    Returns:
+        policies: category -> rules, empty if retention is off
+    """
+    if setting is None:
+        setting = MEMORY_RETENTION
+    setting = setting.strip()
+    if setting in ("", "off"):
+        return {}
+    if setting == "default":
+        return DEFAULT_RETENTION_POLICIES
+    if setting.startswith("{"):
+        return json.loads(setting)
+    with open(setting) as f:
+        return json.load(f)
+
+
+def uses_epochs(policy):
+    rules = [policy] + list(policy.get("types", {}).values())
+    return any(rule.get("max_age_epochs") is not None for rule in rules)
+
+
+def is_expired(metadata, rule, now, epoch):
+    max_age_seconds = rule.get("max_age_seconds")
+    if max_age_seconds is not None and float(metadata.get("created_at", now)) < now - max_age_seconds:
+        return True
+    max_age_epochs = rule.get("max_age_epochs")
+    if max_age_epochs is not None and epoch is not None and "epoch" in metadata:
+        return int(metadata["epoch"]) < epoch - max_age_epochs
+    return False
+
+
+def select_expired(memories, policy, now=None, epoch=None):
+    """
+    Picks the memories a policy no longer keeps
+
+    Args:
+        memories: (id, metadata) pairs, oldest first
+        policy: the category's rules
+        now: the current time, defaults to time.time()
+        epoch: the current epoch, for max_age_epochs
+
+    Returns:
+        ids: the ids to delete, oldest first
+    """
+    if now is None:
+        now = time.time()
+    type_rules = policy.get("types", {})
+    groups = {}
+    for id, metadata in memories:
+        type = metadata.get("type")
+        groups.setdefault(type if type in type_rules else None, []).append((id, metadata))
+
+    expired = set()
+    for type, group in groups.items():
+        rule = policy if type is None else type_rules[type]
+        kept = []
+        for id, metadata in group:
+            if is_expired(metadata, rule, now, epoch):
+                expired.add(id)
+            else:
+                kept.append(id)
+        max_count = rule.get("max_count")
+        if max_count is not None and len(kept) > max_count:
+            expired.update(kept[: len(kept) - max_count])
+    return [id for id, _ in memories if id in expired]
+
+
+def read_memory_metadata(collection):
+    """
+    Returns: list - (id, metadata) of every memory in a collection, oldest first,
+    read RETENTION_BATCH_SIZE at a time
+    """
+    memories = []
+    offset = 0
+    while True:
+        result = collection.get(limit=RETENTION_BATCH_SIZE, offset=offset, include=["metadatas"])
+        memories.extend(zip(result["ids"], result["metadatas"]))
+        if len(result["ids"]) < RETENTION_BATCH_SIZE:
+            break
+        offset += RETENTION_BATCH_SIZE
+    # ids are zero-padded insertion counts
+    memories.sort(key=lambda memory: memory[0])
+    return memories
+
+
+def delete_memory_batches(category, collection, ids):
+    """
+    Deletes memories RETENTION_BATCH_SIZE at a time
+    """
+    for start in range(0, len(ids), RETENTION_BATCH_SIZE):
+        batch = ids[start : start + RETENTION_BATCH_SIZE]
+        add_id_offset(category, len(batch))
+        collection.delete(ids=batch)
+        if category == "knowledge":
+            remove_from_knowledge_index(batch)
+
+
+def get_storage_size(path=None):
+    """
+    Returns: int - the size in bytes of the files in the memory store
+    """
+    if path is None:
+        path = os.environ.get("STORAGE_PATH", "./memory")
+    size = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.path.getsize(os.path.join(directory, filename))
+            except OSError:
+                pass
+    return size
+
+
+def time_filtered_query(collection):
+    """
+    Returns: float - the seconds a metadata filtered read of the whole collection takes,
+    the kind get_memories and get_events make
+    """
+    start_time = time.perf_counter()
+    collection.get(where={"created_at": {"$gt": 0}}, include=["metadatas"])
+    return time.perf_counter() - start_time
+
+
+def compact_memories(policies=None):
+    """
+    Deletes the memories the retention policies no longer keep, in batches,
+    and reports the store size and a filtered query's latency before and after
+
+    Args:
+        policies: category -> rules, defaults to MEMORY_RETENTION
+
+    Returns:
+        report: storage_bytes and seconds before and after, and each category's
+        count, deleted and query_seconds before and after
+    """
+    if policies is None:
+        policies = load_retention_policies()
+    start_time = time.perf_counter()
+    report = {"storage_bytes_before": get_storage_size(), "categories": {}}
+    epoch = get_epoch() if any(uses_epochs(policy) for policy in policies.values()) else None
+    now = time.time()
+    client = get_client()
+    for category, policy in policies.items():
+        collection = client.get_or_create_collection(category)
+        query_before = time_filtered_query(collection)
+        memories = read_memory_metadata(collection)
+        ids = select_expired(memories, policy, now, epoch)
+        delete_memory_batches(category, collection, ids)
+        query_after = time_filtered_query(collection)
+        observe("tinyagi_retention_query_seconds", query_before, {"category": category, "phase": "before"})
+        observe("tinyagi_retention_query_seconds", query_after, {"category": category, "phase": "after"})
+        report["categories"][category] = {
+            "count_before": len(memories),
+            "deleted": len(ids),
+            "count_after": len(memories) - len(ids),
+            "query_seconds_before": query_before,
+            "query_seconds_after": query_after,
+        }
+    report["storage_bytes_after"] = get_storage_size()
+    report["seconds"] = time.perf_counter() - start_time
+    observe("tinyagi_compaction_seconds", report["seconds"])
+    with retention_lock:
+        retention["last_report"] = report
+    return report
+
+
+def format_compaction_report(report):
+    lines = [
+        f"Compacted memories in {report['seconds']:.2f}s, store "
+        f"{report['storage_bytes_before'] / 1e6:.1f}MB -> {report['storage_bytes_after'] / 1e6:.1f}MB"
+    ]
+    for category, stats in report["categories"].items():
+        lines.append(
+            f"{category}: {stats['count_before']} -> {stats['count_after']} memories, "
+            f"filtered query {stats['query_seconds_before'] * 1e3:.1f}ms -> "
+            f"{stats['query_seconds_after'] * 1e3:.1f}ms"
+        )
+    return "\n".join(lines)
+
+
+def compactor_loop(policies, stop_event, interval):
+    while not stop_event.wait(interval):
+        try:
+            report = compact_memories(policies)
+            log(format_compaction_report(report), type="system", source="retention", send_to_feed=False)
+        except Exception as e:
+            log(f"Memory compaction failed: {e}", type="error", source="retention", send_to_feed=False)
+
+
+def start_compactor(stop_event, policies=None, interval=None):
+    """
+    Compacts the memory store on a background thread every RETENTION_INTERVAL
+    seconds, until the stop event is set. Does nothing if retention is off.
+
+    Args:
+        stop_event: a threading.Event that stops the compactor, usually the loop's
+        policies: category -> rules, defaults to MEMORY_RETENTION
+        interval: the seconds between compactions, defaults to RETENTION_INTERVAL
+
+    Returns:
+        thread: the compactor thread, or None if retention is off
+    """
+    if policies is None:
+        policies = load_retention_policies()
+    if len(policies) == 0:
+        return None
+    if interval is None:
+        interval = RETENTION_INTERVAL
+    with retention_lock:
+        if retention["thread"] is None:
+            retention["thread"] = threading.Thread(
+                target=compactor_loop,
+                args=(policies, stop_event, interval),
+                name="memory-compactor",
+                daemon=True,
+            )
+            retention["thread"].start()
+        return retention["thread"]
+
+
+def get_compaction_report():
+    """
+    Returns: dict or None - the report of the last compaction
+    """
+    with retention_lock:
+        return retention["last_report"]
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+from agentagenda import list_tasks_as_formatted_string
+from agentmemory import get_epoch
+
+from tinyagi.context.events import build_events_context
+from tinyagi.context.knowledge import build_relevant_knowledge
+from tinyagi.packing import set_section
+from tinyagi.steps.initialize import build_time_context
+
+# how old, in seconds, a snapshot can be before connectors rebuild their own context
+CONTEXT_SNAPSHOT_MAX_AGE = float(os.getenv("CONTEXT_SNAPSHOT_MAX_AGE", 60))
+
+context_snapshot = None
+context_snapshot_time = 0
+context_snapshot_lock = threading.Lock()
+
+
+def publish_context_snapshot(context):
+    """
+    Publishes the latest loop context so connectors can reuse it
+
+    Args:
+        context: the context dictionary produced by a loop step
+    """
+    global context_snapshot, context_snapshot_time
+    if not isinstance(context, dict):
+        return
+    with context_snapshot_lock:
+        context_snapshot = dict(context)
+        context_snapshot_time = time.time()
+
+
+def update_context_snapshot(values):
+    """
+    Adds values to the current snapshot without refreshing its age,
+    so pieces computed by a connector are shared until the next publish
+
+    Args:
+        values: a dictionary of context keys and values
+    """
+    with context_snapshot_lock:
+        if context_snapshot is not None:
+            context_snapshot.update(values)
+
+
+def get_context_snapshot(max_age=None):
+    """
+    Returns a copy of the latest published context
+
+    Args:
+        max_age: the maximum age of the snapshot in seconds. Defaults to CONTEXT_SNAPSHOT_MAX_AGE
+
+    Returns:
+        context: a copy of the context dictionary, or None if there is no snapshot or it is too old
+    """
+    if max_age is None:
+        max_age = CONTEXT_SNAPSHOT_MAX_AGE
+    with context_snapshot_lock:
+        if context_snapshot is None or time.time() - context_snapshot_time > max_age:
+            return None
+        return dict(context_snapshot)
+
+
+def list_files_formatted():
+    # only connectors build this section, so the admin panel is imported on first use
+    from agentcomms.adminpanel import list_files_formatted as list_admin_files
+
+    return list_admin_files()
+
+
+def build_user_files_context(context):
+    """
+    Adds the files in the user's files folder to the context, one item per line
+    """
+    user_files = list_files_formatted()
+    return set_section(
+        context, "user_files", user_files.split("\n") if len(user_files) > 0 else []
+    )
+
+
+def get_connector_context(max_age=None):
+    """
+    Returns the context a connector should respond with. Reuses the latest loop
+    snapshot when it is fresh, otherwise rebuilds the shared pieces without
+    advancing the epoch.
+
+    Args:
+        max_age: the maximum age of the snapshot in seconds. Defaults to CONTEXT_SNAPSHOT_MAX_AGE
+
+    Returns:
+        context: a context dictionary with time, events, knowledge, files and tasks
+    """
+    context = get_context_snapshot(max_age)
+    if context is None:
+        context = {"epoch": get_epoch()}
+        context = build_events_context(context)
+        context = build_relevant_knowledge(context)
+        context = build_user_files_context(context)
+        context["tasks"] = list_tasks_as_formatted_string()
+    else:
+        if context.get("user_files") is None:
+            context = build_user_files_context(context)
+            update_context_snapshot(
+                {
+                    "user_files": context["user_files"],
+                    "user_files_section": context["user_files_section"],
+                }
+            )
+        context["tasks"] = context.get("formatted_tasks", "")
+    return build_time_context(context)
@@ -0,0 +1,83 @@
+import queue
+import threading
+import time
+
+from tinyagi.utils import count_tokens, log
+
+# Utterances are spoken one at a time, in the order they were queued.
+# Callers return as soon as an utterance is queued instead of sleeping while it is spoken.
+speech_queue = queue.Queue()
+speech_idle = threading.Event()
+speech_idle.set()
+speech_thread = None
+speech_lock = threading.Lock()
+
+
+def send_message(message, type="chat", source="default"):
+    # the admin panel is slow to import, so it is imported by the first utterance, on the speech thread
+    from agentcomms.adminpanel import send_message as send_admin_message
+
+    send_admin_message(message, type, source=source)
+
+
+def estimate_speech_duration(text):
+    """
+    Estimates how long it takes to say some text out loud
+
+    Args:
+        text: the text to be spoken
+
+    Returns:
+        duration: the estimated duration in seconds
+    """
+    return int(count_tokens(text) / 3.0)
+
+
+def speech_worker():
+    while True:
+        message, type, source, duration = speech_queue.get()
+        try:
+            send_message(message, type, source=source)
+            if duration > 0:
+                time.sleep(duration)
+        except Exception as e:
+            log(f"Failed to send speech: {e}", type="error", source="speech", send_to_feed=False)
+        finally:
+            with speech_lock:
+                speech_queue.task_done()
+                if speech_queue.unfinished_tasks == 0:
+                    speech_idle.set()
+
+
+def speak(message, source="default", duration=0, type="chat"):
+    """
+    Queues a message for the output channel and returns immediately. The message
+    is sent after everything queued before it has finished, and holds the channel
+    for its duration so that utterances never overlap.
+
+    Args:
+        message: the message to send
+        source: the source of the message, passed to the admin panel
+        duration: how long the message takes to say, in seconds
+        type: the message type, passed to the admin panel. Defaults to "chat"
+    """
+    global speech_thread
+    with speech_lock:
+        if speech_thread is None:
+            speech_thread = threading.Thread(target=speech_worker, daemon=True)
+            speech_thread.start()
+        speech_idle.clear()
+        speech_queue.put((message, type, source, duration))
+
+
+def wait_for_speech(timeout=None):
+    """
+    Blocks until every queued utterance has been spoken
+
+    Args:
+        timeout: the maximum time to wait in seconds. Defaults to waiting forever
+
+    Returns:
+        bool: True if the queue was drained, False if the timeout passed first
+    """
+    return speech_idle.wait(timeout)
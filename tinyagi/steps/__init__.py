@@ -1,5 +1,6 @@
 from .act import act
 from .decide import decide
+from .decide_and_act import decide_and_act
 from .orient import orient
 
-__all__ = ["act", "decide", "orient"]
\ No newline at end of file
+__all__ = ["act", "decide", "decide_and_act", "orient"]
\ No newline at end of file
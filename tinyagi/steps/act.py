@@ -5,7 +5,10 @@ from agentaction import (
 )
 
 from agentmemory import create_event
-from easycompletion import function_completion
+from tinyagi.action_index import set_last_action
+from tinyagi.completion import function_completion
+from tinyagi.metrics import timed
+from tinyagi.packing import pack_context
 from tinyagi.utils import log
 
 
@@ -32,27 +35,54 @@ def act(context):
         )
         return {"error": f"Action {action_name} not found"}
 
+    # action builders compose their own prompt, so pack the context against the action's template
+    values = pack_context(action.get("prompt") or "", context, functions=action["function"])
     response = function_completion(
-        text=compose_action_prompt(action, context), functions=action["function"], debug=context["verbose"]
+        text=compose_action_prompt(action, values), functions=action["function"], debug=context["verbose"]
     )
 
-    formatted_arguments = ""
-    if response.get("arguments") is not None:
-        for key, value in response["arguments"].items():
-            formatted_arguments += f"{key}: {value}\n"
-
     if response.get('function_name') is None:
         return context
 
+    return run_action(context, response["function_name"], response["arguments"])
+
+
+def run_action(context, action_name, arguments):
+    """
+    Runs an action with the given arguments and records the outcome as an event.
+
+    Args:
+        context (dict): The dictionary containing data about the current state of the system.
+        action_name (str): The name of the action to run.
+        arguments (dict): The arguments to call the action's handler with.
+
+    Returns:
+        dict: The context dictionary.
+    """
+    formatted_arguments = ""
+    if arguments is not None:
+        for key, value in arguments.items():
+            formatted_arguments += f"{key}: {value}\n"
+
     log_content = (
-        f"Using action {response['function_name']} with arguments {formatted_arguments}"
+        f"Using action {action_name} with arguments {formatted_arguments}"
     )
 
     log(log_content, type="step", source="decide", title="tinyagi", send_to_feed=False)
 
-    action_result = use_action(response["function_name"], response["arguments"])
+    # the action name comes from the model, so names that aren't actions share one label
+    labels = {
+        "action": action_name if get_action(action_name) is not None else "unknown",
+        "success": "False",
+    }
+    # observed when the block exits, with the success label set if the action returned
+    with timed("tinyagi_action_seconds", labels):
+        action_result = use_action(action_name, arguments)
+        success = action_result is not None and action_result["success"] is not False
+        labels["success"] = str(success)
+    set_last_action(action_name)
 
-    if action_result is None or action_result["success"] is False:
+    if not success:
         create_event(
             f"I tried to use the action `{action_name}`, but it failed.",
             metadata={
@@ -1,10 +1,9 @@
 from agentmemory import create_event
-from easycompletion import (
-    function_completion,
-    compose_prompt,
-    compose_function,
-)
+from easycompletion import compose_function
 
+from tinyagi.completion import function_completion
+from tinyagi.packing import compose_packed_prompt
+from tinyagi.templates import frozen_function, register_template
 from tinyagi.utils import log
 
 decision_prompt = """Current Epoch: {{epoch}}
@@ -38,13 +37,17 @@ Come up with the next action and summarize it. Decide what the actions that you
 {{available_short_actions}}
 """
 
+decision_template = register_template("decision", decision_prompt)
 
+
+@frozen_function
 def compose_decision_function():
     """
     This function defines the structure and requirements of the 'decide' function to be called in the 'Decide' stage of the OODA loop.
 
     Returns:
         dict: A dictionary containing the details of the 'decide' function, such as its properties, description, and required properties.
+            It is built on the first call and the same frozen dictionary is returned after that.
     """
     return compose_function(
         name="decide_action",
@@ -76,9 +79,10 @@ def decide(context):
     Returns:
         dict: The updated context dictionary after the 'Decide' stage, including the selected action and reasoning behind the decision.
     """
+    decision_function = compose_decision_function()
     response = function_completion(
-        text=compose_prompt(decision_prompt, context),
-        functions=compose_decision_function(),
+        text=compose_packed_prompt(decision_template, context, functions=decision_function),
+        functions=decision_function,
         debug=context["verbose"],
     )
 
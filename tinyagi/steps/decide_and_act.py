@@ -0,0 +1,160 @@
+import copy
+
+from agentaction import get_action
+from agentmemory import create_event
+
+from tinyagi.completion import function_completion
+from tinyagi.packing import compose_packed_prompt
+from tinyagi.steps.act import act, run_action
+from tinyagi.steps.decide import decide, decision_prompt
+from tinyagi.templates import register_template
+from tinyagi.utils import log
+
+fused_prompt = (
+    decision_prompt
+    + """
+Call the function for the action you choose, with all of its arguments filled in, and explain your reasoning in the reasoning argument."""
+)
+fused_template = register_template("decide_and_act", fused_prompt)
+
+reasoning_property = {
+    "type": "string",
+    "description": "Explain my reasoning for this action from my perspective as me, the user, using first person 'I' instead of 'You'.",
+}
+
+json_types = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+
+def compose_candidate_functions(action_names):
+    """
+    Builds the function schemas for every candidate action, each with an added reasoning argument
+
+    Args:
+        action_names (list): The names of the available actions.
+
+    Returns:
+        dict: The candidate function schemas, keyed by action name.
+    """
+    functions = {}
+    for action_name in action_names:
+        action = get_action(action_name)
+        if action is None:
+            continue
+        function = copy.deepcopy(action["function"])
+        parameters = function.setdefault("parameters", {})
+        parameters.setdefault("properties", {})["reasoning"] = reasoning_property
+        required = parameters.setdefault("required", [])
+        if "reasoning" not in required:
+            required.append("reasoning")
+        functions[function["name"]] = function
+    return functions
+
+
+def validate_arguments(function, arguments):
+    """
+    Checks that a function call's arguments match the function schema
+
+    Args:
+        function (dict): The function schema.
+        arguments (dict): The arguments returned by the model.
+
+    Returns:
+        bool: True if every required argument is present and every argument has the right type.
+    """
+    if not isinstance(arguments, dict):
+        return False
+    parameters = function.get("parameters", {})
+    properties = parameters.get("properties", {})
+    for key in parameters.get("required", []):
+        if arguments.get(key) is None:
+            return False
+    for key, value in arguments.items():
+        schema = properties.get(key)
+        if schema is None:
+            continue
+        expected_type = json_types.get(schema.get("type"))
+        if expected_type is not None and not isinstance(value, expected_type):
+            return False
+        if "enum" in schema and value not in schema["enum"]:
+            return False
+    return True
+
+
+def decide_and_act(context):
+    """
+    Decides on an action and runs it with a single completion. The model is given every
+    candidate action's function and calls one of them directly. If the call doesn't
+    validate, falls back to the separate decide and act completions.
+
+    Args:
+        context (dict): The dictionary containing data about the current state of the system.
+
+    Returns:
+        dict: The updated context dictionary, including the selected action and reasoning behind the decision.
+    """
+    functions = compose_candidate_functions(context.get("available_action_names", []))
+    if len(functions) == 0:
+        return act(decide(context))
+
+    candidate_functions = list(functions.values())
+    response = function_completion(
+        text=compose_packed_prompt(fused_template, context, functions=candidate_functions),
+        functions=candidate_functions,
+        debug=context["verbose"],
+    )
+
+    action_name = response.get("function_name")
+    arguments = response.get("arguments")
+
+    if action_name not in functions:
+        log(
+            f"Fused decision returned no valid action ({action_name}), deciding separately",
+            type="warning",
+            source="decide",
+            title="tinyagi",
+            send_to_feed=False,
+        )
+        return act(decide(context))
+
+    valid = validate_arguments(functions[action_name], arguments)
+    reasoning = arguments.pop("reasoning", None) if isinstance(arguments, dict) else None
+    if not isinstance(reasoning, str) or reasoning.strip() == "":
+        # without reasoning the previous epoch's would be acted on, so decide again
+        log(
+            f"Fused decision for {action_name} had no reasoning, deciding separately",
+            type="warning",
+            source="decide",
+            title="tinyagi",
+            send_to_feed=False,
+        )
+        return act(decide(context))
+
+    context["reasoning"] = "Action Reasoning:\n" + reasoning + "\n"
+    context["action_name"] = action_name
+
+    log(context['reasoning'], header=f"I performed the action {action_name}", type="step", source="decide", title="tinyagi")
+
+    create_event(
+        reasoning,
+        metadata={"type": "reasoning"},
+    )
+
+    if not valid:
+        # the choice is still good, only the arguments need another completion
+        log(
+            f"Fused arguments for {action_name} failed validation, composing them separately",
+            type="warning",
+            source="decide",
+            title="tinyagi",
+            send_to_feed=False,
+        )
+        return act(context)
+
+    return run_action(context, action_name, arguments)
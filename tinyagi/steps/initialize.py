@@ -5,11 +5,34 @@ from agentmemory import get_epoch
 
 from agentmemory import set_epoch
 
+from tinyagi.completion import set_prompt_time_values
+from tinyagi.embeddings import get_embedding_cache_stats
 from tinyagi.utils import log
 
 from datetime import datetime
 
 
+def build_time_context(context):
+    """
+    Adds the current time, date and environment to the context without advancing the epoch
+
+    Args:
+        context: the context dictionary to update
+
+    Returns:
+        context: the updated context dictionary
+    """
+    context["current_time"] = datetime.now().strftime("%H:%M")
+    context["current_date"] = datetime.now().strftime("%Y-%m-%d")
+    set_prompt_time_values(context["current_time"], context["current_date"])
+    context["platform"] = sys.platform
+    context["cwd"] = os.getcwd()
+
+    context["verbose"]="--verbose" in os.sys.argv
+
+    return context
+
+
 def initialize(context={}):
     """
     Initialize the loop with context
@@ -28,14 +51,7 @@ def initialize(context={}):
     else:
         context["last_epoch"] = context.get("epoch", 0)
         context["epoch"] = get_epoch()
-    context["current_time"] = datetime.now().strftime("%H:%M")
-    context["current_date"] = datetime.now().strftime("%Y-%m-%d")
-    context["platform"] = sys.platform
-    context["cwd"] = os.getcwd()
-
-    context["verbose"]="--verbose" in os.sys.argv
-
-
+    context = build_time_context(context)
 
     log(
         "Start for epoch "
@@ -48,4 +64,15 @@ def initialize(context={}):
         send_to_feed=False,
     )
 
+    if context["verbose"]:
+        stats = get_embedding_cache_stats()
+        log(
+            f"Embedding cache hit ratio: {stats['hit_ratio']:.1%} "
+            f"({stats['hits']} memory hits, {stats['disk_hits']} disk hits, {stats['misses']} misses)",
+            type="info",
+            source="initialize",
+            title="tinyagi",
+            send_to_feed=False,
+        )
+
     return context
@@ -1,26 +1,15 @@
 from agentmemory import create_event
-from easycompletion import (
-    function_completion,
-    compose_prompt,
-    compose_function,
-)
+from easycompletion import compose_function
+
+from tinyagi.completion import function_completion
+from tinyagi.packing import compose_packed_prompt
+from tinyagi.templates import frozen_function, register_template
 from tinyagi.utils import log
 
-from tinyagi.context.knowledge import add_knowledge
+from tinyagi.context.knowledge import add_knowledge_batch
 
 
-def compose_orient_prompt(context):
-    """
-    This function formats the orientation prompt by inserting the context data into a pre-defined template.
-
-    Args:
-        context (dict): The dictionary containing data about the current state of the system, such as current epoch, time, date, recent knowledge, and events.
-
-    Returns:
-        str: The fully formed orientation prompt with the data filled in from the context.
-    """
-    return compose_prompt(
-        """I am Citrine, an AGI agent. I'm living inside a Linux computer in San Francisco. I can explore my computer and the internet and communicate with people, but I can't do anything in the real world. The current time is {{current_time}} on {{current_date}}.
+orient_prompt = """I am Citrine, an AGI agent. I'm living inside a Linux computer in San Francisco. I can explore my computer and the internet and communicate with people, but I can't do anything in the real world. The current time is {{current_time}} on {{current_date}}.
 - I don't want to do the same thing I just did, suggest something new
 - Collect any new knowledge that I learned from my last action as an array of knowledge items
 - Each knowledge array item should be an item of self-contained knowledge that I learned, and should include the source, the content and the relationship.
@@ -33,17 +22,34 @@ def compose_orient_prompt(context):
 {{recent_knowledge}}
 {{events}}
 Comment on the results of the action I just performed and what I should do next
-""",
-        context,
+"""
+
+orient_template = register_template("orient", orient_prompt)
+
+
+def compose_orient_prompt(context):
+    """
+    This function formats the orientation prompt by inserting the context data into a pre-defined template.
+
+    Args:
+        context (dict): The dictionary containing data about the current state of the system, such as current epoch, time, date, recent knowledge, and events.
+
+    Returns:
+        str: The fully formed orientation prompt with the data filled in from the context.
+    """
+    return compose_packed_prompt(
+        orient_template, context, functions=compose_orient_function()
     )
 
 
+@frozen_function
 def compose_orient_function():
     """
     This function defines the structure and requirements of the 'orient' function to be called in the 'orient' stage of the OODA loop.
 
     Returns:
         dict: A dictionary containing the details of the 'orient' function, such as its properties, description, and required properties.
+            It is built on the first call and the same frozen dictionary is returned after that.
     """
     return compose_function(
         "summarize_recent_events",
@@ -107,6 +113,7 @@ def orient(context):
         print("No arguments returned from orient_function")
 
     new_knowledge = []
+    new_knowledge_metadatas = []
 
     # Create new knowledge and add to the knowledge base
     knowledge = arguments.get("knowledge", [])
@@ -119,8 +126,10 @@ def orient(context):
                 "epoch": context["epoch"],
             }
 
-            add_knowledge(k["content"], metadata=metadata)
             new_knowledge.append(k["content"])
+            new_knowledge_metadatas.append(metadata)
+
+        add_knowledge_batch(new_knowledge, metadatas=new_knowledge_metadatas)
 
     # Get the summary and add to the context object
     summary = response["arguments"]["summary"]
@@ -0,0 +1,290 @@
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+from tinyagi.context.builder import get_package_name
+from tinyagi.metrics import define_histogram, observe
+from tinyagi.utils import log
+
+# comma separated connector module names to start, e.g. chat,twitch. Empty starts every connector
+CONNECTORS = os.getenv("CONNECTORS", "")
+# a connector that raises is restarted, waiting twice as long after each failure
+MIN_RESTART_DELAY = float(os.getenv("CONNECTOR_MIN_RESTART_DELAY", 1))
+MAX_RESTART_DELAY = float(os.getenv("CONNECTOR_MAX_RESTART_DELAY", 60))
+# seconds between checks that the thread a connector returned is still alive
+HEALTH_CHECK_INTERVAL = float(os.getenv("CONNECTOR_HEALTH_CHECK_INTERVAL", 1))
+
+define_histogram("tinyagi_startup_seconds", "Time from start to each startup milestone")
+define_histogram("tinyagi_connector_import_seconds", "Import time of each connector module")
+
+# startup milestone -> seconds from start
+startup_milestones = {}
+
+# name -> the state of each supervised connector
+connectors = {}
+connectors_lock = threading.Lock()
+
+
+def get_enabled_connectors(connectors_dir, enabled=None):
+    """
+    Lists the connector modules to start. Modules that aren't enabled are never imported.
+
+    Args:
+        connectors_dir: the directory of connector modules
+        enabled: a list or comma separated string of module names, defaults to CONNECTORS
+
+    Returns:
+        names: the module names, without .py
+    """
+    if enabled is None:
+        enabled = CONNECTORS
+    if isinstance(enabled, str):
+        enabled = [name.strip() for name in enabled.split(",") if name.strip() != ""]
+    available = sorted(
+        filename[:-3]
+        for filename in os.listdir(connectors_dir)
+        if filename.endswith(".py") and filename != "__init__.py"
+    )
+    if len(enabled) == 0:
+        return available
+    for name in enabled:
+        if name not in available:
+            log(f"Connector {name} is enabled but not in {connectors_dir}", type="warning")
+    return [name for name in enabled if name in available]
+
+
+def import_connector(connectors_dir, name):
+    """
+    Imports a connector module. Modules in a package are imported under the
+    package name so they are shared with the rest of tinyagi, other modules
+    are loaded from their file without changing sys.path, which isn't safe to
+    change while other connectors are importing.
+
+    Returns:
+        module: the connector module
+    """
+    package = get_package_name(connectors_dir)
+    if package is not None:
+        return importlib.import_module(f"{package}.{name}")
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(connectors_dir, name + ".py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def set_connector_state(name, **state):
+    with connectors_lock:
+        connectors[name].update(state)
+
+
+def supervise_connector(connectors_dir, name, loop_dict):
+    """
+    Imports a connector and runs its start_connector, restarting it with
+    backoff whenever it raises. A connector that starts its own thread
+    returns it, and is restarted the same way if the thread stops. Connectors
+    that return nothing are left running unmonitored. Runs on the
+    connector's own thread.
+    """
+    stop_event = loop_dict["stop_event"]
+    delay = MIN_RESTART_DELAY
+    while not stop_event.is_set():
+        try:
+            start_time = time.perf_counter()
+            module = import_connector(connectors_dir, name)
+            import_seconds = time.perf_counter() - start_time
+            observe("tinyagi_connector_import_seconds", import_seconds, {"connector": name})
+            set_connector_state(name, import_seconds=import_seconds)
+            break
+        except Exception as e:
+            set_connector_state(name, status="failed", last_error=repr(e))
+            log(f"Connector {name} failed to import: {e}", type="error")
+        if stop_event.wait(delay):
+            return
+        delay = min(delay * 2, MAX_RESTART_DELAY)
+    else:
+        return
+
+    if not hasattr(module, "start_connector"):
+        set_connector_state(name, status="skipped")
+        return
+
+    delay = MIN_RESTART_DELAY
+    while not stop_event.is_set():
+        started_at = time.time()
+        set_connector_state(name, status="running", started_at=started_at)
+        try:
+            handle = module.start_connector(loop_dict)
+            if not hasattr(handle, "is_alive"):
+                # the connector is running on threads it didn't return, or finished
+                set_connector_state(name, status="returned")
+                return
+            while handle.is_alive():
+                if stop_event.wait(HEALTH_CHECK_INTERVAL):
+                    break
+            if stop_event.is_set():
+                break
+            last_error = f"{getattr(handle, 'name', 'its thread')} stopped"
+        except Exception as e:
+            last_error = repr(e)
+        with connectors_lock:
+            connectors[name]["status"] = "failed"
+            connectors[name]["last_error"] = last_error
+            connectors[name]["restarts"] += 1
+        log(f"Connector {name} failed, restarting in {delay}s: {last_error}", type="error")
+        # a connector that ran for a while before failing starts over from the shortest delay
+        if time.time() - started_at > MAX_RESTART_DELAY:
+            delay = MIN_RESTART_DELAY
+        if stop_event.wait(delay):
+            break
+        delay = min(delay * 2, MAX_RESTART_DELAY)
+    set_connector_state(name, status="stopped")
+
+
+def start_connectors(connectors_dir, loop_dict, enabled=None):
+    """
+    Starts each enabled connector on its own thread and returns straight away.
+    Connectors are imported on their thread, so a slow import or a connector
+    that never returns doesn't hold up the loop or the other connectors.
+
+    Args:
+        connectors_dir: the directory of connector modules
+        loop_dict: the loop dictionary, passed to each start_connector
+        enabled: the connectors to start, defaults to CONNECTORS
+
+    Returns:
+        names: the names of the connectors started
+    """
+    connectors_dir = os.path.abspath(connectors_dir)
+    names = get_enabled_connectors(connectors_dir, enabled)
+    for name in names:
+        thread = threading.Thread(
+            target=supervise_connector,
+            args=(connectors_dir, name, loop_dict),
+            name=f"connector-{name}",
+            daemon=True,
+        )
+        with connectors_lock:
+            connectors[name] = {
+                "status": "starting",
+                "thread": thread,
+                "restarts": 0,
+                "last_error": None,
+                "started_at": None,
+                "import_seconds": None,
+            }
+        thread.start()
+    return names
+
+
+def get_connector_status():
+    """
+    Returns: dict - connector name -> status (starting, running, returned, failed,
+    skipped or stopped), alive, restarts, last_error, started_at and import_seconds.
+    A returned connector didn't return the thread it runs on, so it is
+    unmonitored: it isn't restarted if it stops, and alive is its supervisor's.
+    """
+    with connectors_lock:
+        status = {}
+        for name, state in connectors.items():
+            state = dict(state)
+            state["alive"] = state.pop("thread").is_alive()
+            status[name] = state
+        return status
+
+
+def report_startup(milestone, start_time):
+    """
+    Observes and logs the time from start to a startup milestone
+
+    Args:
+        milestone: the name of the milestone, e.g. first_epoch
+        start_time: the time.perf_counter() value when start was called
+    """
+    seconds = time.perf_counter() - start_time
+    startup_milestones[milestone] = seconds
+    observe("tinyagi_startup_seconds", seconds, {"milestone": milestone})
+    log(f"Startup: {milestone} after {seconds:.2f}s", type="system", color="BRIGHT_BLACK")
+    return seconds
+
+
+def get_startup_milestones():
+    """
+    Returns: dict - each startup milestone reached so far -> seconds from start
+    """
+    return dict(startup_milestones)
+
+
+def time_first_epoch(steps, start_time):
+    """
+    Wraps the first and last steps so the time to the first epoch is reported,
+    once when it starts and once when it finishes
+
+    Returns:
+        steps: the steps, with the first and last wrapped
+    """
+    steps = list(steps)
+    if len(steps) == 0:
+        return steps
+    steps[0] = once_before(steps[0], lambda: report_startup("first_epoch_started", start_time))
+    steps[-1] = once_after(steps[-1], lambda: report_startup("first_epoch_finished", start_time))
+    return steps
+
+
+def once_before(step, callback):
+    called = threading.Event()
+
+    def call():
+        if not called.is_set():
+            called.set()
+            callback()
+
+    if step.__code__.co_argcount == 2:
+
+        def wrapped_step(context, loop_data):
+            call()
+            return step(context, loop_data)
+
+    else:
+
+        def wrapped_step(context):
+            call()
+            return step(context)
+
+    wrapped_step.__name__ = step.__name__
+    return wrapped_step
+
+
+def once_after(step, callback):
+    called = threading.Event()
+
+    def call():
+        if not called.is_set():
+            called.set()
+            callback()
+
+    if step.__code__.co_argcount == 2:
+
+        def wrapped_step(context, loop_data):
+            context = step(context, loop_data)
+            call()
+            return context
+
+    else:
+
+        def wrapped_step(context):
+            context = step(context)
+            call()
+            return context
+
+    wrapped_step.__name__ = step.__name__
+    return wrapped_step
@@ -0,0 +1,233 @@
+import json
+import re
+import threading
+
+from tinyagi.utils import count_tokens
+
+placeholder_pattern = re.compile(r"{{(\w+)}}")
+
+# name -> compiled template, for every template the project registers
+templates = {}
+# template text -> compiled template, so each text is only parsed once
+compiled_templates = {}
+templates_lock = threading.Lock()
+
+
+class PromptTemplate:
+    """
+    A prompt template split once into literal text and {{placeholder}} slots.
+    literals always has one more entry than slots, so rendering alternates
+    between them.
+    """
+
+    __slots__ = ("name", "text", "literals", "slots", "keys", "tokens")
+
+    def __init__(self, text, name=None):
+        parts = placeholder_pattern.split(text)
+        self.name = name
+        self.text = text
+        self.literals = parts[0::2]
+        self.slots = parts[1::2]
+        self.keys = list(dict.fromkeys(self.slots))
+        self.tokens = None
+
+    @property
+    def static_tokens(self):
+        """
+        The token count of the literal text, without any of the slots.
+        Counted the first time it is needed, the tokenizer is slow to load.
+        """
+        if self.tokens is None:
+            self.tokens = count_tokens("".join(self.literals))
+        return self.tokens
+
+    def render(self, values):
+        """
+        Fills the slots from a dictionary, the same way compose_prompt does.
+        Slots without a value are left as {{placeholder}}.
+
+        Args:
+            values: the dictionary of values, usually the context
+
+        Returns:
+            text: the rendered prompt
+        """
+        parts = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            text = format_value(slot, values.get(slot, missing))
+            parts.append("{{" + slot + "}}" if text is None else text)
+            parts.append(literal)
+        return "".join(parts)
+
+    def __repr__(self):
+        return f"PromptTemplate({self.name!r}, slots={self.keys})"
+
+
+# stands in for a key that is not in the values at all, as opposed to a None value
+missing = object()
+
+
+def format_value(key, value):
+    """
+    Formats a value for a slot the same way compose_prompt does
+
+    Returns:
+        text: the text for the slot, or None if the slot should be left as is
+    """
+    if value is missing:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    if value is None:
+        return "None"
+    try:
+        # compose_prompt replaces the placeholder with the first item only
+        if isinstance(value, dict):
+            for k, v in value.items():
+                return k + "::" + v
+            return None
+        if isinstance(value, list):
+            for item in value:
+                return item + "\n"
+            return None
+    except TypeError:
+        pass
+    raise Exception(f"ERROR PARSING:\n{key}\n{value}")
+
+
+def compile_template(text):
+    """
+    Compiles a template, or returns the compiled template if this text was seen before
+
+    Args:
+        text: the template text
+
+    Returns:
+        template: a PromptTemplate
+    """
+    template = compiled_templates.get(text)
+    if template is None:
+        with templates_lock:
+            template = compiled_templates.setdefault(text, PromptTemplate(text))
+    return template
+
+
+def register_template(name, text):
+    """
+    Compiles a template and registers it by name, at import time
+
+    Args:
+        name: a unique name for the template
+        text: the template text
+
+    Returns:
+        template: a PromptTemplate
+    """
+    with templates_lock:
+        template = compiled_templates.get(text)
+        if template is None or template.name not in (None, name):
+            template = PromptTemplate(text, name)
+        template.name = name
+        compiled_templates.setdefault(text, template)
+        templates[name] = template
+    return template
+
+
+def get_template(template):
+    """
+    Returns: PromptTemplate - the compiled form of a template, or the template itself
+    if it is already compiled
+    """
+    if isinstance(template, PromptTemplate):
+        return template
+    return compile_template(template)
+
+
+def render_template(template, values):
+    """
+    Renders a template, compiling it first if it is a string
+
+    Args:
+        template: a PromptTemplate or template text
+        values: the dictionary of values
+
+    Returns:
+        text: the rendered prompt
+    """
+    return get_template(template).render(values)
+
+
+class FrozenDict(dict):
+    """
+    A dictionary that can't be changed, for function schemas that are built
+    once and shared. Copies are ordinary dictionaries, so a schema can be
+    copied and then extended.
+    """
+
+    __slots__ = ("json_text",)
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("function schemas are frozen, copy them to change them")
+
+    __setitem__ = __delitem__ = __ior__ = __readonly
+    clear = pop = popitem = setdefault = update = __readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def to_json(self):
+        """
+        Returns: str - the schema as JSON, serialized once
+        """
+        if not hasattr(self, "json_text"):
+            self.json_text = json.dumps(self)
+        return self.json_text
+
+
+def freeze(value):
+    """
+    Makes a frozen copy of a function schema. Dictionaries become FrozenDicts
+    and lists become tuples, all the way down.
+    """
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """
+    Makes an ordinary, changeable copy of a frozen function schema
+    """
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def frozen_function(compose):
+    """
+    Decorates a function schema factory so the schema is built once and frozen.
+    Every call returns the same schema.
+    """
+    cache = {}
+
+    def cached():
+        if "function" not in cache:
+            cache["function"] = freeze(compose())
+        return cache["function"]
+
+    cached.__name__ = compose.__name__
+    cached.__doc__ = compose.__doc__
+    cached.__wrapped__ = compose
+    return cached
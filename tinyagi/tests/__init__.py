@@ -1,2 +1,18 @@
+from .action_index import *
+from .completion import *
+from .connectors import *
 from .context import *
-from .steps import *
\ No newline at end of file
+from .embeddings import *
+from .knowledge_index import *
+from .log_sink import *
+from .metrics import *
+from .packing import *
+from .steps import *
+from .pipeline import *
+from .profiling import *
+from .retention import *
+from .snapshot import *
+from .speech import *
+from .supervisor import *
+from .templates import *
+from .utils import *
\ No newline at end of file
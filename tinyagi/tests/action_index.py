@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+import tinyagi.action_index as action_index_module
+from tinyagi.action_index import get_indexed_actions, set_last_action
+
+
+def create_action(name, suggestions=None, never=None):
+    return {
+        "function": {"name": name, "description": name + " things", "parameters": {}},
+        "suggestion_after_actions": suggestions or [],
+        "never_after_actions": never or [],
+    }
+
+
+def fake_embed(calls):
+    # one axis per word, so a summary matches the action named in it
+    words = ["joke", "poem", "shell", "chat", "fact", "nothing"]
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[1.0 if word in text else 0.01 for word in words] for text in texts]
+
+    return embed
+
+
+def test_indexed_actions(monkeypatch):
+    actions = {
+        "joke": create_action("joke", suggestions=["chat"], never=["joke"]),
+        "poem": create_action("poem"),
+        "shell": create_action("shell"),
+        "chat": create_action("chat"),
+        "fact": create_action("fact"),
+        "nothing": create_action("nothing"),
+    }
+    calls = []
+    monkeypatch.setattr(action_index_module, "get_actions", lambda: actions)
+    monkeypatch.setattr(action_index_module, "get_last_action", lambda: None)
+    monkeypatch.setattr(action_index_module, "embed", fake_embed(calls))
+    monkeypatch.setattr(action_index_module, "ACTION_SEARCH_RESULTS", 2)
+    # start from an empty index, and leave the module's as it was
+    empty_index = {
+        "signature": None,
+        "names": [],
+        "memories": [],
+        "vectors": None,
+        "last_action": None,
+        "last_action_loaded": False,
+        "results": OrderedDict(),
+    }
+    for key, value in empty_index.items():
+        monkeypatch.setitem(action_index_module.action_index, key, value)
+
+    result = get_indexed_actions("I want to tell a joke")
+    assert [memory["id"] for memory in result["available_actions"]][0] == "joke"
+    assert len(result["available_actions"]) == 2
+    assert result["available_actions"][0]["document"] == "joke - joke things"
+    assert result["short_actions"].startswith("Available actions (name): joke, ")
+    # the actions were embedded once, and the summary once
+    assert len(calls) == 2
+
+    # the second pass with the same summary doesn't embed anything
+    assert get_indexed_actions("I want to tell a joke") is result
+    assert len(calls) == 2
+
+    # after a joke, chat is recommended and another joke is not allowed
+    set_last_action("joke")
+    result = get_indexed_actions("I want to tell a joke")
+    names = [memory["id"] for memory in result["available_actions"]]
+    assert names[0] == "chat"
+    assert result["available_actions"][0]["recommended"] is True
+    assert "joke" not in names
+
+    # changing the registered actions rebuilds the index
+    actions["dance"] = create_action("dance")
+    get_indexed_actions("I want to tell a joke")
+    assert "dance" in action_index_module.action_index["names"]
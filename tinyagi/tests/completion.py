@@ -0,0 +1,138 @@
+import importlib
+import random
+
+import pytest
+
+import tinyagi.completion as completion_module
+from tinyagi.completion import (
+    CompletionCacheMiss,
+    StubCompletion,
+    clear_completion_cache_stats,
+    get_completion_cache_stats,
+    set_completion_cache,
+    function_completion,
+    generate_value,
+    get_completion_backend,
+    parse_latency,
+    set_completion_backend,
+    text_completion,
+)
+
+decide_and_act_module = importlib.import_module("tinyagi.steps.decide_and_act")
+decide_module = importlib.import_module("tinyagi.steps.decide")
+orient_module = importlib.import_module("tinyagi.steps.orient")
+
+
+def test_parse_latency():
+    rng = random.Random(0)
+    assert parse_latency("0.25")(rng) == 0.25
+    assert parse_latency("constant:1")(rng) == 1.0
+    assert 0.2 <= parse_latency("uniform:0.2,0.4")(rng) <= 0.4
+    assert parse_latency("normal:0,0.1")(rng) >= 0.0
+    assert parse_latency("lognormal:0.5,0.3")(rng) > 0.0
+
+
+def test_generated_arguments_fit_schemas():
+    rng = random.Random(0)
+    for function in [
+        decide_module.compose_decision_function(),
+        orient_module.compose_orient_function(),
+    ]:
+        for _ in range(20):
+            arguments = generate_value(function["parameters"], rng)
+            assert decide_and_act_module.validate_arguments(function, arguments)
+    arguments = generate_value(
+        {"type": "object", "properties": {"mood": {"type": "string", "enum": ["a", "b"]}}},
+        rng,
+    )
+    assert arguments["mood"] in ["a", "b"]
+
+
+def test_stub_backend(monkeypatch):
+    monkeypatch.setattr(completion_module, "count_tokens", lambda text: len(text.split()))
+    stub = StubCompletion("constant:0", seed=1)
+    stub.set_argument_choices("decide_action", "action_name", ["joke"])
+    completion_module.register_completion_backend(
+        "test_stub", stub.function_completion, stub.text_completion
+    )
+    set_completion_backend("test_stub")
+    try:
+        response = function_completion(
+            text="pick an action",
+            functions=decide_module.compose_decision_function(),
+        )
+        assert response["function_name"] == "decide_action"
+        assert response["arguments"]["action_name"] == "joke"
+        assert isinstance(response["arguments"]["reasoning"], str)
+        assert text_completion(text="say something")["text"].startswith("stub reply")
+        assert [call["prompt_tokens"] for call in stub.calls] == [3, 2]
+    finally:
+        set_completion_backend("openai")
+    assert get_completion_backend()["name"] == "openai"
+
+
+def test_completion_cache_modes(monkeypatch, tmp_path):
+    calls = []
+
+    def counting_text_completion(text, temperature=0.0, **kwargs):
+        calls.append(text)
+        return {"text": f"reply {len(calls)}", "error": None}
+
+    def failing_text_completion(text, **kwargs):
+        return {"text": None, "error": "rate limited"}
+
+    completion_module.register_completion_backend("test_counting", None, counting_text_completion)
+    completion_module.register_completion_backend("test_failing", None, failing_text_completion)
+    set_completion_backend("test_counting")
+    clear_completion_cache_stats()
+    try:
+        set_completion_cache("record", str(tmp_path / "completions.sqlite"))
+        completion_module.set_prompt_time_values("10:15")
+        assert text_completion(text="The time is 10:15.\nHello")["text"] == "reply 1"
+        assert text_completion("The time is 10:15.\nHello")["text"] == "reply 2"
+
+        # the time and trailing whitespace don't change the key
+        set_completion_cache("replay")
+        completion_module.set_prompt_time_values("11:42")
+        response = text_completion(text="The time is 11:42.  \r\nHello")
+        assert response["text"] == "reply 2"
+        with pytest.raises(CompletionCacheMiss):
+            text_completion(text="Hello", temperature=1.0)
+
+        set_completion_cache("read-through")
+        assert text_completion(text="Hello", temperature=1.0)["text"] == "reply 3"
+        assert text_completion(text="Hello", temperature=1.0)["text"] == "reply 3"
+        assert len(calls) == 3
+
+        # errors are not recorded
+        set_completion_backend("test_failing")
+        assert text_completion(text="Goodbye")["error"] == "rate limited"
+        set_completion_backend("test_counting")
+        assert text_completion(text="Goodbye")["text"] == "reply 4"
+
+        stats = get_completion_cache_stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 4
+        assert stats["records"] == 4
+    finally:
+        completion_module.set_prompt_time_values()
+        set_completion_cache("off")
+        set_completion_backend("openai")
+
+
+def test_cache_key_keeps_times_in_the_prompt_body():
+    completion_module.set_prompt_time_values("09:00", "2024-05-01")
+    try:
+        meet_early = completion_cache_key_for("It is 09:00 on 2024-05-01. Let's meet at 10:30")
+        meet_late = completion_cache_key_for("It is 09:00 on 2024-05-01. Let's meet at 11:45")
+        assert meet_early != meet_late
+
+        # the current time and date don't change the key
+        completion_module.set_prompt_time_values("09:01", "2024-05-02")
+        assert completion_cache_key_for("It is 09:01 on 2024-05-02. Let's meet at 10:30") == meet_early
+    finally:
+        completion_module.set_prompt_time_values()
+
+
+def completion_cache_key_for(text):
+    return completion_module.completion_cache_key("text", (), {"text": text})
@@ -0,0 +1,2 @@
+from .irc import *
+from .twitch import *
\ No newline at end of file
@@ -0,0 +1,98 @@
+import asyncio
+import random
+
+import tinyagi.connectors.irc as irc_module
+from tinyagi.connectors.irc import IrcLineParser, IrcMessage, irc_privmsgs
+
+
+def test_irc_message_fields():
+    irc_message = IrcMessage(
+        b":someone!someone@someone.tmi.twitch.tv PRIVMSG #channel :hello :) world"
+    )
+    assert irc_message.name == "someone"
+    assert irc_message.command == "PRIVMSG"
+    assert irc_message.params == ["#channel"]
+    assert irc_message.trailing == "hello :) world"
+
+    irc_message = IrcMessage(b"PING :tmi.twitch.tv")
+    assert irc_message.name == ""
+    assert irc_message.command == "PING"
+    assert irc_message.trailing == "tmi.twitch.tv"
+
+    irc_message = IrcMessage(b":tmi.twitch.tv 376 justinfan1")
+    assert irc_message.name == ""
+    assert irc_message.command == "376"
+    assert irc_message.params == ["justinfan1"]
+    assert irc_message.trailing == ""
+
+
+def test_irc_line_parser_fragmented_stream():
+    rng = random.Random(1337)
+    lines = [
+        b":user%i!user%i@tmi PRIVMSG #test :message %i %s"
+        % (i, i, i, b"x" * rng.randint(0, 300))
+        for i in range(2000)
+    ]
+    stream = b"".join(line + b"\r\n" for line in lines)
+
+    parser = IrcLineParser()
+    parsed = []
+    position = 0
+    while position < len(stream):
+        size = rng.randint(1, 700)
+        parsed.extend(parser.feed(stream[position : position + size]))
+        position += size
+
+    assert [irc_message.line for irc_message in parsed] == lines
+    assert parsed[-1].trailing.startswith("message 1999")
+    assert len(parser.buffer) - parser.start == 0
+
+
+async def run_fake_irc_server(received):
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        await reader.readuntil(b"\r\n")  # PASS
+        await reader.readuntil(b"\r\n")  # NICK
+        writer.write(b":tmi.twitch.tv 001 justinfan :Welcome, GLHF!\r\n")
+        received.append(await reader.readuntil(b"\r\n"))  # JOIN
+        writer.write(b"PING :tmi.twitch.tv\r\n")
+        await writer.drain()
+        received.append(await reader.readuntil(b"\r\n"))  # PONG
+
+        # send a message split across several writes
+        line = b":viewer%i!viewer@tmi PRIVMSG #test :message %i\r\n" % (
+            len(connections),
+            len(connections),
+        )
+        for i in range(0, len(line), 7):
+            writer.write(line[i : i + 7])
+            await writer.drain()
+            await asyncio.sleep(0.001)
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_irc_privmsgs_with_fake_server(monkeypatch):
+    monkeypatch.setattr(irc_module, "MIN_RECONNECT_DELAY", 0.01)
+
+    async def run():
+        received = []
+        server = await run_fake_irc_server(received)
+        port = server.sockets[0].getsockname()[1]
+        messages = []
+        async for message in irc_privmsgs("test", host="127.0.0.1", port=port):
+            messages.append(message)
+            if len(messages) == 2:
+                break
+        server.close()
+        return received, messages
+
+    received, messages = asyncio.run(run())
+    assert received[:2] == [b"JOIN #test\r\n", b"PONG :tmi.twitch.tv\r\n"]
+    assert messages == [
+        {"username": "viewer1", "message": "message 1"},
+        {"username": "viewer2", "message": "message 2"},
+    ]
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import tinyagi.connectors.twitch as twitch_module
+from tinyagi.connectors.twitch import (
+    build_twitch_context,
+    collect_twitch_batch,
+    create_twitch_run,
+    enqueue_twitch_message,
+    merge_twitch_messages,
+    remember_twitch_messages,
+    respond_to_twitch,
+)
+
+
+def test_merge_twitch_messages():
+    messages = [
+        {"username": "a", "message": "hi"},
+        {"username": "a", "message": "there"},
+        {"username": "b", "message": "yo"},
+        {"username": "a", "message": "again"},
+    ]
+    assert merge_twitch_messages(messages) == [
+        {"username": "a", "message": "hi there"},
+        {"username": "b", "message": "yo"},
+        {"username": "a", "message": "again"},
+    ]
+
+
+def test_twitch_batches_are_bounded(monkeypatch):
+    async def run():
+        monkeypatch.setattr(twitch_module, "TWITCH_QUEUE_SIZE", 3)
+        monkeypatch.setattr(twitch_module, "TWITCH_BATCH_WINDOW", 0.05)
+        run = create_twitch_run()
+        for i in range(5):
+            enqueue_twitch_message(run, {"username": "user", "message": str(i)})
+        assert run["dropped_messages"] == 2
+        return await collect_twitch_batch(run)
+
+    batch = asyncio.run(run())
+    assert [message["message"] for message in batch] == ["2", "3", "4"]
+
+
+def test_twitch_history_is_bounded(monkeypatch):
+    stored = []
+    updates = []
+
+    def fake_create_memories(category, documents, metadatas):
+        now = time.time()
+        for metadata in metadatas:
+            metadata["created_at"] = now
+        ids = [str(len(stored) + i).zfill(16) for i in range(len(documents))]
+        stored.extend(ids)
+        return ids
+
+    def fake_get_memories(category, filter_metadata=None, n_results=20):
+        # one earlier message is still waiting, one is too old to show
+        if filter_metadata == {"handled": "False"}:
+            return [{"id": "a", "document": "waiting", "metadata": {"user": "x", "created_at": time.time()}}]
+        return [{"id": "b", "document": "stale", "metadata": {"user": "y", "created_at": 0}}]
+
+    monkeypatch.setattr(twitch_module, "create_memories", fake_create_memories)
+    monkeypatch.setattr(twitch_module, "get_memories", fake_get_memories)
+    monkeypatch.setattr(
+        twitch_module, "update_memories", lambda category, ids, metadatas: updates.append(ids)
+    )
+    monkeypatch.setattr(
+        twitch_module,
+        "twitch_history",
+        {"loaded": False, "unhandled": [], "handled": deque(maxlen=3)},
+    )
+
+    remember_twitch_messages(["one", "two"], ["a", "b"], False)
+    context = build_twitch_context({})
+    assert context["twitch"] == "x: waiting\na: one\nb: two"
+    assert context["old_twitch"] == ""
+    assert updates == [["a", stored[0], stored[1]]]
+
+    remember_twitch_messages(["reply"], ["Me"], True)
+    remember_twitch_messages(["three"], ["c"], False)
+    context = build_twitch_context({})
+    assert context["twitch"] == "c: three"
+    # only the last three earlier messages are shown
+    assert context["old_twitch"] == "a: one\nb: two\nMe: reply"
+    assert updates[-1] == [stored[3]]
+
+
+def test_twitch_response_is_stored_off_the_event_loop(monkeypatch):
+    threads = []
+    spoken = []
+    arguments = {"banter": "hi chat", "emotion": "joy", "gesture": "victory", "urls": []}
+    monkeypatch.setattr(twitch_module, "get_connector_context", lambda: {})
+    monkeypatch.setattr(twitch_module, "build_twitch_context", lambda context: context)
+    monkeypatch.setattr(twitch_module, "compose_packed_prompt", lambda *a, **k: "prompt")
+    monkeypatch.setattr(
+        twitch_module, "function_completion", lambda **kwargs: {"arguments": arguments}
+    )
+    monkeypatch.setattr(
+        twitch_module,
+        "remember_twitch_messages",
+        lambda documents, users, handled: threads.append(threading.current_thread()),
+    )
+    monkeypatch.setattr(
+        twitch_module,
+        "create_event",
+        lambda text, metadata=None: threads.append(threading.current_thread()),
+    )
+    monkeypatch.setattr(twitch_module, "speak", lambda message, **kwargs: spoken.append(message))
+    monkeypatch.setattr(twitch_module, "estimate_speech_duration", lambda text: 1.0)
+
+    asyncio.run(respond_to_twitch())
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+    assert spoken[0]["message"] == "hi chat"
@@ -1,3 +1,4 @@
 from .actions import *
+from .builder import *
 from .events import *
 from .knowledge import *
\ No newline at end of file
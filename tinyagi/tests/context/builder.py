@@ -0,0 +1,90 @@
+import sys
+
+import pytest
+
+from tinyagi.context.builder import create_context_builders, get_builder_timings
+
+builders_module = '''
+import time
+from tinyagi.context.builder import context_builder
+
+# builder name -> (start, end) of its last run
+spans = {}
+
+
+@context_builder(writes=["slow_a"])
+def build_slow_a(context):
+    start_time = time.perf_counter()
+    time.sleep(0.2)
+    context["slow_a"] = "a"
+    spans["build_slow_a"] = (start_time, time.perf_counter())
+    return context
+
+
+@context_builder(writes=["slow_b"])
+def build_slow_b(context):
+    start_time = time.perf_counter()
+    time.sleep(0.2)
+    context["slow_b"] = "b"
+    spans["build_slow_b"] = (start_time, time.perf_counter())
+    return context
+
+
+@context_builder(reads=["slow_a", "slow_b"], writes=["combined"])
+def build_combined(context):
+    spans["build_combined"] = (time.perf_counter(), time.perf_counter())
+    context["combined"] = context["slow_a"] + context["slow_b"]
+    return context
+
+
+def get_context_builders():
+    return [build_combined, build_slow_a, build_slow_b]
+'''
+
+cyclic_builders_module = '''
+from tinyagi.context.builder import context_builder
+
+
+@context_builder(reads=["b"], writes=["a"])
+def build_a(context):
+    return context
+
+
+@context_builder(reads=["a"], writes=["b"])
+def build_b(context):
+    return context
+
+
+def get_context_builders():
+    return [build_a, build_b]
+'''
+
+
+def test_build_context_runs_independent_builders_concurrently(tmp_path):
+    (tmp_path / "concurrent_builders_fixture.py").write_text(builders_module)
+    try:
+        build_context = create_context_builders(str(tmp_path))
+        context = build_context({"summary": "test"})
+        spans = sys.modules["concurrent_builders_fixture"].spans
+    finally:
+        sys.modules.pop("concurrent_builders_fixture", None)
+
+    assert context["combined"] == "ab"
+    assert context["summary"] == "test"
+
+    slow_a, slow_b = spans["build_slow_a"], spans["build_slow_b"]
+    assert slow_a[0] < slow_b[1] and slow_b[0] < slow_a[1], "Independent builders should overlap"
+    assert spans["build_combined"][0] >= max(slow_a[1], slow_b[1])
+
+    timings = get_builder_timings()
+    assert set(timings.keys()) == {"build_slow_a", "build_slow_b", "build_combined"}
+    assert timings["build_slow_a"] >= 0.2
+
+
+def test_builders_that_depend_on_each_other_are_rejected(tmp_path):
+    (tmp_path / "cyclic_builders_fixture.py").write_text(cyclic_builders_module)
+    try:
+        with pytest.raises(ValueError, match="build_a, build_b"):
+            create_context_builders(str(tmp_path))
+    finally:
+        sys.modules.pop("cyclic_builders_fixture", None)
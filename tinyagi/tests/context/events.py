@@ -32,3 +32,87 @@ def test_get_context_builders():
     builders = get_context_builders()
     assert len(builders) == 1
     assert builders[0].__name__ == "build_events_context"
+
+
+def test_event_window_only_appends_new_events(monkeypatch):
+    import tinyagi.context.events as events_module
+
+    store = [
+        {"id": "1", "document": "first", "metadata": {"epoch": 1, "creator": "Me"}},
+        {"id": "2", "document": "second", "metadata": {"epoch": 2, "creator": "Me"}},
+    ]
+    calls = []
+
+    def fake_get_events(n_results=10, filter_metadata=None):
+        calls.append(filter_metadata)
+        if filter_metadata is None:
+            return [dict(e, metadata=dict(e["metadata"])) for e in store]
+        min_epoch = filter_metadata["epoch"]["$gte"]
+        return [
+            dict(e, metadata=dict(e["metadata"]))
+            for e in store
+            if e["metadata"]["epoch"] >= min_epoch
+        ]
+
+    monkeypatch.setattr(events_module, "get_events", fake_get_events)
+    monkeypatch.setattr(events_module, "count_tokens", lambda text: len(text.split()))
+    events_module.reset_event_window()
+
+    context = events_module.build_events_context({})
+    assert "1 | Me: first\n2 | Me: second" in context["events"]
+
+    store.append(
+        {"id": "3", "document": "third", "metadata": {"epoch": 2, "creator": "Me"}}
+    )
+    context = events_module.build_events_context({})
+    assert calls[-1] == {"epoch": {"$gte": 2}}
+    assert context["events"].count("second") == 1
+    assert context["events"].endswith("2 | Me: second\n2 | Me: third\n")
+    events_module.reset_event_window()
+
+
+def test_event_window_trims_oldest_events(monkeypatch):
+    import tinyagi.context.events as events_module
+
+    store = [
+        {"id": str(i), "document": "word " * 400, "metadata": {"epoch": i}}
+        for i in range(1, 12)
+    ]
+    monkeypatch.setattr(
+        events_module,
+        "get_events",
+        lambda n_results=10, filter_metadata=None: [] if filter_metadata else store,
+    )
+    monkeypatch.setattr(events_module, "count_tokens", lambda text: len(text.split()))
+    events_module.reset_event_window()
+
+    context = events_module.build_events_context({})
+    assert events_module.count_tokens(context["events"]) <= events_module.MAX_PROMPT_TOKENS
+    assert "11 | " in context["events"]
+    assert "\n1 | " not in context["events"]
+    events_module.reset_event_window()
+
+
+def test_event_window_is_reset_after_a_wipe(monkeypatch):
+    import tinyagi.context.events as events_module
+    from tinyagi.main import reset_memory_caches
+
+    store = [{"id": "1", "document": "last run", "metadata": {"epoch": 5, "creator": "Me"}}]
+
+    def fake_get_events(n_results=10, filter_metadata=None):
+        if filter_metadata is None:
+            return list(store)
+        return [e for e in store if e["metadata"]["epoch"] >= filter_metadata["epoch"]["$gte"]]
+
+    monkeypatch.setattr(events_module, "get_events", fake_get_events)
+    monkeypatch.setattr(events_module, "count_tokens", lambda text: len(text.split()))
+    events_module.reset_event_window()
+    assert "last run" in events_module.build_events_context({})["events"]
+
+    # the store is wiped and the new run starts again from epoch 1
+    store[:] = [{"id": "1", "document": "new run", "metadata": {"epoch": 1, "creator": "Me"}}]
+    reset_memory_caches()
+    events = events_module.build_events_context({})["events"]
+    assert "last run" not in events
+    assert "1 | Me: new run" in events
+    events_module.reset_event_window()
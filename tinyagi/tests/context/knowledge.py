@@ -1,5 +1,9 @@
+import tinyagi.context.knowledge as knowledge_module
 from tinyagi.context.knowledge import (
     add_knowledge,
+    add_knowledge_batch,
+    build_recent_knowledge,
+    index_knowledge_epochs,
     remove_knowledge,
 )
 from agentmemory import (
@@ -76,6 +80,116 @@ def test_search_knowledge():
     assert len(knowledge) > 0 and knowledge[0]["document"] == "test"
 
 
+def test_add_knowledge_batch(monkeypatch):
+    vectors = {
+        "cats are great": [1.0, 0.0, 0.0],
+        "cats are really great": [0.99, 0.05, 0.0],
+        "dogs bark": [0.0, 1.0, 0.0],
+        "the sky is blue": [0.0, 0.0, 1.0],
+    }
+    embedded = []
+    searched = []
+    created = {}
+
+    def fake_embed(texts):
+        embedded.append(texts)
+        return [vectors[text] for text in texts]
+
+    def fake_search_memories(category, embeddings, n_results=1, filter_metadata=None):
+        searched.append(embeddings)
+        # the store already knows about the sky
+        return [
+            [{"id": "0000000000000002", "document": "sky is blue", "distance": 0.01}]
+            if embedding == vectors["the sky is blue"]
+            else []
+            for embedding in embeddings
+        ]
+
+    def fake_create_memories(category, documents, metadatas=None, embeddings=None, ids=None):
+        created.update(zip(documents, metadatas))
+        return ids
+
+    monkeypatch.setattr(knowledge_module, "embed", fake_embed)
+    monkeypatch.setattr(knowledge_module, "search_memories", fake_search_memories)
+    monkeypatch.setattr(knowledge_module, "create_memories", fake_create_memories)
+    monkeypatch.setattr(knowledge_module, "get_epoch", lambda: 1)
+    monkeypatch.setattr(knowledge_module, "knowledge_epochs", {})
+    monkeypatch.setattr(
+        knowledge_module,
+        "next_memory_ids",
+        lambda category, count: [str(i).zfill(16) for i in range(10, 10 + count)],
+    )
+
+    ids = add_knowledge_batch(list(vectors.keys()))
+
+    assert len(embedded) == 1, "All items should be embedded at once"
+    assert len(searched) == 1 and len(searched[0]) == 3, "Only batch-novel items are searched"
+    assert ids == [str(i).zfill(16) for i in range(10, 14)]
+    assert created["cats are great"]["novel"] == "True"
+    assert created["cats are really great"]["novel"] == "False"
+    assert created["cats are really great"]["related_to"] == ids[0]
+    assert created["dogs bark"]["novel"] == "True"
+    assert created["the sky is blue"]["novel"] == "False"
+    assert created["the sky is blue"]["related_to"] == "0000000000000002"
+
+
+def test_build_recent_knowledge_reads_epoch_by_id(monkeypatch):
+    documents = {str(i).zfill(16): "knowledge %i" % i for i in range(6)}
+    gets = []
+
+    class FakeCollection:
+        def get(self, ids=None, where=None, include=None):
+            gets.append({"ids": ids, "where": where})
+            if ids is None:
+                ids = [id for id in documents if int(id) < 2]
+            return {
+                "ids": ids,
+                "documents": [documents[id] for id in ids],
+                "metadatas": [{} for id in ids],
+            }
+
+    class FakeClient:
+        def get_or_create_collection(self, category):
+            return FakeCollection()
+
+    monkeypatch.setattr(knowledge_module, "get_client", lambda: FakeClient())
+    monkeypatch.setattr(knowledge_module, "count_tokens", lambda text: len(text.split()))
+    monkeypatch.setattr(knowledge_module, "knowledge_epochs", {})
+
+    # knowledge this process didn't write is scanned for once
+    monkeypatch.setattr(knowledge_module, "get_epoch", lambda: 10)
+    context = build_recent_knowledge({})
+    assert context["recent_knowledge"] == "knowledge 1\nknowledge 0"
+    build_recent_knowledge({})
+    assert gets[0] == {"ids": None, "where": {"epoch": 9}}
+    assert gets[1]["where"] is None
+
+    # knowledge written by this process is read by id
+    index_knowledge_epochs(
+        list(documents.keys())[2:], [{"epoch": 10} for i in range(4)]
+    )
+    monkeypatch.setattr(knowledge_module, "get_epoch", lambda: 11)
+    monkeypatch.setattr(knowledge_module, "MAX_PROMPT_TOKENS", 7)
+    context = build_recent_knowledge({})
+    assert gets[-1]["where"] is None
+    # the newest knowledge is dropped first, like before
+    assert context["recent_knowledge"] == "knowledge 3\nknowledge 2"
+
+    # an epoch that isn't indexed, e.g. written by another process, is scanned for too
+    monkeypatch.setattr(knowledge_module, "get_epoch", lambda: 12)
+    documents["0000000000000006"] = "knowledge 6"
+    monkeypatch.setattr(knowledge_module, "MAX_PROMPT_TOKENS", 100)
+    assert build_recent_knowledge({})["recent_knowledge"] == "knowledge 1\nknowledge 0"
+    assert gets[-1] == {"ids": None, "where": {"epoch": 11}}
+
+    # and is still scanned for after the index has evicted it
+    monkeypatch.setattr(knowledge_module, "KNOWLEDGE_EPOCHS_KEPT", 0)
+    index_knowledge_epochs(["0000000000000006"], [{"epoch": 12}])
+    monkeypatch.setattr(knowledge_module, "get_epoch", lambda: 11)
+    build_recent_knowledge({})
+    assert gets[-1] == {"ids": None, "where": {"epoch": 10}}
+
+
 def run_tests():
     test_add_knowledge()
     test_remove_knowledge()
@@ -0,0 +1,116 @@
+import tinyagi.embeddings as embeddings_module
+from tinyagi.embeddings import (
+    CachedEmbeddingCollection,
+    clear_embedding_cache,
+    embed,
+    get_embedding_cache_stats,
+    set_embedding_function,
+)
+
+
+def fake_embedding_function(calls):
+    def embedding_function(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    return embedding_function
+
+
+def test_embed_is_memoized(monkeypatch, tmp_path):
+    monkeypatch.setattr(embeddings_module, "EMBEDDING_CACHE_PATH", str(tmp_path))
+    calls = []
+    set_embedding_function(fake_embedding_function(calls), "fake")
+    clear_embedding_cache()
+
+    assert embed(["one", "three"]) == [[3.0, 1.0, 0.5], [5.0, 1.0, 0.5]]
+    assert embed(["three", "four", "four"]) == [
+        [5.0, 1.0, 0.5],
+        [4.0, 1.0, 0.5],
+        [4.0, 1.0, 0.5],
+    ]
+    assert calls == [["one", "three"], ["four"]]
+
+    stats = get_embedding_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["hit_ratio"] == 0.25
+    set_embedding_function(None, "default")
+    clear_embedding_cache()
+
+
+def test_embed_disk_tier_survives_restart(monkeypatch, tmp_path):
+    monkeypatch.setattr(embeddings_module, "EMBEDDING_CACHE_PATH", str(tmp_path))
+    calls = []
+    set_embedding_function(fake_embedding_function(calls), "fake")
+    clear_embedding_cache()
+    embed(["persisted"])
+
+    # a fresh process only has the files on disk
+    set_embedding_function(fake_embedding_function(calls), "fake")
+    clear_embedding_cache()
+    assert embed(["persisted"]) == [[9.0, 1.0, 0.5]]
+    assert calls == [["persisted"]]
+    assert get_embedding_cache_stats()["disk_hits"] == 1
+
+    # vectors from another model are never reused
+    set_embedding_function(fake_embedding_function(calls), "other")
+    embed(["persisted"])
+    assert len(calls) == 2
+    set_embedding_function(None, "default")
+    clear_embedding_cache()
+
+
+def test_embedding_file_grows(tmp_path):
+    embedding_file = embeddings_module.EmbeddingFile(str(tmp_path), "fake")
+    keys = [str(i) for i in range(1500)]
+    embedding_file.put(keys[:1000], [[float(i), 0.0] for i in range(1000)])
+    embedding_file.put(keys[1000:], [[float(i), 0.0] for i in range(1000, 1500)])
+    assert embedding_file.get(["5", "1200"])["1200"].tolist() == [1200.0, 0.0]
+    assert embedding_file.get(["5"])["5"].tolist() == [5.0, 0.0]
+    embedding_file.close()
+
+
+def test_embedding_file_skips_stored_keys(tmp_path):
+    embedding_file = embeddings_module.EmbeddingFile(str(tmp_path), "fake")
+    embedding_file.put(["a", "b"], [[1.0, 0.0], [2.0, 0.0]])
+    # a second thread that embedded the same text puts it again
+    embedding_file.put(["b", "c", "c"], [[9.0, 0.0], [3.0, 0.0], [3.0, 0.0]])
+    assert embedding_file.rows == 3
+    embedding_file.close()
+
+    # reopened, new rows go after the stored ones instead of over them
+    embedding_file = embeddings_module.EmbeddingFile(str(tmp_path), "fake")
+    assert embedding_file.rows == 3
+    embedding_file.put(["d"], [[4.0, 0.0]])
+    vectors = embedding_file.get(["a", "b", "c", "d"])
+    assert [vectors[key].tolist() for key in "abcd"] == [
+        [1.0, 0.0],
+        [2.0, 0.0],
+        [3.0, 0.0],
+        [4.0, 0.0],
+    ]
+    embedding_file.close()
+
+
+def test_cached_collection_embeds_documents_and_queries(monkeypatch, tmp_path):
+    monkeypatch.setattr(embeddings_module, "EMBEDDING_CACHE_PATH", str(tmp_path))
+    set_embedding_function(fake_embedding_function([]), "fake")
+    clear_embedding_cache()
+
+    class FakeCollection:
+        def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+            self.upserted = embeddings
+
+        def query(self, query_embeddings=None, query_texts=None, **kwargs):
+            self.queried = (query_embeddings, query_texts)
+
+    collection = FakeCollection()
+    cached_collection = CachedEmbeddingCollection(collection)
+    cached_collection.upsert(ids=["1"], documents=["summary"])
+    cached_collection.query(query_texts=["summary"], n_results=1)
+
+    assert collection.upserted == [[7.0, 1.0, 0.5]]
+    assert collection.queried == ([[7.0, 1.0, 0.5]], None)
+    assert get_embedding_cache_stats()["hits"] == 1
+    set_embedding_function(None, "default")
+    clear_embedding_cache()
@@ -0,0 +1,74 @@
+import numpy as np
+
+import tinyagi.knowledge_index as knowledge_index_module
+from tinyagi.knowledge_index import (
+    add_to_knowledge_index,
+    remove_from_knowledge_index,
+    reset_knowledge_index,
+    search_knowledge_index,
+)
+
+
+class FakeCollection:
+    def get(self, where=None, include=None):
+        return {
+            "ids": ["0000000000000000", "0000000000000001"],
+            "documents": ["cats are great", "dogs bark"],
+            "metadatas": [{"novel": "True"}, {"novel": "True"}],
+            "embeddings": np.array([[1.0, 0.0, 0.0], [0.0, 2.0, 0.0]]),
+        }
+
+
+class FakeClient:
+    def get_or_create_collection(self, category):
+        return FakeCollection()
+
+
+def patch_store(monkeypatch):
+    vectors = {"cats": [1.0, 0.1, 0.0], "dogs": [0.0, 1.0, 0.1], "sky": [0.0, 0.1, 1.0]}
+    monkeypatch.setattr(knowledge_index_module, "get_client", lambda: FakeClient())
+    monkeypatch.setattr(
+        knowledge_index_module, "embed", lambda texts: [vectors[text] for text in texts]
+    )
+    reset_knowledge_index()
+
+
+def test_search_knowledge_index_loads_from_store(monkeypatch):
+    patch_store(monkeypatch)
+    results = search_knowledge_index("dogs", n_results=2)
+    assert [result["document"] for result in results] == ["dogs bark", "cats are great"]
+    assert results[0]["distance"] < results[1]["distance"]
+    reset_knowledge_index()
+
+
+def test_knowledge_index_stays_in_sync(monkeypatch):
+    patch_store(monkeypatch)
+    search_knowledge_index("cats")
+
+    add_to_knowledge_index(
+        ["0000000000000002", "0000000000000003"],
+        ["the sky is blue", "the sky is very blue"],
+        [{"novel": "True"}, {"novel": "False"}],
+        [[0.0, 0.0, 3.0], [0.0, 0.0, 3.0]],
+    )
+    results = search_knowledge_index("sky", n_results=1)
+    assert results[0]["id"] == "0000000000000002"
+    assert knowledge_index_module.knowledge_index["size"] == 3
+
+    remove_from_knowledge_index(["0000000000000002"])
+    results = search_knowledge_index("sky", n_results=3)
+    assert "0000000000000002" not in [result["id"] for result in results]
+    assert len(results) == 2
+    reset_knowledge_index()
+
+
+def test_knowledge_index_grows(monkeypatch):
+    patch_store(monkeypatch)
+    search_knowledge_index("cats")
+    ids = [str(i).zfill(16) for i in range(2, 3002)]
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(len(ids), 3)).tolist()
+    add_to_knowledge_index(ids, ids, [{"novel": "True"}] * len(ids), embeddings)
+    assert knowledge_index_module.knowledge_index["size"] == 3002
+    assert len(search_knowledge_index("cats", n_results=8)) == 8
+    reset_knowledge_index()
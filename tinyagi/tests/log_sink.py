@@ -0,0 +1,70 @@
+import json
+from collections import deque
+
+import tinyagi.log_sink as log_sink_module
+from tinyagi.log_sink import flush_logs, get_log_stats, queue_log, set_log_file
+
+
+class FakeAdminPanel:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, message, type, source):
+        self.messages.append((message, type, source))
+
+
+def isolate_log_sink(monkeypatch, size=10):
+    # flushed by the test instead of the worker
+    monkeypatch.setattr(log_sink_module, "log_buffer", deque(maxlen=size))
+    monkeypatch.setitem(log_sink_module.log_worker, "thread", "test")
+    monkeypatch.setattr(log_sink_module, "log_settings", {"level": "info", "file": None})
+    monkeypatch.setattr(
+        log_sink_module, "log_stats", {"queued": 0, "dropped": 0, "flushes": 0, "sent": 0, "written": 0}
+    )
+
+
+def output(message):
+    return {"message": message, "header": None, "color": "white"}
+
+
+def test_feed_messages_keep_their_shape(monkeypatch):
+    isolate_log_sink(monkeypatch)
+    monkeypatch.delitem(log_sink_module.sys.modules, "agentcomms.adminpanel", raising=False)
+    queue_log(output("before the admin panel"))
+    flush_logs()
+
+    adminpanel = FakeAdminPanel()
+    monkeypatch.setitem(log_sink_module.sys.modules, "agentcomms.adminpanel", adminpanel)
+    queue_log(output("one"))
+    queue_log(output("not for the feed"), feed=False)
+    queue_log(output("two"), type="error")
+    flush_logs()
+
+    # one message per record, as the admin panel expects
+    assert adminpanel.messages == [
+        (output("one"), "feed", "log"),
+        (output("two"), "feed", "log"),
+    ]
+    stats = get_log_stats()
+    assert stats["flushes"] == 1
+    assert stats["sent"] == 2
+    assert stats["buffered"] == 0
+
+
+def test_full_buffer_drops_oldest(monkeypatch, tmp_path):
+    isolate_log_sink(monkeypatch, size=3)
+    monkeypatch.delitem(log_sink_module.sys.modules, "agentcomms.adminpanel", raising=False)
+    path = tmp_path / "log.jsonl"
+    set_log_file(str(path))
+
+    for i in range(5):
+        queue_log(output(f"message {i}"), source="test", feed=i % 2 == 0)
+    flush_logs()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["message"] for record in records] == ["message 2", "message 3", "message 4"]
+    assert records[0]["source"] == "test"
+    assert records[1]["feed"] is False
+    stats = get_log_stats()
+    assert stats["dropped"] == 2
+    assert stats["written"] == 3
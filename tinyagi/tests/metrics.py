@@ -0,0 +1,62 @@
+from tinyagi.metrics import (
+    MeteredCollection,
+    get_histogram,
+    instrument_step,
+    observe,
+    render_metrics,
+    reset_metrics,
+)
+
+
+def test_observe_and_render():
+    reset_metrics()
+    observe("tinyagi_step_seconds", 0.003, {"step": "orient"})
+    observe("tinyagi_step_seconds", 0.2, {"step": "orient"})
+    observe("tinyagi_step_seconds", 120, {"step": "orient"})
+    histogram = get_histogram("tinyagi_step_seconds", {"step": "orient"})
+    assert histogram["count"] == 3
+    assert sum(histogram["buckets"]) == 2
+
+    text = render_metrics()
+    assert "# TYPE tinyagi_step_seconds histogram" in text
+    assert 'tinyagi_step_seconds_bucket{step="orient",le="0.001"} 0' in text
+    assert 'tinyagi_step_seconds_bucket{step="orient",le="0.005"} 1' in text
+    assert 'tinyagi_step_seconds_bucket{step="orient",le="0.25"} 2' in text
+    assert 'tinyagi_step_seconds_bucket{step="orient",le="+Inf"} 3' in text
+    assert 'tinyagi_step_seconds_count{step="orient"} 3' in text
+
+    observe("tinyagi_action_seconds", 0.1, {"action": 'say "hi"'})
+    assert 'action="say \\"hi\\""' in render_metrics()
+
+
+def test_instrument_step_keeps_arguments():
+    reset_metrics()
+
+    def one(context):
+        return context + 1
+
+    def two(context, loop_data):
+        return context + loop_data
+
+    assert instrument_step(one)(1) == 2
+    assert instrument_step(two)(1, 2) == 3
+    assert instrument_step(two).__code__.co_argcount == 2
+    assert instrument_step(one).__name__ == "one"
+    assert get_histogram("tinyagi_step_seconds", {"step": "one"})["count"] == 1
+    assert get_histogram("tinyagi_step_seconds", {"step": "two"})["count"] == 1
+
+
+def test_metered_collection():
+    reset_metrics()
+
+    class Collection:
+        name = "events"
+
+        def count(self):
+            return 3
+
+    collection = MeteredCollection(Collection(), "events")
+    assert collection.count() == 3
+    assert collection.name == "events"
+    histogram = get_histogram("tinyagi_memory_seconds", {"category": "events", "operation": "count"})
+    assert histogram["count"] == 1
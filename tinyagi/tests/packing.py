@@ -0,0 +1,55 @@
+import tinyagi.packing as packing_module
+import tinyagi.templates as templates_module
+from tinyagi.packing import compose_packed_prompt, pack_context, set_section
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_set_section_renders_full_text(monkeypatch):
+    monkeypatch.setattr(packing_module, "count_tokens", count_words)
+    context = set_section({}, "events", ["one", "two"], header="Events:", trailer="\n")
+    assert context["events"] == "Events:\none\ntwo\n"
+    assert context["events_section"]["tokens"] is None
+
+    context = set_section({}, "events", [], header="Events:", trailer="\n")
+    assert context["events"] == ""
+
+
+def test_pack_context_fills_budget_by_priority(monkeypatch):
+    monkeypatch.setattr(packing_module, "count_tokens", count_words)
+    monkeypatch.setattr(templates_module, "count_tokens", count_words)
+    context = {"name": "Citrine"}
+    set_section(context, "current_task_formatted", ["write a b c d"], header="Current Task:")
+    set_section(
+        context,
+        "events",
+        ["e1 x", "e2 x", "e3 x", "e4 x"],
+        header="Events:",
+        keep="last",
+        tokens=[2, 2, 2, 2],
+    )
+    set_section(context, "relevant_knowledge", ["k1 x", "k2 x"], header="Knowledge:")
+    template = "I am {{name}}\n{{current_task_formatted}}\n{{events}}\n{{relevant_knowledge}}"
+
+    # 3 for the template, 8 for the task, 2 + 2 + 3 + 3 for three events
+    packed = pack_context(template, context, budget=21)
+    assert packed["current_task_formatted"] == "Current Task:\nwrite a b c d"
+    assert packed["events"] == "Events:\ne2 x\ne3 x\ne4 x"
+    assert packed["relevant_knowledge"] == ""
+    # the context itself is left whole
+    assert context["events"] == "Events:\ne1 x\ne2 x\ne3 x\ne4 x"
+
+    prompt = compose_packed_prompt(template, context, budget=1000)
+    assert "k2 x" in prompt and "e1 x" in prompt
+
+
+def test_pack_context_counts_functions(monkeypatch):
+    monkeypatch.setattr(packing_module, "count_tokens", lambda text: len(text))
+    monkeypatch.setattr(templates_module, "count_tokens", lambda text: len(text))
+    context = set_section({}, "events", ["a", "b"], keep="last")
+    packed = pack_context("{{events}}", context, budget=3)
+    assert packed["events"] == "a\nb"
+    packed = pack_context("{{events}}", context, budget=3, functions={"f": 1})
+    assert packed["events"] == ""
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import tinyagi.pipeline as pipeline_module
+from tinyagi.pipeline import create_prefetch_steps, merge_prefetched_context
+
+
+def test_merge_prefetched_context():
+    events = "old events"
+    before = {"events": events, "summary": "summary"}
+    after = {"events": "new events", "summary": "summary", "tasks": []}
+    context = {"events": events, "summary": "summary", "reasoning": "because"}
+    context = merge_prefetched_context(context, before, after)
+    assert context == {
+        "events": "new events",
+        "summary": "summary",
+        "reasoning": "because",
+        "tasks": [],
+    }
+
+
+def test_prefetch_steps_overlap_context_with_decide(monkeypatch):
+    events = []
+    times = {}
+
+    def slow_decide(context):
+        times["decide"] = [time.perf_counter()]
+        time.sleep(0.2)
+        events.append("reasoning")
+        context["action_name"] = "write_joke"
+        times["decide"].append(time.perf_counter())
+        return context
+
+    def slow_context_step(context):
+        times["context"] = [time.perf_counter()]
+        time.sleep(0.2)
+        context["available_actions"] = "actions"
+        context["events"] = list(events)
+        times["context"].append(time.perf_counter())
+        return context
+
+    def fake_build_events_context(context):
+        context["events"] = list(events)
+        return context
+
+    monkeypatch.setattr(pipeline_module, "decide", slow_decide)
+    monkeypatch.setattr(pipeline_module, "build_events_context", fake_build_events_context)
+    steps = create_prefetch_steps(slow_context_step)
+    decide_step = steps[3]
+
+    loop_data = {"pause_event": threading.Event(), "step_event": threading.Event()}
+    context = decide_step({"summary": "summary"}, loop_data)
+
+    # the context was built while decide was waiting
+    assert times["context"][0] < times["decide"][1]
+    assert times["decide"][0] < times["context"][1]
+    assert context["action_name"] == "write_joke"
+    assert context["available_actions"] == "actions"
+    # act sees the reasoning event decide wrote, not the prefetched events
+    assert context["events"] == ["reasoning"]
+    assert loop_data["step_event"].is_set(), "The loop should move on right away"
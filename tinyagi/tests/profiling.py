@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import tinyagi
+from tinyagi.profiling import format_import_tree, start_import_profile, stop_import_profile
+
+
+package_root = os.path.dirname(os.path.dirname(tinyagi.__file__))
+
+
+def test_import_profile(monkeypatch, tmp_path):
+    (tmp_path / "profiled_outer.py").write_text("import profiled_inner\nVALUE = profiled_inner.VALUE\n")
+    (tmp_path / "profiled_inner.py").write_text("import time\ntime.sleep(0.01)\nVALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ["profiled_outer", "profiled_inner"]:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    start_import_profile()
+    try:
+        import profiled_outer
+    finally:
+        roots = stop_import_profile()
+
+    assert profiled_outer.VALUE == 1
+    # the module gets its own loader back
+    assert type(profiled_outer.__loader__).__name__ != "TimedLoader"
+    outer = [node for node in roots if node["name"] == "profiled_outer"][0]
+    assert [child["name"] for child in outer["children"]] == ["profiled_inner"]
+    assert outer["seconds"] >= outer["children"][0]["seconds"] >= 0.01
+
+    lines = format_import_tree([outer], min_seconds=0.005)
+    assert lines[0].endswith("profiled_outer")
+    assert lines[1].endswith("  profiled_inner")
+
+
+def test_package_names_are_lazy():
+    # a fresh interpreter, so nothing this test run imported is loaded
+    script = (
+        "import sys, tinyagi\n"
+        "try:\n"
+        "    tinyagi.not_a_name\n"
+        "except AttributeError:\n"
+        "    pass\n"
+        "assert 'tinyagi.main' not in sys.modules\n"
+        "assert 'count_tokens' in tinyagi.__all__ and 'start' in tinyagi.__all__\n"
+        "assert tinyagi.count_tokens is sys.modules['tinyagi.utils'].count_tokens\n"
+        "assert 'tinyagi.main' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=package_root)
@@ -0,0 +1,82 @@
+import tinyagi.memory as memory_module
+import tinyagi.retention as retention_module
+from tinyagi.memory import OffsetCollection, add_id_offset, next_memory_ids
+from tinyagi.retention import compact_memories, load_retention_policies, select_expired
+
+
+class FakeCollection:
+    def __init__(self, memories=None):
+        self.memories = dict(memories or {})
+
+    def count(self):
+        return len(self.memories)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        items = sorted(self.memories.items())
+        if ids is not None:
+            items = [(id, metadata) for id, metadata in items if id in ids]
+        offset = offset or 0
+        items = items[offset : None if limit is None else offset + limit]
+        return {"ids": [id for id, _ in items], "metadatas": [metadata for _, metadata in items]}
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        for id, metadata in zip(ids, metadatas or [{} for _ in ids]):
+            self.memories[id] = metadata
+
+    def delete(self, ids=None):
+        for id in ids:
+            del self.memories[id]
+
+
+class FakeClient:
+    def __init__(self, collections):
+        self.collections = collections
+
+    def get_or_create_collection(self, category, metadata=None):
+        return self.collections.setdefault(category, FakeCollection())
+
+
+def test_select_expired():
+    policy = {
+        "max_age_seconds": 100,
+        "types": {"summary": {"max_age_epochs": 10}, "message": {"max_count": 1}},
+    }
+    memories = [
+        ("0", {"type": "summary", "epoch": 1, "created_at": 0}),
+        ("1", {"type": "message", "epoch": 2, "created_at": 0}),
+        ("2", {"type": "fact", "created_at": 0}),
+        ("3", {"type": "summary", "epoch": 15, "created_at": 0}),
+        ("4", {"type": "message", "epoch": 16, "created_at": 950}),
+        ("5", {"type": "message", "epoch": 17, "created_at": 990}),
+        ("6", {"created_at": 990}),
+    ]
+    # summaries by epoch, messages by count and everything else by age
+    assert select_expired(memories, policy, now=1000, epoch=20) == ["0", "1", "2", "4"]
+    assert load_retention_policies("off") == {}
+    assert load_retention_policies('{"events": {"max_count": 5}}') == {"events": {"max_count": 5}}
+
+
+def test_compaction_keeps_ids_unique(monkeypatch):
+    events = FakeCollection({str(i).zfill(16): {"created_at": i} for i in range(5)})
+    collections = {"events": events}
+    client = FakeClient(collections)
+    monkeypatch.setattr(memory_module, "get_client", lambda: client)
+    monkeypatch.setattr(retention_module, "get_client", lambda: client)
+    monkeypatch.setattr(memory_module, "id_offsets", {})
+    monkeypatch.setattr(retention_module, "RETENTION_BATCH_SIZE", 2)
+    monkeypatch.setattr(retention_module, "get_storage_size", lambda path=None: 0)
+
+    report = compact_memories({"events": {"max_count": 2}})
+    assert sorted(events.memories) == [str(i).zfill(16) for i in [3, 4]]
+    assert report["categories"]["events"]["deleted"] == 3
+    assert report["categories"]["events"]["count_after"] == 2
+
+    # new memories are numbered after the deleted ones, not after the count
+    assert next_memory_ids("events", 2) == [str(i).zfill(16) for i in [5, 6]]
+    OffsetCollection(events, "events").upsert([None], documents=["new"], metadatas=[{}])
+    assert str(5).zfill(16) in events.memories
+
+    # the offset is read back from the store
+    monkeypatch.setattr(memory_module, "id_offsets", {})
+    add_id_offset("events", 1)
+    assert collections["memory_id_offsets"].memories["events"] == {"deleted": 4}
@@ -0,0 +1,45 @@
+import time
+
+import tinyagi.snapshot as snapshot_module
+from tinyagi.snapshot import (
+    get_connector_context,
+    get_context_snapshot,
+    publish_context_snapshot,
+)
+
+
+def test_context_snapshot_staleness(monkeypatch):
+    publish_context_snapshot({"epoch": 3, "events": "recent"})
+    snapshot = get_context_snapshot(max_age=10)
+    assert snapshot == {"epoch": 3, "events": "recent"}
+
+    # connectors get their own copy
+    snapshot["events"] = "changed"
+    assert get_context_snapshot(max_age=10)["events"] == "recent"
+
+    monkeypatch.setattr(snapshot_module, "context_snapshot_time", time.time() - 20)
+    assert get_context_snapshot(max_age=10) is None
+
+
+def test_connector_context_reuses_snapshot(monkeypatch):
+    listed = []
+
+    def fake_list_files_formatted():
+        listed.append(True)
+        return "My Files:\n"
+
+    monkeypatch.setattr(snapshot_module, "list_files_formatted", fake_list_files_formatted)
+    monkeypatch.setattr(
+        snapshot_module,
+        "get_epoch",
+        lambda: (_ for _ in ()).throw(AssertionError("should not query memory")),
+    )
+    publish_context_snapshot({"epoch": 5, "events": "recent", "formatted_tasks": "Tasks:\n"})
+
+    context = get_connector_context(max_age=10)
+    context = get_connector_context(max_age=10)
+    assert context["epoch"] == 5
+    assert context["events"] == "recent"
+    assert context["user_files"] == "My Files:\n"
+    assert "current_time" in context
+    assert len(listed) == 1
@@ -0,0 +1,24 @@
+import time
+
+import tinyagi.speech as speech_module
+from tinyagi.speech import speak, wait_for_speech
+
+
+def test_speak_returns_immediately_and_never_overlaps(monkeypatch):
+    sent = []
+    monkeypatch.setattr(
+        speech_module,
+        "send_message",
+        lambda message, type, source: sent.append((message, time.perf_counter())),
+    )
+
+    start_time = time.perf_counter()
+    speak("first", duration=0.1)
+    speak("second", duration=0.1)
+    speak("third")
+    assert time.perf_counter() - start_time < 0.05, "speak should not block"
+
+    assert wait_for_speech(timeout=5)
+    assert [message for message, _ in sent] == ["first", "second", "third"]
+    assert sent[1][1] - sent[0][1] >= 0.1
+    assert sent[2][1] - sent[1][1] >= 0.1
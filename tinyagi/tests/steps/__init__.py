@@ -1,3 +1,4 @@
 from .orient import *
 from .decide import *
-from .act import *
\ No newline at end of file
+from .act import *
+from .decide_and_act import *
\ No newline at end of file
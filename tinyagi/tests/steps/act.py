@@ -0,0 +1,36 @@
+import importlib
+
+import pytest
+
+from tinyagi.metrics import get_histogram, reset_metrics
+from tinyagi.steps.act import run_action
+
+# the steps package exports a function with the same name as this module
+act_module = importlib.import_module("tinyagi.steps.act")
+
+
+def test_run_action_observes_failures_under_known_labels(monkeypatch):
+    def use_action(action_name, arguments):
+        if arguments.get("fail"):
+            raise RuntimeError("handler failed")
+        return {"success": True, "output": "done"}
+
+    monkeypatch.setattr(act_module, "use_action", use_action)
+    monkeypatch.setattr(
+        act_module, "get_action", lambda name: {} if name == "write_joke" else None
+    )
+    monkeypatch.setattr(act_module, "set_last_action", lambda name: None)
+    monkeypatch.setattr(act_module, "create_event", lambda *a, **k: None)
+    monkeypatch.setattr(act_module, "log", lambda *a, **k: None)
+    reset_metrics()
+
+    run_action({}, "write_joke", {})
+    with pytest.raises(RuntimeError):
+        run_action({}, "write_joke", {"fail": True})
+    # a made up name doesn't get a series of its own
+    run_action({}, "write a joke!", {})
+
+    assert get_histogram("tinyagi_action_seconds", {"action": "write_joke", "success": "True"})["count"] == 1
+    assert get_histogram("tinyagi_action_seconds", {"action": "write_joke", "success": "False"})["count"] == 1
+    assert get_histogram("tinyagi_action_seconds", {"action": "unknown", "success": "True"})["count"] == 1
+    reset_metrics()
@@ -0,0 +1,129 @@
+import importlib
+
+from tinyagi.steps.decide_and_act import (
+    compose_candidate_functions,
+    decide_and_act,
+    validate_arguments,
+)
+
+# the steps package exports a function with the same name as this module
+decide_and_act_module = importlib.import_module("tinyagi.steps.decide_and_act")
+
+joke_function = {
+    "name": "write_joke",
+    "description": "Write a joke.",
+    "parameters": {
+        "type": "object",
+        "properties": {"joke": {"type": "string", "description": "The joke"}},
+        "required": ["joke"],
+    },
+}
+
+
+def patch_steps(monkeypatch, response):
+    calls = []
+
+    def fake_run_action(context, action_name, arguments):
+        calls.append(("run_action", action_name, arguments))
+        return context
+
+    def fake_act(context):
+        calls.append(("act", context["action_name"]))
+        return context
+
+    def fake_decide(context):
+        calls.append(("decide",))
+        context["action_name"] = "write_joke"
+        return context
+
+    monkeypatch.setattr(
+        decide_and_act_module,
+        "get_action",
+        lambda name: {"function": joke_function} if name == "write_joke" else None,
+    )
+    monkeypatch.setattr(
+        decide_and_act_module, "function_completion", lambda **kwargs: response
+    )
+    monkeypatch.setattr(decide_and_act_module, "run_action", fake_run_action)
+    monkeypatch.setattr(decide_and_act_module, "act", fake_act)
+    monkeypatch.setattr(decide_and_act_module, "decide", fake_decide)
+    monkeypatch.setattr(
+        decide_and_act_module,
+        "create_event",
+        lambda text, metadata=None: calls.append(("create_event", text)),
+    )
+    monkeypatch.setattr(decide_and_act_module, "log", lambda *a, **k: None)
+    return calls
+
+
+def test_compose_candidate_functions_adds_reasoning(monkeypatch):
+    patch_steps(monkeypatch, {})
+    functions = compose_candidate_functions(["write_joke", "missing_action"])
+    assert list(functions.keys()) == ["write_joke"]
+    assert "reasoning" in functions["write_joke"]["parameters"]["required"]
+    # the registered schema is left alone
+    assert "reasoning" not in joke_function["parameters"]["properties"]
+
+
+def test_validate_arguments():
+    assert validate_arguments(joke_function, {"joke": "a joke"})
+    assert not validate_arguments(joke_function, {})
+    assert not validate_arguments(joke_function, {"joke": 3})
+    assert not validate_arguments(joke_function, None)
+
+
+def test_decide_and_act_runs_action_in_one_call(monkeypatch):
+    calls = patch_steps(
+        monkeypatch,
+        {
+            "function_name": "write_joke",
+            "arguments": {"joke": "a joke", "reasoning": "I want to"},
+        },
+    )
+    context = {"available_action_names": ["write_joke"], "verbose": False}
+    context = decide_and_act(context)
+    assert calls == [
+        ("create_event", "I want to"),
+        ("run_action", "write_joke", {"joke": "a joke"}),
+    ]
+    assert context["action_name"] == "write_joke"
+    assert "I want to" in context["reasoning"]
+
+
+def test_decide_and_act_falls_back_on_invalid_arguments(monkeypatch):
+    calls = patch_steps(
+        monkeypatch,
+        {"function_name": "write_joke", "arguments": {"reasoning": "I want to"}},
+    )
+    context = {
+        "available_action_names": ["write_joke"],
+        "verbose": False,
+        "reasoning": "Action Reasoning:\nlast epoch\n",
+    }
+    context = decide_and_act(context)
+    # the new reasoning is recorded before the arguments are composed again
+    assert calls == [("create_event", "I want to"), ("act", "write_joke")]
+    assert context["reasoning"] == "Action Reasoning:\nI want to\n"
+
+
+def test_decide_and_act_decides_again_without_reasoning(monkeypatch):
+    calls = patch_steps(
+        monkeypatch,
+        {"function_name": "write_joke", "arguments": {"joke": "a joke", "reasoning": 3}},
+    )
+    context = {
+        "available_action_names": ["write_joke"],
+        "verbose": False,
+        "reasoning": "Action Reasoning:\nlast epoch\n",
+    }
+    decide_and_act(context)
+    assert calls == [("decide",), ("act", "write_joke")]
+
+
+def test_decide_and_act_falls_back_on_unknown_action(monkeypatch):
+    calls = patch_steps(
+        monkeypatch, {"function_name": None, "arguments": None, "text": "hmm"}
+    )
+    context = {"available_action_names": ["write_joke"], "verbose": False}
+    decide_and_act(context)
+    assert calls == [("decide",), ("act", "write_joke")]
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import tinyagi.connectors.twitch as twitch_module
+import tinyagi.supervisor as supervisor_module
+from tinyagi.supervisor import get_connector_status, start_connectors, time_first_epoch
+
+
+def write_connectors(directory):
+    (directory / "flaky_connector.py").write_text(
+        "attempts = []\n"
+        "def start_connector(loop_dict):\n"
+        "    attempts.append(1)\n"
+        "    if len(attempts) < 3:\n"
+        "        raise RuntimeError('not yet')\n"
+    )
+    (directory / "blocking_connector.py").write_text(
+        "def start_connector(loop_dict):\n"
+        "    loop_dict['stop_event'].wait()\n"
+    )
+    (directory / "server_connector.py").write_text(
+        "import threading\n"
+        "starts = []\n"
+        "def start_connector(loop_dict):\n"
+        "    starts.append(1)\n"
+        "    # the first server dies straight away, the second runs until stopped\n"
+        "    stop_event = loop_dict['stop_event']\n"
+        "    target = (lambda: None) if len(starts) == 1 else stop_event.wait\n"
+        "    thread = threading.Thread(target=target, name='server', daemon=True)\n"
+        "    thread.start()\n"
+        "    return thread\n"
+    )
+    (directory / "helper_connector.py").write_text("VALUE = 1\n")
+    (directory / "disabled_connector.py").write_text("raise ImportError('should not be imported')\n")
+
+
+connector_names = [
+    "flaky_connector",
+    "blocking_connector",
+    "server_connector",
+    "helper_connector",
+    "disabled_connector",
+]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_start_connectors(monkeypatch, tmp_path):
+    monkeypatch.setattr(supervisor_module, "MIN_RESTART_DELAY", 0.01)
+    monkeypatch.setattr(supervisor_module, "MAX_RESTART_DELAY", 0.05)
+    monkeypatch.setattr(supervisor_module, "HEALTH_CHECK_INTERVAL", 0.01)
+    monkeypatch.setattr(supervisor_module, "connectors", {})
+    write_connectors(tmp_path)
+    loop_dict = {"stop_event": threading.Event()}
+
+    try:
+        names = start_connectors(
+            str(tmp_path),
+            loop_dict,
+            "flaky_connector,blocking_connector,server_connector,helper_connector",
+        )
+        assert names == ["flaky_connector", "blocking_connector", "server_connector", "helper_connector"]
+
+        # the blocking connector doesn't hold up the others
+        assert wait_for(lambda: get_connector_status()["flaky_connector"]["status"] == "returned")
+        status = get_connector_status()
+        assert status["flaky_connector"]["restarts"] == 2
+        assert "not yet" in status["flaky_connector"]["last_error"]
+        assert status["blocking_connector"]["status"] == "running"
+        assert status["blocking_connector"]["alive"]
+        assert status["helper_connector"]["status"] == "skipped"
+        assert "disabled_connector" not in status
+        assert "disabled_connector" not in sys.modules
+
+        # the server's thread is watched, and started again when it stops
+        assert wait_for(lambda: get_connector_status()["server_connector"]["restarts"] == 1)
+        assert wait_for(lambda: get_connector_status()["server_connector"]["status"] == "running")
+        assert "server stopped" in get_connector_status()["server_connector"]["last_error"]
+        assert len(sys.modules["server_connector"].starts) == 2
+
+        loop_dict["stop_event"].set()
+        assert wait_for(lambda: not get_connector_status()["blocking_connector"]["alive"])
+        assert wait_for(lambda: get_connector_status()["server_connector"]["status"] == "stopped")
+    finally:
+        loop_dict["stop_event"].set()
+        # the connectors were imported under their bare names, which other tests may use
+        for name in connector_names:
+            sys.modules.pop(name, None)
+
+
+def test_twitch_connector_restarts_on_a_new_event_loop(monkeypatch):
+    monkeypatch.setattr(supervisor_module, "MIN_RESTART_DELAY", 0.01)
+    monkeypatch.setattr(supervisor_module, "connectors", {})
+    monkeypatch.setattr(twitch_module, "TWITCH_BATCH_WINDOW", 0.01)
+    loop_dict = {"stop_event": threading.Event()}
+    runs = []
+    responses = []
+
+    async def privmsgs(channel):
+        runs.append(channel)
+        yield {"username": "viewer", "message": f"message {len(runs)}"}
+
+    async def idle_loop():
+        await asyncio.sleep(0)
+
+    async def respond_to_twitch():
+        responses.append(len(runs))
+        if len(runs) == 2:
+            loop_dict["stop_event"].set()
+        # the first run fails, the second ends the test
+        raise RuntimeError("twitch went away")
+
+    monkeypatch.setattr(twitch_module, "irc_privmsgs", privmsgs)
+    monkeypatch.setattr(twitch_module, "twitch_handle_loop", idle_loop)
+    monkeypatch.setattr(twitch_module, "respond_to_twitch", respond_to_twitch)
+    monkeypatch.setattr(twitch_module, "remember_twitch_messages", lambda *args: [])
+    monkeypatch.setattr(twitch_module, "log", lambda *args, **kwargs: None)
+    # the connectors directory isn't a package, so the connector is looked up by its bare name
+    monkeypatch.setitem(sys.modules, "twitch", twitch_module)
+
+    start_connectors(os.path.dirname(twitch_module.__file__), loop_dict, "twitch")
+    assert wait_for(lambda: get_connector_status()["twitch"]["status"] == "stopped")
+    status = get_connector_status()["twitch"]
+    # the restart got a queue of its own and answered its message
+    assert responses == [1, 2]
+    assert status["restarts"] == 2
+    assert "twitch went away" in status["last_error"]
+
+
+def test_time_first_epoch(monkeypatch):
+    milestones = []
+    monkeypatch.setattr(
+        supervisor_module, "report_startup", lambda milestone, start_time: milestones.append(milestone)
+    )
+
+    def first(context):
+        return {"count": 1}
+
+    def last(context, loop_data):
+        return context
+
+    steps = time_first_epoch([first, last], time.perf_counter())
+    assert [step.__name__ for step in steps] == ["first", "last"]
+    assert steps[1].__code__.co_argcount == 2
+    for _ in range(2):
+        context = steps[1](steps[0](None), {})
+    assert context == {"count": 1}
+    assert milestones == ["first_epoch_started", "first_epoch_finished"]
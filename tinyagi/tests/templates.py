@@ -0,0 +1,80 @@
+import copy
+import importlib
+
+import pytest
+from easycompletion import compose_prompt
+
+import tinyagi.actions.task
+from tinyagi.templates import (
+    FrozenDict,
+    compile_template,
+    freeze,
+    frozen_function,
+    register_template,
+    templates,
+)
+
+
+def test_render_matches_compose_prompt():
+    text = "{{name}} is {{age}} {{missing}} {{none}}\n{{items}}{{pairs}}{{name}}{{empty}}"
+    template = compile_template(text)
+    assert template.keys == ["name", "age", "missing", "none", "items", "pairs", "empty"]
+    values = {
+        "name": "Citrine",
+        "age": 3,
+        "none": None,
+        "items": ["a", "b"],
+        "pairs": {"k": "v"},
+        "empty": [],
+    }
+    assert template.render(values) == compose_prompt(text, values)
+    assert compile_template(text) is template
+
+
+def test_registered_templates_match_compose_prompt():
+    assert "decision" in templates
+    assert "orient" in templates
+    assert "create_task" in templates
+    for name, template in templates.items():
+        values = {key: key + " value\n" for key in template.keys}
+        assert template.render(values) == compose_prompt(template.text, values), name
+
+
+def test_register_template_by_name():
+    template = register_template("test_greeting", "Hello {{name}}")
+    assert templates["test_greeting"] is template
+    assert template.render({"name": "World"}) == "Hello World"
+
+
+def test_frozen_function_is_built_once():
+    calls = []
+
+    @frozen_function
+    def compose_test_function():
+        calls.append(True)
+        return {"name": "test", "parameters": {"required": ["a"]}}
+
+    function = compose_test_function()
+    assert compose_test_function() is function
+    assert len(calls) == 1
+    assert isinstance(function, FrozenDict)
+    assert function["parameters"]["required"] == ("a",)
+    with pytest.raises(TypeError):
+        function["name"] = "changed"
+    with pytest.raises(TypeError):
+        function["parameters"].update({"type": "object"})
+
+    # copies can be changed
+    copied = copy.deepcopy(function)
+    copied["parameters"]["required"].append("b")
+    assert function["parameters"]["required"] == ("a",)
+    assert function.to_json() == '{"name": "test", "parameters": {"required": ["a"]}}'
+
+
+def test_step_functions_are_cached():
+    # the steps package exports functions with the same names as their modules
+    decide = importlib.import_module("tinyagi.steps.decide").compose_decision_function
+    orient = importlib.import_module("tinyagi.steps.orient").compose_orient_function
+    assert decide() is decide()
+    assert orient() is orient()
+    assert freeze([{"a": [1]}]) == ({"a": (1,)},)
@@ -0,0 +1,148 @@
+import sqlite3
+
+import tinyagi.utils as utils_module
+from tinyagi.utils import (
+    clear_token_cache,
+    commit_token_cache,
+    count_tokens,
+    get_token_cache_stats,
+    set_token_counter,
+)
+
+
+def test_count_tokens_is_memoized(monkeypatch):
+    calls = []
+
+    def fake_encode_and_count_tokens(text):
+        calls.append(text)
+        return len(text.split())
+
+    monkeypatch.setattr(utils_module, "encode_and_count_tokens", fake_encode_and_count_tokens)
+    clear_token_cache()
+
+    assert count_tokens("one two three") == 3
+    assert count_tokens("one two three") == 3
+    assert count_tokens("four") == 1
+    assert calls == ["one two three", "four"]
+
+    stats = get_token_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+    clear_token_cache()
+
+
+def test_count_tokens_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(utils_module, "encode_and_count_tokens", lambda text: len(text))
+    monkeypatch.setattr(utils_module, "TOKEN_CACHE_SIZE", 2)
+    clear_token_cache()
+
+    count_tokens("a")
+    count_tokens("bb")
+    count_tokens("a")
+    count_tokens("ccc")
+    assert get_token_cache_stats()["size"] == 2
+
+    count_tokens("a")
+    count_tokens("bb")
+    assert get_token_cache_stats()["misses"] == 4
+    clear_token_cache()
+
+
+def test_count_tokens_disk_tier(monkeypatch, tmp_path):
+    monkeypatch.setattr(utils_module, "encode_and_count_tokens", lambda text: len(text))
+    monkeypatch.setattr(utils_module, "TOKEN_CACHE_PATH", str(tmp_path / "tokens.db"))
+    monkeypatch.setattr(utils_module, "token_cache_db", None)
+    clear_token_cache()
+
+    count_tokens("persisted")
+    clear_token_cache()
+    assert count_tokens("persisted") == 9
+    assert get_token_cache_stats()["disk_hits"] == 1
+
+    utils_module.token_cache_db.close()
+    monkeypatch.setattr(utils_module, "token_cache_db", None)
+    clear_token_cache()
+
+
+def test_count_tokens_commits_in_batches(monkeypatch, tmp_path):
+    path = str(tmp_path / "tokens.db")
+    monkeypatch.setattr(utils_module, "encode_and_count_tokens", lambda text: len(text))
+    monkeypatch.setattr(utils_module, "TOKEN_CACHE_PATH", path)
+    monkeypatch.setattr(utils_module, "TOKEN_CACHE_COMMIT_SIZE", 3)
+    monkeypatch.setattr(utils_module, "token_cache_db", None)
+    monkeypatch.setitem(utils_module.token_cache_uncommitted, "count", 0)
+    clear_token_cache()
+
+    def committed_count():
+        db = sqlite3.connect(path)
+        try:
+            return db.execute("SELECT COUNT(*) FROM token_counts").fetchone()[0]
+        finally:
+            db.close()
+
+    count_tokens("a")
+    count_tokens("bb")
+    assert committed_count() == 0
+    count_tokens("ccc")
+    assert committed_count() == 3
+
+    # what is left over is committed at exit
+    count_tokens("dddd")
+    commit_token_cache()
+    assert committed_count() == 4
+
+    utils_module.token_cache_db.close()
+    monkeypatch.setattr(utils_module, "token_cache_db", None)
+    clear_token_cache()
+
+
+
+def test_custom_token_counter_skips_disk_tier(monkeypatch, tmp_path):
+    monkeypatch.setattr(utils_module, "encode_and_count_tokens", lambda text: len(text))
+    monkeypatch.setattr(utils_module, "TOKEN_CACHE_PATH", str(tmp_path / "tokens.db"))
+    monkeypatch.setattr(utils_module, "token_cache_db", None)
+    clear_token_cache()
+
+    count_tokens("persisted")
+    try:
+        # an estimate neither reads the tokenizer's counts nor stores its own
+        set_token_counter(lambda text: 1)
+        assert count_tokens("persisted") == 1
+        assert count_tokens("estimated") == 1
+        assert get_token_cache_stats()["disk_hits"] == 0
+    finally:
+        set_token_counter(None)
+    clear_token_cache()
+    assert count_tokens("persisted") == 9
+    assert count_tokens("estimated") == 9
+    assert get_token_cache_stats()["disk_hits"] == 1
+
+    utils_module.token_cache_db.close()
+    monkeypatch.setattr(utils_module, "token_cache_db", None)
+    clear_token_cache()
+
+
+def test_estimate_is_not_stored_when_the_tokenizer_is_set_back(monkeypatch, tmp_path):
+    monkeypatch.setattr(utils_module, "encode_and_count_tokens", lambda text: len(text))
+    monkeypatch.setattr(utils_module, "TOKEN_CACHE_PATH", str(tmp_path / "tokens.db"))
+    monkeypatch.setattr(utils_module, "token_cache_db", None)
+    clear_token_cache()
+
+    def estimate(text):
+        # another thread sets the tokenizer back while this count runs
+        set_token_counter(None)
+        return 1
+
+    set_token_counter(estimate)
+    assert count_tokens("estimated") == 1
+    # the tokenizer counts it again, nothing kept the estimate
+    assert count_tokens("estimated") == 9
+    assert get_token_cache_stats()["disk_hits"] == 0
+    clear_token_cache()
+    assert count_tokens("estimated") == 9
+    assert get_token_cache_stats()["disk_hits"] == 1
+
+    utils_module.token_cache_db.close()
+    monkeypatch.setattr(utils_module, "token_cache_db", None)
+    clear_token_cache()
@@ -1,14 +1,36 @@
-from agentcomms.adminpanel import send_message
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
 from agentlogger import log as agentlog, DEFAULT_TYPE_COLORS
 
+from tinyagi.log_sink import get_log_level, queue_log
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 20000))
+TOKEN_CACHE_PATH = os.getenv("TOKEN_CACHE_PATH")  # optional sqlite file for the on-disk tier
+# new counts are committed to the on-disk tier in batches, and once more at exit
+TOKEN_CACHE_COMMIT_SIZE = int(os.getenv("TOKEN_CACHE_COMMIT_SIZE", 100))
+
+token_cache = OrderedDict()
+token_cache_stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+token_cache_lock = threading.Lock()
+token_cache_db = None
+token_cache_uncommitted = {"count": 0}
+
+# the function that counts tokens on a cache miss, the tokenizer unless one was set
+token_counter = {"function": None}
+
 
 def log(message, header=None, type="info", title="tinyagi", source="tinyagi", color=None, send_to_feed=True):
-    if send_to_feed:
-        if color is None:
-            send_color = DEFAULT_TYPE_COLORS.get(type, "white")
-        else:
-            send_color = color
+    if color is None:
+        send_color = DEFAULT_TYPE_COLORS.get(type, "white")
+    else:
+        send_color = color
 
+    if send_to_feed:
         # if message is not a str
         if not isinstance(message, str) and message.get("message", None) is not None:
             message = message["message"]
@@ -16,13 +38,15 @@ def log(message, header=None, type="info", title="tinyagi", source="tinyagi", co
             print('message was not a string for some reason', message)
             message = str(message)
 
-        output = {
-            "message": message,
-            "header": header,
-            "color": send_color,
-        }
-        send_message(output, "feed", "log")
+    output = {
+        "message": message,
+        "header": header,
+        "color": send_color,
+    }
+    # the feed and the log file are written by the log sink's worker
+    queue_log(output, type=type, title=title, source=source, feed=send_to_feed)
 
+    if send_to_feed and get_log_level() == "debug":
         print('**********')
         print('message', message)
         print('header', header)
@@ -38,3 +62,136 @@ def log(message, header=None, type="info", title="tinyagi", source="tinyagi", co
         agentlog(message_out, type=type, title=title, source=source, color=color, panel=False)
     else:
         agentlog(message_out, type=type, title=title, source=source, panel=False)
+
+
+def encode_and_count_tokens(text):
+    # easycompletion imports openai, so the tokenizer is imported by the first count
+    from easycompletion import count_tokens
+
+    return count_tokens(text)
+
+
+def get_token_cache_db():
+    """
+    Opens the on-disk token count tier, if TOKEN_CACHE_PATH is set and the
+    tokenizer counts. Counts from a counter set with set_token_counter are kept
+    in memory only, so they never stand in for the tokenizer's.
+    Must be called with token_cache_lock held.
+
+    Returns: sqlite3.Connection or None
+    """
+    global token_cache_db
+    if token_counter["function"] is not None:
+        return None
+    if token_cache_db is None and TOKEN_CACHE_PATH:
+        token_cache_db = sqlite3.connect(TOKEN_CACHE_PATH, check_same_thread=False)
+        token_cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS token_counts (hash TEXT PRIMARY KEY, tokens INTEGER)"
+        )
+        atexit.register(commit_token_cache)
+    return token_cache_db
+
+
+def commit_token_cache():
+    """
+    Commits the counts added to the on-disk tier since the last commit
+    """
+    with token_cache_lock:
+        if token_cache_db is not None and token_cache_uncommitted["count"] > 0:
+            token_cache_db.commit()
+            token_cache_uncommitted["count"] = 0
+
+
+def count_tokens(text):
+    """
+    Counts the tokens in a string, memoized by a hash of its content.
+    Lookups go through a size-bounded in-memory LRU, then the optional
+    on-disk tier, and only encode the text on a miss in both.
+
+    Parameters:
+    - text (str): The text to count.
+
+    Returns: int - The number of tokens in the text.
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    with token_cache_lock:
+        tokens = token_cache.get(key)
+        if tokens is not None:
+            token_cache.move_to_end(key)
+            token_cache_stats["hits"] += 1
+            return tokens
+
+        # read together, so the counter and the tiers it may fill can't change in between
+        counter = token_counter["function"]
+        db = get_token_cache_db()
+        if db is not None:
+            row = db.execute(
+                "SELECT tokens FROM token_counts WHERE hash = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                tokens = row[0]
+                token_cache_stats["disk_hits"] += 1
+
+    if tokens is None:
+        tokens = (counter or encode_and_count_tokens)(text)
+        with token_cache_lock:
+            token_cache_stats["misses"] += 1
+            # db is only open when the tokenizer counts, so estimates never reach the disk
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO token_counts (hash, tokens) VALUES (?, ?)",
+                    (key, tokens),
+                )
+                token_cache_uncommitted["count"] += 1
+                if token_cache_uncommitted["count"] >= TOKEN_CACHE_COMMIT_SIZE:
+                    db.commit()
+                    token_cache_uncommitted["count"] = 0
+
+    with token_cache_lock:
+        # a count from a counter that was replaced meanwhile isn't kept
+        if token_counter["function"] is counter:
+            token_cache[key] = tokens
+            while len(token_cache) > TOKEN_CACHE_SIZE:
+                token_cache.popitem(last=False)
+    return tokens
+
+
+def set_token_counter(function):
+    """
+    Sets the function used to count tokens on a cache miss, e.g. an estimate
+    for machines that can't load the tokenizer. The in-memory cache is cleared
+    so earlier counts aren't mixed in, and the on-disk tier is skipped until the
+    tokenizer is set back with None.
+
+    Parameters:
+    - function (callable): Takes a string and returns its number of tokens, or None for the tokenizer.
+    """
+    with token_cache_lock:
+        token_counter["function"] = function
+        token_cache.clear()
+
+
+def get_token_cache_stats():
+    """
+    Returns the hit and miss counters of the token count cache.
+
+    Returns: dict - hits, disk_hits, misses and the current in-memory size.
+    """
+    with token_cache_lock:
+        stats = dict(token_cache_stats)
+        stats["size"] = len(token_cache)
+    return stats
+
+
+def clear_token_cache():
+    """
+    Empties the in-memory token count cache and resets its counters.
+    The on-disk tier is left untouched.
+    """
+    with token_cache_lock:
+        token_cache.clear()
+        for key in token_cache_stats:
+            token_cache_stats[key] = 0